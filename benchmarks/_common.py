@@ -0,0 +1,94 @@
+"""
+Helpers shared by the benchmark scripts: seeding a database, starting a uvicorn
+worker on it and summarising latencies.
+"""
+import os
+import sys
+import time
+import random
+import subprocess
+from contextlib import contextmanager
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+SRC = os.path.join(ROOT, 'src')
+
+BENCH_USER = {"username": "bench", "password": "bench-password"}
+
+def _session(url: str):
+    if SRC not in sys.path:
+        sys.path[:0] = [ROOT, SRC]
+    import database, migrations
+    from sqlalchemy.orm import sessionmaker
+
+    engine, _ = database.create_engines(url)
+    migrations.upgrade(engine)
+    return sessionmaker(bind=engine)()
+
+def create_bench_user(url: str):
+    """Add the user every benchmark logs in as to the database at `url`."""
+    db = _session(url)
+    import crud, schemas
+    try:
+        crud.create_user(db, schemas.UserCreate(full_name="Bench", **BENCH_USER))
+    finally:
+        db.close()
+        db.get_bind().dispose()
+
+def seed(path: str, patients: int, readings: int = 0):
+    """A small database at `path`: the bench user, `patients` patients and `readings` random readings."""
+    url = f"sqlite:///{path}"
+    create_bench_user(url)
+    db = _session(url)
+    from sqlalchemy import insert
+    import models, crud, schemas
+
+    rng = random.Random(7)
+    try:
+        db.execute(insert(models.Patient), [
+            {"name": f"Patient_{i:06d}", "age": rng.randint(18, 90), "gender": rng.choice(["Male", "Female"])}
+            for i in range(patients)
+        ])
+        db.commit()
+        batch = [
+            schemas.HealthIndicatorCreate(
+                patient_id=rng.randint(1, patients),
+                blood_pressure_sys=rng.randint(100, 180),
+                blood_pressure_dia=rng.randint(60, 110),
+                glucose=round(rng.uniform(4.0, 13.0), 1)
+            )
+            for _ in range(readings)
+        ]
+        for start in range(0, readings, 5000):
+            crud.create_patient_indicators_batch(db, batch[start:start + 5000])
+    finally:
+        db.close()
+        db.get_bind().dispose()
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+@contextmanager
+def serve(db_path: str, port: int, **env):
+    """Run main.py under uvicorn on `db_path` with extra environment variables; yields the base URL once it answers."""
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--app-dir", SRC, "--port", str(port), "--log-level", "warning"],
+        env=dict(os.environ, DATABASE_URL=f"sqlite:///{db_path}", **env)
+    )
+    try:
+        import httpx
+        base_url = f"http://127.0.0.1:{port}"
+        for _ in range(300):
+            if server.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with status {server.returncode} before answering")
+            try:
+                httpx.get(base_url + "/")
+                break
+            except httpx.TransportError:
+                time.sleep(0.1)
+        else:
+            raise RuntimeError(f"uvicorn did not answer on {base_url} within 30 seconds")
+        yield base_url
+    finally:
+        server.terminate()
+        server.wait()
@@ -0,0 +1,91 @@
+"""
+Load benchmark comparing DB_MODE=sync and DB_MODE=async.
+
+Seeds one SQLite database, then for each mode starts a uvicorn worker on a copy
+of it and fires concurrent authenticated requests at a mix of read endpoints.
+
+    python benchmarks/bench_async.py --requests 2000 --concurrency 64
+"""
+import os
+import json
+import time
+import random
+import shutil
+import asyncio
+import argparse
+import tempfile
+
+from _common import BENCH_USER, seed, percentile, serve
+
+async def load(base_url: str, requests: int, concurrency: int, patients: int):
+    import httpx
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        token = (await client.post("/token", data=BENCH_USER)).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        rng = random.Random(11)
+        paths = [
+            rng.choice([
+                "/users/me",
+                "/patients/?limit=50",
+                "/dashboard/",
+                f"/patients/{rng.randint(1, patients)}/trend",
+                f"/patients/{rng.randint(1, patients)}?limit=20",
+            ])
+            for _ in range(requests)
+        ]
+        latencies, errors = [], 0
+        queue = asyncio.Queue()
+        for path in paths:
+            queue.put_nowait(path)
+
+        async def worker():
+            nonlocal errors
+            while not queue.empty():
+                path = queue.get_nowait()
+                started = time.perf_counter()
+                response = await client.get(path, headers=headers)
+                latencies.append(time.perf_counter() - started)
+                if response.status_code >= 500:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "throughput_rps": round(requests / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }
+
+def run_mode(mode: str, db_path: str, port: int, args) -> dict:
+    with serve(db_path, port, DB_MODE=mode, DASHBOARD_CACHE_TTL="0") as base_url:
+        return asyncio.run(load(base_url, args.requests, args.concurrency, args.patients))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--patients", type=int, default=2000)
+    parser.add_argument("--readings", type=int, default=40000)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_async_")
+    try:
+        seed_path = os.path.join(workdir, "seed.db")
+        seed(seed_path, args.patients, args.readings)
+        results = {}
+        for mode in ("sync", "async"):
+            db_path = os.path.join(workdir, f"{mode}.db")
+            shutil.copy(seed_path, db_path)
+            results[mode] = run_mode(mode, db_path, args.port, args)
+        print(json.dumps(results, indent=2))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
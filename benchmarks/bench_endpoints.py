@@ -0,0 +1,224 @@
+"""
+Endpoint benchmark suite at multiple data scales.
+
+For every scale, seeds a database with generate_data.py, starts a uvicorn worker
+on a copy of it and measures latency percentiles and throughput for each route
+in main.py, one route at a time. Read routes run before the writes, so they see
+the seeded data. Results are written as JSON.
+
+    python benchmarks/bench_endpoints.py --scales 1k,100k --output results.json
+    python benchmarks/bench_endpoints.py --compare baseline.json results.json --threshold 0.15
+
+--compare exits with status 1 if any route's --metric got worse than baseline
+by more than --threshold (a fraction).
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import asyncio
+import argparse
+import platform
+import tempfile
+import subprocess
+from datetime import datetime, timezone
+
+from _common import ROOT, BENCH_USER, create_bench_user, percentile, serve
+
+SCALES = {"1k": 1_000, "10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+
+# Metrics where a larger value is an improvement; every other metric is a latency
+HIGHER_IS_BETTER = {"throughput_rps"}
+
+def _scale_patients(scale: str) -> int:
+    return SCALES[scale] if scale in SCALES else int(scale)
+
+def seed(path: str, patients: int, readings_per_patient: float, seed_value: int):
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    import generate_data
+
+    url = f"sqlite:///{path}"
+    generate_data.generate(url, patients=patients, readings_per_patient=readings_per_patient, seed=seed_value, replace=True, verbose=False)
+    create_bench_user(url)
+
+def _reading(rng, patients):
+    return {
+        "patient_id": rng.randint(1, patients),
+        "blood_pressure_sys": rng.randint(100, 180),
+        "blood_pressure_dia": rng.randint(60, 110),
+        "glucose": round(rng.uniform(4.0, 13.0), 1),
+    }
+
+# (name, method, request factory, share of --requests). Factories take (rng, patients, n)
+# and return (path, keyword arguments for httpx).
+ROUTES = [
+    ("GET /", "GET", lambda rng, p, n: ("/", {}), 1.0),
+    ("GET /users/me", "GET", lambda rng, p, n: ("/users/me", {}), 1.0),
+    ("GET /patients/", "GET", lambda rng, p, n: ("/patients/?limit=50", {}), 1.0),
+    ("GET /patients/{id}", "GET", lambda rng, p, n: (f"/patients/{rng.randint(1, p)}?limit=20", {}), 1.0),
+    ("GET /patients/{id}/trend", "GET", lambda rng, p, n: (f"/patients/{rng.randint(1, p)}/trend", {}), 1.0),
+    ("GET /followups/", "GET", lambda rng, p, n: ("/followups/?status=Pending&limit=100", {}), 1.0),
+    ("GET /dashboard/", "GET", lambda rng, p, n: ("/dashboard/", {}), 1.0),
+    ("GET /system/db-pool", "GET", lambda rng, p, n: ("/system/db-pool", {}), 0.5),
+    ("POST /token", "POST", lambda rng, p, n: ("/token", {"data": BENCH_USER}), 0.1),
+    ("POST /users/", "POST", lambda rng, p, n: ("/users/", {"json": {"username": f"bench_{n}", "password": "bench-password", "full_name": "Bench"}}), 0.1),
+    ("POST /patients/", "POST", lambda rng, p, n: ("/patients/", {"json": {"name": f"Bench_{n}", "age": rng.randint(18, 90), "gender": "Female"}}), 0.5),
+    ("PUT /patients/{id}", "PUT", lambda rng, p, n: (f"/patients/{rng.randint(1, p)}", {"json": {"contact_info": f"bench{n}@example.com"}}), 0.5),
+    ("POST /indicators/", "POST", lambda rng, p, n: ("/indicators/", {"json": _reading(rng, p)}), 1.0),
+    ("POST /indicators/batch", "POST", lambda rng, p, n: ("/indicators/batch", {"json": [_reading(rng, p) for _ in range(100)]}), 0.2),
+    ("PATCH /followups/{id}", "PATCH", lambda rng, p, n: (f"/followups/{rng.randint(1, p)}", {"json": {"status": "Completed"}}), 0.5),
+]
+
+async def measure(client, headers, method, factory, requests, concurrency, patients, warmup, seed_value):
+    rng = random.Random(seed_value)
+    calls = [factory(rng, patients, n) for n in range(warmup + requests)]
+    for path, kwargs in calls[:warmup]:
+        await client.request(method, path, headers=headers, **kwargs)
+
+    queue = asyncio.Queue()
+    for call in calls[warmup:]:
+        queue.put_nowait(call)
+    latencies, statuses = [], {}
+
+    async def worker():
+        while not queue.empty():
+            path, kwargs = queue.get_nowait()
+            started = time.perf_counter()
+            response = await client.request(method, path, headers=headers, **kwargs)
+            latencies.append(time.perf_counter() - started)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(min(concurrency, requests))))
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": requests,
+        "errors": sum(count for code, count in statuses.items() if code >= 400),
+        "statuses": {str(code): count for code, count in sorted(statuses.items())},
+        "throughput_rps": round(requests / elapsed, 1),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "max_ms": round(max(latencies) * 1000, 2),
+    }
+
+async def run_routes(base_url, patients, args):
+    import httpx
+    async with httpx.AsyncClient(base_url=base_url, timeout=300) as client:
+        token = (await client.post("/token", data=BENCH_USER)).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        selected = [r for r in ROUTES if not args.routes or any(part in r[0] for part in args.routes.split(","))]
+        results = {}
+        for n, (name, method, factory, share) in enumerate(selected):
+            requests = max(1, int(args.requests * share))
+            results[name] = await measure(client, headers, method, factory, requests, args.concurrency, patients, args.warmup, args.seed + n)
+            print(f"    {name:<28} p50 {results[name]['p50_ms']:>9} ms  p99 {results[name]['p99_ms']:>9} ms  {results[name]['throughput_rps']:>8} rps", file=sys.stderr)
+        return results
+
+def run_scale(db_path: str, patients: int, args) -> dict:
+    with serve(db_path, args.port, DASHBOARD_CACHE_TTL=str(args.dashboard_cache_ttl)) as base_url:
+        return asyncio.run(run_routes(base_url, patients, args))
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def benchmark(args) -> dict:
+    workdir = tempfile.mkdtemp(prefix="bench_endpoints_")
+    data_dir = args.data_dir or workdir
+    os.makedirs(data_dir, exist_ok=True)
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "readings_per_patient": args.readings_per_patient,
+            "seed": args.seed,
+        },
+        "scales": {},
+    }
+    try:
+        for scale in args.scales.split(","):
+            patients = _scale_patients(scale)
+            seed_path = os.path.join(data_dir, f"seed_{scale}_{args.readings_per_patient:g}_{args.seed}.db")
+            if not os.path.exists(seed_path):
+                print(f"Seeding {scale} ({patients:,} patients)...", file=sys.stderr)
+                started = time.perf_counter()
+                seed(seed_path, patients, args.readings_per_patient, args.seed)
+                print(f"  seeded in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+            # Writes go to a scratch copy so the seed can be reused
+            db_path = os.path.join(workdir, f"run_{scale}.db")
+            shutil.copy(seed_path, db_path)
+            print(f"Benchmarking {scale}...", file=sys.stderr)
+            report["scales"][scale] = {"patients": patients, "routes": run_scale(db_path, patients, args)}
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return report
+
+def compare(baseline: dict, candidate: dict, metric: str, threshold: float) -> list:
+    """Return one row per (scale, route) measured in both runs, flagging regressions beyond threshold."""
+    rows = []
+    for scale, result in candidate["scales"].items():
+        base_routes = baseline["scales"].get(scale, {}).get("routes", {})
+        for route, stats in result["routes"].items():
+            if route not in base_routes:
+                continue
+            before, after = base_routes[route][metric], stats[metric]
+            change = (after - before) / before if before else 0.0
+            worse = -change if metric in HIGHER_IS_BETTER else change
+            rows.append({
+                "scale": scale, "route": route, "before": before, "after": after,
+                "change": round(change, 4), "regression": worse > threshold,
+            })
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", default="1k,100k", help=f"comma-separated patient counts or presets ({', '.join(SCALES)})")
+    parser.add_argument("--readings-per-patient", type=float, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--requests", type=int, default=500, help="requests per read route; writes use a share of this")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--routes", default="", help="only run routes whose name contains one of these comma-separated strings")
+    parser.add_argument("--dashboard-cache-ttl", type=float, default=0, help="DASHBOARD_CACHE_TTL for the server (0 measures the uncached query)")
+    parser.add_argument("--data-dir", default=None, help="keep seeded databases here and reuse them across runs")
+    parser.add_argument("--port", type=int, default=8767)
+    parser.add_argument("--output", default=None, help="write the JSON report here instead of stdout")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CANDIDATE"), help="compare two saved reports instead of running")
+    parser.add_argument("--metric", default="p95_ms", help="metric compared by --compare")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed relative slowdown before a route is flagged")
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            baseline = json.load(f)
+        with open(args.compare[1]) as f:
+            candidate = json.load(f)
+        rows = compare(baseline, candidate, args.metric, args.threshold)
+        for row in rows:
+            flag = "REGRESSION" if row["regression"] else ""
+            print(f"{row['scale']:>6}  {row['route']:<28} {row['before']:>10} -> {row['after']:>10}  {row['change']:+8.1%}  {flag}")
+        regressions = [row for row in rows if row["regression"]]
+        print(f"{len(regressions)} regression(s) in {args.metric} beyond {args.threshold:.0%}")
+        sys.exit(1 if regressions else 0)
+
+    report = benchmark(args)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Login storm benchmark comparing HASH_POOL_KIND=inline, thread and process.
+
+For each kind a uvicorn worker is started on a copy of a small seeded database.
+Concurrent clients log in back to back while a prober keeps hitting cheap
+authenticated reads; the prober's latency shows how much hashing stalls the loop.
+
+    python benchmarks/bench_login.py --duration 10 --logins 32
+"""
+import os
+import json
+import time
+import shutil
+import asyncio
+import argparse
+import tempfile
+
+from _common import BENCH_USER, seed, percentile, serve
+
+async def storm(base_url: str, duration: float, logins: int, probes: int):
+    import httpx
+    credentials = BENCH_USER
+    async with httpx.AsyncClient(base_url=base_url, timeout=120) as client:
+        token = (await client.post("/token", data=credentials)).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        deadline = time.perf_counter() + duration
+        login_latencies, probe_latencies = [], []
+        statuses = {}
+
+        async def login_worker():
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                response = await client.post("/token", data=credentials)
+                login_latencies.append(time.perf_counter() - started)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        async def probe_worker():
+            paths = ("/users/me", "/patients/?limit=20")
+            i = 0
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                await client.get(paths[i % len(paths)], headers=headers)
+                probe_latencies.append(time.perf_counter() - started)
+                i += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(login_worker() for _ in range(logins)), *(probe_worker() for _ in range(probes)))
+        elapsed = time.perf_counter() - started
+    return {
+        "logins": len(login_latencies),
+        "logins_per_second": round(len(login_latencies) / elapsed, 1),
+        "login_statuses": {str(k): v for k, v in sorted(statuses.items())},
+        "login_p50_ms": round(percentile(login_latencies, 50) * 1000, 2),
+        "login_p99_ms": round(percentile(login_latencies, 99) * 1000, 2),
+        "probe_requests": len(probe_latencies),
+        "probe_p50_ms": round(percentile(probe_latencies, 50) * 1000, 2),
+        "probe_p99_ms": round(percentile(probe_latencies, 99) * 1000, 2),
+    }
+
+def run_kind(kind: str, db_path: str, port: int, args) -> dict:
+    env = {"HASH_POOL_KIND": kind}
+    if args.pool_size:
+        env["HASH_POOL_SIZE"] = str(args.pool_size)
+    with serve(db_path, port, **env) as base_url:
+        return asyncio.run(storm(base_url, args.duration, args.logins, args.probes))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--patients", type=int, default=500)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--logins", type=int, default=32, help="concurrent login clients")
+    parser.add_argument("--probes", type=int, default=4, help="concurrent clients on other endpoints")
+    parser.add_argument("--pool-size", type=int, default=0, help="HASH_POOL_SIZE (default: server default)")
+    parser.add_argument("--kinds", default="inline,thread,process")
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_login_")
+    try:
+        seed_path = os.path.join(workdir, "seed.db")
+        seed(seed_path, args.patients)
+        results = {}
+        for kind in args.kinds.split(","):
+            db_path = os.path.join(workdir, f"{kind}.db")
+            shutil.copy(seed_path, db_path)
+            results[kind] = run_kind(kind, db_path, args.port, args)
+        print(json.dumps(results, indent=2))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+CPU cost per row of the list/detail serialization paths.
+
+Seeds a database with generate_data.py and, in-process (no server, no
+network), times building the response body for GET /patients/, GET /followups/
+and GET /patients/{id} two ways:
+
+  legacy  full ORM objects, validated through the from_attributes schemas and
+          encoded the way FastAPI encodes a response_model (jsonable_encoder + json)
+  fast    the crud column-tuple records encoded with ORJSONResponse
+
+Both bodies are checked to be identical before timing. Reports process CPU time
+per row, so the numbers do not depend on what else the machine is doing.
+
+    python benchmarks/bench_serialization.py --patients 10000 --output serialization.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+SRC = os.path.join(ROOT, 'src')
+sys.path[:0] = [ROOT, SRC]
+
+from sqlalchemy.orm import sessionmaker
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+import generate_data, database, models, schemas, crud
+
+def _legacy_body(schema, content) -> bytes:
+    # What FastAPI did with the ORM objects: validate into the response model, dump, encode
+    return JSONResponse(jsonable_encoder(schema.model_validate(content).model_dump(mode="json"))).body
+
+def legacy_patients(db, limit):
+    rows = db.query(models.Patient).order_by(models.Patient.id).limit(limit + 1).all()
+    items, next_cursor = crud._page(rows, limit, lambda p: (p.id,))
+    return _legacy_body(schemas.PatientPage, {"items": items, "next_cursor": next_cursor}), len(items)
+
+def legacy_detail(db, patient_id, limit):
+    patient = db.query(models.Patient).filter(models.Patient.id == patient_id).first()
+    detail = schemas.Patient.model_validate(patient).model_dump()
+    rows = 1
+    for name, model, column in (
+        ("indicators", models.HealthIndicator, models.HealthIndicator.recorded_at),
+        ("assessments", models.RiskAssessment, models.RiskAssessment.assessment_date),
+        ("follow_ups", models.FollowUp, models.FollowUp.due_date),
+    ):
+        found = db.query(model).filter(model.patient_id == patient_id).order_by(column.desc(), model.id.desc()).limit(limit).all()
+        found.reverse()
+        detail[name] = found
+        rows += len(found)
+    return _legacy_body(schemas.PatientDetail, detail), rows
+
+def legacy_follow_ups(db, limit):
+    # The grouping query is unchanged; only how each follow-up is carried and encoded differs
+    groups, next_cursor = crud.get_grouped_follow_ups(db, limit=limit)
+    for group in groups:
+        group["followups"] = [
+            {"id": f.id, "task_description": f.task_description, "status": f.status, "due_date": f.due_date, "completed_at": f.completed_at}
+            for f in group["followups"]
+        ]
+    rows = sum(len(group["followups"]) for group in groups)
+    return _legacy_body(schemas.FollowUpGroupPage, {"items": groups, "next_cursor": next_cursor}), rows
+
+def fast_patients(db, limit):
+    items, next_cursor = crud.get_patients(db, limit=limit)
+    return ORJSONResponse({"items": items, "next_cursor": next_cursor}).body, len(items)
+
+def fast_detail(db, patient_id, limit):
+    detail = crud.get_patient_detail(db, patient_id, limit=limit)
+    return ORJSONResponse(detail).body, 1 + len(detail.indicators) + len(detail.assessments) + len(detail.follow_ups)
+
+def fast_follow_ups(db, limit):
+    groups, next_cursor = crud.get_grouped_follow_ups(db, limit=limit)
+    rows = sum(len(group["followups"]) for group in groups)
+    return ORJSONResponse({"items": groups, "next_cursor": next_cursor}).body, rows
+
+def measure(fn, db, iterations: int, *args) -> dict:
+    fn(db, *args)
+    rows = 0
+    cpu_started, wall_started = time.process_time(), time.perf_counter()
+    for _ in range(iterations):
+        db.expunge_all()
+        rows += fn(db, *args)[1]
+    cpu, wall = time.process_time() - cpu_started, time.perf_counter() - wall_started
+    return {
+        "rows": rows,
+        "cpu_us_per_row": round(cpu / rows * 1e6, 3),
+        "wall_ms_per_call": round(wall / iterations * 1000, 3),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--patients", type=int, default=2000)
+    parser.add_argument("--readings-per-patient", type=float, default=30)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--limit", type=int, default=100, help="page size / detail window")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--database", default=None, help="use this seeded SQLite file instead of generating one")
+    parser.add_argument("--output", default=None, help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    tmp = None
+    path = args.database
+    if path is None:
+        tmp = tempfile.mkdtemp(prefix="bench-serialization-")
+        path = os.path.join(tmp, "bench.db")
+        generate_data.generate(
+            f"sqlite:///{path}", patients=args.patients, readings_per_patient=args.readings_per_patient,
+            seed=args.seed, replace=True, verbose=False
+        )
+    engine, _ = database.create_engines(f"sqlite:///{path}")
+    db = sessionmaker(bind=engine)()
+    detail_id = max(1, args.patients // 2)
+    cases = {
+        "GET /patients/": (legacy_patients, fast_patients, (args.limit,)),
+        "GET /patients/{id}": (legacy_detail, fast_detail, (detail_id, args.limit)),
+        "GET /followups/": (legacy_follow_ups, fast_follow_ups, (args.limit,)),
+    }
+    report = {
+        "python": platform.python_version(),
+        "patients": args.patients,
+        "limit": args.limit,
+        "iterations": args.iterations,
+        "routes": {},
+    }
+    try:
+        for route, (legacy, fast, case_args) in cases.items():
+            before, after = legacy(db, *case_args)[0], fast(db, *case_args)[0]
+            if before != after:
+                raise SystemExit(f"{route}: fast path output differs from the schema output")
+            result = {
+                "legacy": measure(legacy, db, args.iterations, *case_args),
+                "fast": measure(fast, db, args.iterations, *case_args),
+            }
+            result["speedup"] = round(result["legacy"]["cpu_us_per_row"] / result["fast"]["cpu_us_per_row"], 2)
+            report["routes"][route] = result
+            print(
+                f"{route:<20} legacy {result['legacy']['cpu_us_per_row']:>8.2f} us/row   "
+                f"fast {result['fast']['cpu_us_per_row']:>8.2f} us/row   x{result['speedup']}",
+                file=sys.stderr
+            )
+    finally:
+        db.close()
+        engine.dispose()
+        if tmp:
+            for name in os.listdir(tmp):
+                os.remove(os.path.join(tmp, name))
+            os.rmdir(tmp)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+"""
+High-volume synthetic data generator for scale testing.
+
+Builds a population of patients with months of readings plus the matching risk
+assessments and follow-ups, bulk-inserted with executemany. Output is fully
+determined by --seed: every chunk of patients draws from its own seeded stream,
+so the same seed gives the same database whether or not --workers is used.
+
+    python generate_data.py --patients 100000 --readings-per-patient 100 --workers 4 --replace
+"""
+import os
+import sys
+import time
+import argparse
+from datetime import datetime, timezone
+from typing import Optional
+from multiprocessing import Pool
+
+import numpy as np
+
+# Add src directory to the system path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), 'src')))
+
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import sessionmaker
+import database, models, migrations, crud, risk_engine
+
+PATIENTS_PER_CHUNK = 1000
+
+INSERT_PATIENTS = "INSERT INTO patients (id, name, age, gender, contact_info, created_at) VALUES (?, ?, ?, ?, ?, ?)"
+INSERT_INDICATORS = "INSERT INTO health_indicators (id, patient_id, blood_pressure_sys, blood_pressure_dia, glucose, recorded_at) VALUES (?, ?, ?, ?, ?, ?)"
+# Tagged like ingest does, with the reading scored and the rule version it was scored under
+INSERT_ASSESSMENTS = (
+    "INSERT INTO risk_assessments (patient_id, risk_level, assessment_date, notes, indicator_id, rule_version) "
+    "VALUES (?, ?, ?, ?, ?, ?)"
+)
+INSERT_FOLLOW_UPS = "INSERT INTO follow_ups (patient_id, task_description, status, due_date, completed_at) VALUES (?, ?, ?, ?, ?)"
+
+def _sql_datetimes(values: np.ndarray) -> list:
+    # Same text layout SQLAlchemy's SQLite DateTime type writes and reads back
+    return np.char.replace(np.datetime_as_string(values, unit="us"), "T", " ").tolist()
+
+def generate_chunk(spec: tuple) -> dict:
+    """
+    Generate every row for patients first_id..first_id+count-1.
+    Readings are spread uniformly over the last `days` days, each patient drifting
+    from a personal baseline, and are scored with the vectorized risk engine.
+    """
+    chunk, first_id, count, seed, readings_per_patient, days, now_us = spec
+    rng = np.random.default_rng([seed, chunk])
+    now = np.datetime64(now_us, "us")
+    span_us = days * 86_400_000_000
+
+    # 1. Patients and their personal baselines
+    ids = np.arange(first_id, first_id + count)
+    ages = rng.integers(18, 96, count)
+    genders = np.where(rng.random(count) < 0.5, "Male", "Female")
+    created_at = now - np.timedelta64(span_us, "us") - rng.integers(0, 30 * 86_400_000_000, count).astype("timedelta64[us]")
+    base_sbp = rng.normal(130, 12, count)
+    base_dbp = rng.normal(82, 7, count)
+    base_glucose = rng.uniform(4.5, 8.5, count)
+    # Change over the whole period, so some patients improve and some deteriorate
+    drift_sbp = rng.normal(0, 10, count)
+    drift_glucose = rng.normal(0, 1, count)
+
+    # 2. Readings, in time order within each patient
+    per_patient = np.maximum(rng.poisson(readings_per_patient, count), 1)
+    owner = np.repeat(np.arange(count), per_patient)
+    offsets = rng.integers(0, span_us, owner.size)
+    order = np.lexsort((offsets, owner))
+    owner, offsets = owner[order], offsets[order]
+    progress = offsets / span_us
+    recorded_at = now - np.timedelta64(span_us, "us") + offsets.astype("timedelta64[us]")
+    sbp = np.clip(np.rint(base_sbp[owner] + drift_sbp[owner] * progress + rng.normal(0, 8, owner.size)), 80, 230).astype(np.int64)
+    dbp = np.clip(np.rint(base_dbp[owner] + drift_sbp[owner] * 0.5 * progress + rng.normal(0, 5, owner.size)), 40, 140).astype(np.int64)
+    glucose = np.clip(np.round(base_glucose[owner] + drift_glucose[owner] * progress + rng.normal(0, 0.8, owner.size), 1), 3.0, 25.0)
+    patient_ids = ids[owner].tolist()
+
+    # 3. One assessment and follow-up per reading; the next reading completes the previous follow-up
+    codes = risk_engine.calculate_risk_levels(sbp, dbp, glucose)
+    levels = np.array(risk_engine.RISK_LEVELS, dtype=object)[codes].tolist()
+    due_dates = recorded_at + risk_engine.FOLLOW_UP_DAYS[codes]
+    last = np.cumsum(per_patient) - 1
+    pending = np.zeros(owner.size, dtype=bool)
+    pending[last] = True
+    completed_at = np.empty(owner.size, dtype=object)
+    completed_at[~pending] = np.asarray(_sql_datetimes(recorded_at[1:]), dtype=object)[~pending[:-1]]
+
+    recorded_text = _sql_datetimes(recorded_at)
+    sbp, dbp, glucose = sbp.tolist(), dbp.tolist(), glucose.tolist()
+    return {
+        "patients": list(zip(
+            ids.tolist(), [f"Patient_{i:06d}" for i in ids.tolist()], ages.tolist(), genders.tolist(),
+            [f"patient{i}@example.com" for i in ids.tolist()], _sql_datetimes(created_at)
+        )),
+        "indicators": list(zip(patient_ids, sbp, dbp, glucose, recorded_text)),
+        "assessments": list(zip(
+            patient_ids, levels, recorded_text,
+            [f"Auto-generated based on BP {s}/{d} and Glucose {g}" for s, d, g in zip(sbp, dbp, glucose)]
+        )),
+        "follow_ups": list(zip(
+            patient_ids, risk_engine.FOLLOW_UP_DESCRIPTIONS[codes].tolist(),
+            np.where(pending, "Pending", "Completed").tolist(), _sql_datetimes(due_dates), completed_at.tolist()
+        )),
+    }
+
+def _drop_secondary_indexes(conn):
+    # Loading into bare tables and indexing once afterwards is much faster than
+    # maintaining every index row by row; migrations.upgrade recreates them
+    for table in models.Base.metadata.sorted_tables:
+        for index in table.indexes:
+            conn.exec_driver_sql(f'DROP INDEX IF EXISTS "{index.name}"')
+
+def generate(
+    url: str = database.SQLALCHEMY_DATABASE_URL,
+    patients: int = 1000,
+    readings_per_patient: float = 40,
+    days: int = 365,
+    seed: int = 42,
+    workers: int = 0,
+    chunk_size: int = PATIENTS_PER_CHUNK,
+    replace: bool = False,
+    end: Optional[datetime] = None,
+    verbose: bool = True,
+) -> dict:
+    """
+    Populate the database at `url` and return row counts and timings.
+    Readings end at `end` (default now); pass it too for byte-identical reruns.
+    """
+    started = time.perf_counter()
+    if replace:
+        path = make_url(url).database
+        for suffix in ("", "-wal", "-shm"):
+            if path and os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+    engine, _ = database.create_engines(url)
+    migrations.upgrade(engine)
+    with engine.begin() as conn:
+        first_id = (conn.execute(text("SELECT COALESCE(MAX(id), 0) FROM patients")).scalar() or 0) + 1
+        next_indicator_id = (conn.execute(text("SELECT COALESCE(MAX(id), 0) FROM health_indicators")).scalar() or 0) + 1
+        _drop_secondary_indexes(conn)
+
+    end = end or datetime.now(timezone.utc)
+    if end.tzinfo is not None:
+        end = end.astimezone(timezone.utc).replace(tzinfo=None)
+    now_us = int(np.datetime64(end, "us").astype(np.int64))
+    specs = [
+        (n, first_id + start, min(chunk_size, patients - start), seed, readings_per_patient, days, now_us)
+        for n, start in enumerate(range(0, patients, chunk_size))
+    ]
+    counts = {"patients": 0, "indicators": 0, "assessments": 0, "follow_ups": 0}
+
+    pool = Pool(workers) if workers > 0 else None
+    chunks = pool.imap(generate_chunk, specs) if pool else map(generate_chunk, specs)
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        # The load can be re-run from scratch, so skip fsyncs while it runs
+        cursor.execute("PRAGMA synchronous=OFF")
+        for rows in chunks:
+            cursor.executemany(INSERT_PATIENTS, rows["patients"])
+            # Chunks arrive in order, so reading ids are numbered here and shared with their assessments
+            indicator_ids = range(next_indicator_id, next_indicator_id + len(rows["indicators"]))
+            next_indicator_id += len(indicator_ids)
+            cursor.executemany(INSERT_INDICATORS, [(i, *row) for i, row in zip(indicator_ids, rows["indicators"])])
+            cursor.executemany(INSERT_ASSESSMENTS, [
+                (*row, i, risk_engine.RULE_VERSION) for i, row in zip(indicator_ids, rows["assessments"])
+            ])
+            cursor.executemany(INSERT_FOLLOW_UPS, rows["follow_ups"])
+            raw.commit()
+            for name in counts:
+                counts[name] += len(rows[name])
+            if verbose:
+                print(f"  {counts['patients']:,} patients, {counts['indicators']:,} readings ({time.perf_counter() - started:.1f}s)")
+        cursor.execute(f"PRAGMA synchronous={database.SQLITE_PRAGMAS['synchronous']}")
+        cursor.close()
+    finally:
+        raw.close()
+        if pool:
+            pool.close()
+            pool.join()
+    loaded = time.perf_counter()
+
+    # Indexes, planner statistics, then the derived tables
+    migrations.upgrade(engine)
+    db = sessionmaker(bind=engine)()
+    try:
+        crud.rebuild_patient_states(db)
+        crud.backfill_daily_rollups(db)
+    finally:
+        db.close()
+    engine.dispose()
+
+    elapsed = time.perf_counter() - started
+    return dict(
+        counts,
+        load_seconds=round(loaded - started, 2),
+        elapsed_seconds=round(elapsed, 2),
+        readings_per_second=round(counts["indicators"] / elapsed, 1) if elapsed > 0 else 0.0,
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database", default=database.SQLALCHEMY_DATABASE_URL, help="SQLAlchemy URL (default: DATABASE_URL)")
+    parser.add_argument("--patients", type=int, default=1000)
+    parser.add_argument("--readings-per-patient", type=float, default=40, help="mean readings per patient (Poisson)")
+    parser.add_argument("--days", type=int, default=365, help="history length readings are spread over")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=0, help="generator processes (0 generates in-process)")
+    parser.add_argument("--chunk-size", type=int, default=PATIENTS_PER_CHUNK, help="patients per generated chunk")
+    parser.add_argument("--end", type=datetime.fromisoformat, default=None, help="timestamp of the newest readings, UTC (default: now)")
+    parser.add_argument("--replace", action="store_true", help="delete the database file first instead of appending")
+    args = parser.parse_args()
+
+    print(f"Generating {args.patients:,} patients into {args.database} ...")
+    summary = generate(
+        args.database, args.patients, args.readings_per_patient, args.days,
+        args.seed, args.workers, args.chunk_size, args.replace, args.end
+    )
+    print(
+        f"Done: {summary['patients']:,} patients, {summary['indicators']:,} readings, "
+        f"{summary['follow_ups']:,} follow-ups in {summary['elapsed_seconds']}s "
+        f"({summary['readings_per_second']:,} readings/s)"
+    )
+
+if __name__ == "__main__":
+    main()
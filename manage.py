@@ -0,0 +1,172 @@
+import os
+import sys
+import json
+import argparse
+from datetime import datetime
+from sqlalchemy.orm import Session
+
+# Add the src directory to the Python path to allow relative imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), 'src')))
+
+import database
+import crud
+import migrations
+import export
+import snapshot
+import rescore
+import archive
+import risk_engine
+
+POWERBI_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'powerbi')
+
+def _shard_label(shard: int) -> str:
+    return f"[shard {shard}] " if database.shards is not None else ""
+
+def migrate(args):
+    created = []
+    for shard, writer in enumerate(database.writer_engines()):
+        created += migrations.upgrade(writer, shard=shard)
+    if created:
+        print(f"Created {len(created)} columns and indexes: {', '.join(created)}")
+    else:
+        print("Database is up to date.")
+
+def rebuild_state(args):
+    for shard, writer in enumerate(database.writer_engines()):
+        db = Session(bind=writer)
+        try:
+            count = crud.rebuild_patient_states(db)
+        finally:
+            db.close()
+        print(f"{_shard_label(shard)}Rebuilt current state for {count} patients.")
+
+def backfill_rollups(args):
+    for shard, writer in enumerate(database.writer_engines()):
+        db = Session(bind=writer)
+        try:
+            count = crud.backfill_daily_rollups(db)
+        finally:
+            db.close()
+        print(f"{_shard_label(shard)}Rebuilt {count} daily rollup rows.")
+
+def export_tables(args):
+    if database.shards is not None and args.incremental:
+        # Shards fill their id ranges side by side, so one id watermark cannot cover them all
+        raise SystemExit("--incremental is not supported with sharded storage; use --since")
+    os.makedirs(args.output_dir, exist_ok=True)
+    state_path = os.path.join(args.output_dir, "export_state.json")
+    state = {}
+    if os.path.exists(state_path):
+        with open(state_path) as f:
+            state = json.load(f)
+
+    for table in args.tables.split(","):
+        path = os.path.join(args.output_dir, f"{table}.{args.format}")
+        watermark = state.get(table, {}).get(args.format) if args.incremental else None
+        try:
+            # Shard k's ids all sort after shard k - 1's, so appending shard by shard keeps id order
+            count, last_id = 0, None
+            for shard, reader in enumerate(database.read_engines()):
+                written, shard_last_id = export.write_export(
+                    reader, table, args.format, path,
+                    since=args.since, since_id=watermark, append=args.incremental or shard > 0
+                )
+                count += written
+                last_id = shard_last_id if shard_last_id is not None else last_id
+        except ValueError as exc:
+            print(f"Skipped {table}: {exc}")
+            continue
+        if last_id is not None or not args.incremental:
+            state.setdefault(table, {})[args.format] = last_id if last_id is not None else watermark
+        print(f"Exported {count} rows from {table} to {path}.")
+
+    with open(state_path, "w") as f:
+        json.dump(state, f, indent=2)
+
+def snapshot_tables(args):
+    if database.shards is not None:
+        raise SystemExit("Parquet snapshots read a single database; they are not supported with sharded storage")
+    output_dir = os.path.join(args.output_dir, "parquet")
+    written = snapshot.snapshot(database.read_engine, output_dir, full=args.full, compact_min_files=args.compact_min_files)
+    compacted = written.pop("compacted_partitions")
+    for name, rows in written.items():
+        print(f"{name}: {rows} rows written.")
+    print(f"Snapshot saved to {output_dir} ({compacted} partitions compacted).")
+
+def rescore_readings(args):
+    def report(progress):
+        print(f"  scored through reading {progress['last_indicator_id']:,} of {progress['max_indicator_id']:,} ({progress['rows']:,} rows, {progress['rows_per_second']:,} rows/s)")
+    for shard, writer in enumerate(database.writer_engines()):
+        summary = rescore.rescore(
+            writer, rule_version=args.rule_version, chunk_size=args.chunk_size,
+            workers=args.workers, restart=args.restart, progress=report
+        )
+        print(
+            f"{_shard_label(shard)}Re-scored {summary['rows']:,} readings under rule version {summary['rule_version']} "
+            f"in {summary['elapsed_seconds']}s ({summary['rows_per_second']:,} rows/s); "
+            f"refreshed {summary['patients_refreshed']} patient states."
+        )
+
+def archive_history(args):
+    def report(progress):
+        print(f"  {progress['table']}: {progress['rows']:,} rows archived (through id {progress['last_id']:,})")
+    for shard, writer in enumerate(database.writer_engines()):
+        summary = archive.archive(
+            writer, older_than_days=args.older_than_days, chunk_size=args.chunk_size,
+            vacuum=args.vacuum, progress=report
+        )
+        for name, rows in summary["tables"].items():
+            print(f"{_shard_label(shard)}{name}: {rows:,} rows moved to the archive.")
+        print(f"{_shard_label(shard)}Archived rows older than {summary['cutoff']:%Y-%m-%d %H:%M} UTC in {summary['elapsed_seconds']}s.")
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Community Health Dashboard maintenance commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    upgrade = commands.add_parser("migrate", help="Create missing tables, columns and indexes on an existing database")
+    upgrade.set_defaults(func=migrate)
+
+    rebuild = commands.add_parser("rebuild-state", help="Recompute the per-patient current state table from history")
+    rebuild.set_defaults(func=rebuild_state)
+
+    backfill = commands.add_parser("backfill-rollups", help="Recompute per-patient daily reading rollups from history")
+    backfill.set_defaults(func=backfill_rollups)
+
+    dump = commands.add_parser("export", help="Write readings, assessments and follow-ups as CSV or NDJSON files for BI tools")
+    dump.add_argument("--tables", default=",".join(export.EXPORT_TABLES), help="comma-separated tables to export")
+    dump.add_argument("--format", choices=sorted(export.MEDIA_TYPES), default="csv")
+    dump.add_argument("--output-dir", default=POWERBI_DIR)
+    dump.add_argument("--since", type=datetime.fromisoformat, default=None, help="only rows recorded after this UTC timestamp")
+    dump.add_argument("--incremental", action="store_true", help="append rows after the id watermark saved by the previous export")
+    dump.set_defaults(func=export_tables)
+
+    parquet = commands.add_parser("snapshot", help="Write partitioned Parquet snapshots of the core tables and views for Power BI (needs pyarrow)")
+    parquet.add_argument("--output-dir", default=POWERBI_DIR)
+    parquet.add_argument("--full", action="store_true", help="rewrite everything instead of appending past the saved high-water marks")
+    parquet.add_argument("--compact-min-files", type=int, default=snapshot.SNAPSHOT_COMPACT_MIN_FILES, help="merge month partitions holding at least this many files (0 disables)")
+    parquet.set_defaults(func=snapshot_tables)
+
+    rescoring = commands.add_parser("rescore", help="Re-evaluate every stored reading under the current risk rules, resuming from the last checkpoint")
+    rescoring.add_argument("--rule-version", type=int, default=risk_engine.RULE_VERSION, help="version tag for the new assessments")
+    rescoring.add_argument("--chunk-size", type=int, default=rescore.RESCORE_CHUNK_SIZE, help="readings scored and committed per chunk")
+    rescoring.add_argument("--workers", type=int, default=rescore.RESCORE_WORKERS, help="scoring processes (0 scores in-process)")
+    rescoring.add_argument("--restart", action="store_true", help="ignore the saved checkpoint and scan from the first reading")
+    rescoring.set_defaults(func=rescore_readings)
+
+    archiving = commands.add_parser("archive", help="Move old readings, assessments and completed follow-ups into the archive database")
+    archiving.add_argument("--older-than-days", type=int, default=archive.ARCHIVE_AFTER_DAYS, help="archive rows older than this many days")
+    archiving.add_argument("--chunk-size", type=int, default=archive.ARCHIVE_CHUNK_SIZE, help="rows moved per transaction")
+    archiving.add_argument("--vacuum", action="store_true", help="VACUUM the live database afterwards to shrink the file")
+    archiving.set_defaults(func=archive_history)
+
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.func is not migrate:
+        for shard, writer in enumerate(database.writer_engines()):
+            migrations.upgrade(writer, shard=shard)
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Optional
+from sqlalchemy import MetaData, Table, Column, Index, select, update, delete, exists, func, and_, union_all
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+try:
+    from . import models
+except ImportError:
+    import models
+
+# Rows older than this move from the live tables to the archive database
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "365"))
+ARCHIVE_CHUNK_SIZE = int(os.getenv("ARCHIVE_CHUNK_SIZE", "5000"))
+# Defaults to "<database>_archive.db" beside the live database file
+ARCHIVE_DATABASE_PATH = os.getenv("ARCHIVE_DATABASE_PATH")
+SCHEMA = "archive"
+
+# Archived tables: (model, time column, extra condition on the live row). Pending follow-ups
+# are still being worked, and readings with an outbox entry still have derived writes due
+ARCHIVED_TABLES = {
+    "health_indicators": (models.HealthIndicator, "recorded_at", lambda live: ~exists().where(models.IndicatorOutbox.indicator_id == live.c.id)),
+    "risk_assessments": (models.RiskAssessment, "assessment_date", None),
+    "follow_ups": (models.FollowUp, "due_date", lambda live: live.c.status == "Completed"),
+}
+
+# The archive copies of the tables: same columns, no foreign keys (SQLite cannot
+# enforce them across databases) and only the (patient_id, time) index reads need
+metadata = MetaData()
+tables = {}
+for _name, (_model, _time_name, _) in ARCHIVED_TABLES.items():
+    tables[_name] = Table(
+        _name, metadata,
+        *[Column(c.name, c.type, primary_key=c.primary_key, nullable=c.nullable) for c in _model.__table__.columns],
+        Index(f"ix_{_name}_patient_id_{_time_name}", "patient_id", _time_name),
+        schema=SCHEMA
+    )
+
+def _connection(bind):
+    return bind.connection() if isinstance(bind, Session) else bind
+
+def archive_path(conn) -> Optional[str]:
+    if ARCHIVE_DATABASE_PATH:
+        return ARCHIVE_DATABASE_PATH
+    database = conn.engine.url.database
+    if not database or database == ":memory:" or database.startswith("file:"):
+        return None
+    root, ext = os.path.splitext(database)
+    return f"{root}_archive{ext or '.db'}"
+
+def attach(bind, create: bool = False) -> bool:
+    """
+    Attach the archive database to this connection (a Session's, or a Connection)
+    as `archive`. Returns False if there is no archive, unless create=True, which
+    creates the file and its tables. Attaching is remembered per pooled connection.
+    """
+    conn = _connection(bind)
+    if conn.info.get("archive_attached"):
+        return True
+    path = archive_path(conn)
+    if path is None or not (create or os.path.exists(path)):
+        return False
+    # SQLite refuses ATTACH inside a transaction; the caller reads the live tier only this time
+    if getattr(conn.connection.dbapi_connection, "in_transaction", False):
+        return False
+    conn.exec_driver_sql(f"ATTACH DATABASE ? AS {SCHEMA}", (path,))
+    conn.info["archive_attached"] = True
+    if create:
+        conn.exec_driver_sql(f"PRAGMA {SCHEMA}.journal_mode=WAL")
+        metadata.create_all(conn)
+    return True
+
+def archived_before(db, table_name: str) -> Optional[datetime]:
+    watermark = models.ArchiveWatermark
+    return db.execute(select(watermark.archived_before).where(watermark.table_name == table_name)).scalar()
+
+def reaches(db, table_name: str, since: Optional[datetime] = None) -> bool:
+    """True if a window starting at `since` (None for all time) may hold archived rows, with the archive attached."""
+    cutoff = archived_before(db, table_name)
+    if cutoff is None:
+        return False
+    if since is not None:
+        if since.tzinfo is not None:
+            since = since.astimezone(timezone.utc).replace(tzinfo=None)
+        if since >= cutoff:
+            return False
+    return attach(db)
+
+def tiered(db, table_name: str):
+    """
+    The live table, or when rows have been archived, a union of both tiers with
+    the same columns. Archived copies of rows still live (a move interrupted
+    between its copy and delete) are left out, so no row is counted twice.
+    """
+    live = models.Base.metadata.tables[table_name]
+    if not reaches(db, table_name):
+        return live
+    cold = tables[table_name]
+    moved = select(*cold.c).where(~exists().where(live.c.id == cold.c.id))
+    return union_all(select(*live.c), moved).subquery(table_name)
+
+def _save_watermark(conn, table_name: str, **values):
+    values["updated_at"] = datetime.now(timezone.utc)
+    stmt = sqlite_insert(models.ArchiveWatermark).values(table_name=table_name, **values)
+    conn.execute(stmt.on_conflict_do_update(index_elements=[models.ArchiveWatermark.table_name], set_=values))
+
+def archive(
+    engine,
+    older_than_days: int = ARCHIVE_AFTER_DAYS,
+    chunk_size: int = ARCHIVE_CHUNK_SIZE,
+    vacuum: bool = False,
+    progress: Optional[Callable[[dict], None]] = None
+) -> dict:
+    """
+    Move rows older than `older_than_days` from the live tables into the archive
+    database, `chunk_size` rows per transaction in id order. Rows are copied and
+    committed before they are deleted, so an interrupted run loses nothing and a
+    repeated one picks up where it stopped. Returns rows moved per table.
+    """
+    started = time.perf_counter()
+    cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=older_than_days)
+    moved = {}
+    with engine.connect() as conn:
+        if not attach(conn, create=True):
+            raise RuntimeError("Archiving needs a file database (or ARCHIVE_DATABASE_PATH)")
+        conn.commit()
+        for name, (model, time_name, condition) in ARCHIVED_TABLES.items():
+            live, cold = model.__table__, tables[name]
+            # 1. Raise the watermark first, so readers look into the archive as soon as rows start moving
+            previous = archived_before(conn, name)
+            _save_watermark(conn, name, archived_before=max(previous, cutoff) if previous else cutoff)
+            conn.commit()
+
+            where = [live.c[time_name] < cutoff] + ([condition(live)] if condition else [])
+            batch = select(live.c.id).where(*where).order_by(live.c.id).limit(chunk_size).subquery()
+            moved[name] = 0
+            while True:
+                last_id = conn.execute(select(func.max(batch.c.id))).scalar()
+                if last_id is None:
+                    break
+                chunk = and_(live.c.id <= last_id, *where)
+                # 2. Copy, then delete in a second transaction: a commit spanning attached WAL
+                # databases is atomic per database only, so a crash must leave rows in both tiers, never neither
+                conn.execute(cold.insert().prefix_with("OR IGNORE").from_select(list(live.c.keys()), select(*live.c).where(chunk)))
+                conn.commit()
+                count = conn.execute(delete(live).where(chunk)).rowcount
+                watermark = models.ArchiveWatermark
+                conn.execute(update(watermark).where(watermark.table_name == name).values(
+                    rows_archived=watermark.rows_archived + count, updated_at=datetime.now(timezone.utc)
+                ))
+                conn.commit()
+                moved[name] += count
+                if progress:
+                    progress({"table": name, "last_id": last_id, "rows": moved[name]})
+
+        if vacuum and any(moved.values()):
+            # Hands the freed pages back to the filesystem; needs as much free disk as the live file
+            conn.exec_driver_sql("VACUUM main")
+
+    return {
+        "cutoff": cutoff,
+        "tables": moved,
+        "elapsed_seconds": round(time.perf_counter() - started, 2),
+    }
@@ -1,32 +1,94 @@
 from datetime import datetime, timedelta, timezone
 from typing import Optional
 from jose import JWTError, jwt
-from passlib.context import CryptContext
-import hashlib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import asyncio
+import multiprocessing
+import threading
+import os
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
 try:
-    from . import models, schemas, database
+    from . import models, schemas, database, cache, hashing
 except ImportError:
-    import models, schemas, database
+    import models, schemas, database, cache, hashing
 
 # Configuration
 SECRET_KEY = "a_very_secret_key_for_demo_purposes"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+# Resolved users (by token subject) and verified tokens are cached in-process
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", "60"))
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "4096"))
+user_cache = cache.TTLCache(maxsize=AUTH_CACHE_SIZE, ttl=AUTH_CACHE_TTL)
+token_cache = cache.TTLCache(maxsize=AUTH_CACHE_SIZE, ttl=AUTH_CACHE_TTL)
+
 # Password hashing context
-pwd_context = CryptContext(schemes=["sha256_crypt"], deprecated="auto")
+pwd_context = hashing.pwd_context
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+# sha256_crypt holds the GIL, so request-path hashing runs in worker processes by default.
+# HASH_POOL_KIND is "process", "thread" or "inline" (on the event loop, as before).
+HASH_POOL_KIND = os.getenv("HASH_POOL_KIND", "process")
+HASH_POOL_SIZE = int(os.getenv("HASH_POOL_SIZE", str(min(4, os.cpu_count() or 1))))
+# Hashing jobs allowed in flight before logins are shed with 503
+HASH_MAX_PENDING = int(os.getenv("HASH_MAX_PENDING", "256"))
+
+_hash_pool = None
+_hash_pool_lock = threading.Lock()
+_hash_pending = 0
+
+class HashPoolBusy(Exception):
+    pass
+
 def verify_password(plain_password, hashed_password):
-    password_hash = hashlib.sha256(plain_password.encode()).hexdigest()
-    return pwd_context.verify(password_hash, hashed_password)
+    return pwd_context.verify(hashing.prehash(plain_password), hashed_password)
 
 def get_password_hash(password):
-    password_hash = hashlib.sha256(password.encode()).hexdigest()
-    return pwd_context.hash(password_hash)
+    return hashing.hash_password(password)
+
+def _get_hash_pool():
+    global _hash_pool
+    with _hash_pool_lock:
+        if _hash_pool is None:
+            if HASH_POOL_KIND == "process":
+                # Forking the multithreaded server can deadlock the child; forkserver (spawn where
+                # unavailable, e.g. Windows) workers start clean and import only the hashing module
+                method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+                _hash_pool = ProcessPoolExecutor(max_workers=HASH_POOL_SIZE, mp_context=multiprocessing.get_context(method))
+            else:
+                _hash_pool = ThreadPoolExecutor(max_workers=HASH_POOL_SIZE)
+        return _hash_pool
+
+def shutdown_hash_pool():
+    global _hash_pool
+    with _hash_pool_lock:
+        pool, _hash_pool = _hash_pool, None
+    if pool is not None:
+        pool.shutdown(wait=True)
+
+async def _run_hashing(fn, *args):
+    global _hash_pending
+    if HASH_POOL_KIND == "inline":
+        return fn(*args)
+    with _hash_pool_lock:
+        if _hash_pending >= HASH_MAX_PENDING:
+            raise HashPoolBusy()
+        _hash_pending += 1
+    try:
+        return await asyncio.wrap_future(_get_hash_pool().submit(fn, *args))
+    finally:
+        with _hash_pool_lock:
+            _hash_pending -= 1
+
+async def verify_and_update_password_async(plain_password, hashed_password):
+    return await _run_hashing(hashing.verify_and_update, plain_password, hashed_password)
+
+async def get_password_hash_async(password):
+    return await _run_hashing(hashing.hash_password, password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -39,21 +101,67 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(database.get_db)):
+USER_COLUMNS = ("id", "username", "hashed_password", "full_name", "is_active", "created_at")
+
+def _get_user(db: Session, username: str):
+    user = db.query(models.User).filter(models.User.username == username).first()
+    return None if user is None else {column: getattr(user, column) for column in USER_COLUMNS}
+
+def _decode_subject(token: str) -> Optional[str]:
+    username = token_cache.get(token)
+    if username is not None:
+        return username
+    payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    username = payload.get("sub")
+    if username is not None:
+        # Never keep a token cached past its own expiry
+        remaining = payload.get("exp", 0) - datetime.now(timezone.utc).timestamp()
+        token_cache.set(token, username, ttl=min(token_cache.ttl, remaining))
+    return username
+
+def invalidate_user(username: str):
+    """Drop a cached user; call after changing users outside the ORM (bulk updates, raw SQL)."""
+    user_cache.invalidate(username)
+
+# Changed usernames are held on the session and dropped from the cache once the change
+# commits; dropping them at flush would let a concurrent request re-cache the old row
+@event.listens_for(models.User, "after_update")
+@event.listens_for(models.User, "after_delete")
+def _collect_changed_user(mapper, connection, target):
+    changed = object_session(target).info.setdefault("changed_usernames", set())
+    changed.add(target.username)
+    changed.update(inspect(target).attrs.username.history.deleted or ())
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_users(session):
+    for username in session.info.pop("changed_usernames", ()):
+        invalidate_user(username)
+
+@event.listens_for(Session, "after_transaction_end")
+def _discard_changed_users(session, transaction):
+    # A rolled-back change leaves the cached copy valid
+    if transaction.parent is None:
+        session.info.pop("changed_usernames", None)
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(database.get_read_session)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
+        username = _decode_subject(token)
         if username is None:
             raise credentials_exception
         token_data = schemas.TokenData(username=username)
     except JWTError:
         raise credentials_exception
-    user = db.query(models.User).filter(models.User.username == token_data.username).first()
+    user = user_cache.get(token_data.username)
     if user is None:
-        raise credentials_exception
-    return user
+        generation = user_cache.generation(token_data.username)
+        user = await database.run(db, _get_user, token_data.username)
+        if user is None:
+            raise credentials_exception
+        user_cache.set(token_data.username, user, generation=generation)
+    # A fresh transient instance per request, so cached state is never shared or attached to a session
+    return models.User(**user)
@@ -0,0 +1,99 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+class TTLCache:
+    """
+    Thread-safe, size-bounded LRU cache whose entries expire after `ttl` seconds.
+    A ttl of 0 disables caching. Every key carries a generation number that
+    invalidate() bumps, so a value built before an invalidation is never stored.
+    """
+
+    def __init__(self, maxsize: int = 128, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._generations = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.rebuilds = 0
+        self.rebuild_seconds = 0.0
+        self.last_rebuild_seconds = 0.0
+        self.max_rebuild_seconds = 0.0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[1] > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None, generation: Optional[int] = None):
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+        with self._lock:
+            if generation is not None and generation != self._generations.get(key, 0):
+                return
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def generation(self, key: Hashable) -> int:
+        with self._lock:
+            return self._generations.get(key, 0)
+
+    def get_or_build(self, key: Hashable, builder: Callable[[], Any]) -> Any:
+        missing = object()
+        value = self.get(key, missing)
+        if value is not missing:
+            return value
+        generation = self.generation(key)
+        started = time.perf_counter()
+        value = builder()
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.rebuilds += 1
+            self.rebuild_seconds += elapsed
+            self.last_rebuild_seconds = elapsed
+            self.max_rebuild_seconds = max(self.max_rebuild_seconds, elapsed)
+        self.set(key, value, generation=generation)
+        return value
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            self._generations[key] = self._generations.get(key, 0) + 1
+            self._data.pop(key, None)
+            self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._data):
+                self._generations[key] = self._generations.get(key, 0) + 1
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "invalidations": self.invalidations,
+                "rebuilds": self.rebuilds,
+                "avg_rebuild_ms": round(self.rebuild_seconds / self.rebuilds * 1000, 3) if self.rebuilds else 0.0,
+                "last_rebuild_ms": round(self.last_rebuild_seconds * 1000, 3),
+                "max_rebuild_ms": round(self.max_rebuild_seconds * 1000, 3),
+            }
@@ -1,24 +1,147 @@
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta, timezone
-from typing import Optional, List, Dict
-from sqlalchemy import func, case
+from typing import Optional, List, Dict, Tuple
+from dataclasses import fields
+from sqlalchemy import func, case, insert, select, update, delete, and_, or_, tuple_, bindparam, type_coerce, String
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+import os
+import time
+import json
+import base64
+import numpy as np
 
 try:
-    from . import models, schemas, risk_engine, auth
+    from . import models, schemas, risk_engine, auth, cache, trend, archive
 except ImportError:
-    import models, schemas, risk_engine, auth
+    import models, schemas, risk_engine, auth, cache, trend, archive
+
+# Dashboard results are cached per database and dropped whenever a write in this process commits;
+# writes from other processes (workers, manage.py jobs) show up once the entry expires
+DASHBOARD_CACHE_TTL = float(os.getenv("DASHBOARD_CACHE_TTL", "30"))
+dashboard_cache = cache.TTLCache(maxsize=8, ttl=DASHBOARD_CACHE_TTL)
+
+def _dashboard_key(db: Session):
+    # Keyed by database file so sync and aiosqlite sessions share one entry
+    return db.get_bind().url.database
+
+def _invalidate_dashboard(db: Session):
+    dashboard_cache.invalidate(_dashboard_key(db))
+
+def _as_utc_naive(value: datetime) -> datetime:
+    # Stored datetimes are naive UTC, so aware filter values are converted before comparing
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+# Pagination
+def encode_cursor(*values) -> str:
+    payload = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+# Converters for the keys each listing encodes in its cursor
+PATIENT_CURSOR = (int,)
+FOLLOW_UP_CURSOR = (datetime.fromisoformat, int)
+
+# SQLite integers are signed 64-bit; binding anything wider raises OverflowError mid-query
+SQLITE_INT_RANGE = range(-2**63, 2**63)
+
+def decode_cursor(cursor: str, *converters) -> list:
+    # Raises ValueError for anything that was not produced by encode_cursor
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not isinstance(values, list) or len(values) != len(converters):
+            raise ValueError
+        values = [convert(value) for convert, value in zip(converters, values)]
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError("Malformed cursor")
+    if any(isinstance(value, int) and value not in SQLITE_INT_RANGE for value in values):
+        raise ValueError("Malformed cursor")
+    return values
+
+def _page(rows: list, limit: int, key) -> Tuple[list, Optional[str]]:
+    # Rows are fetched with limit + 1 so the extra row tells us whether another page exists
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, encode_cursor(*key(rows[-1]))
+    return rows, None
+
+def merge_pages(pages: list, limit: int, key) -> Tuple[list, Optional[str]]:
+    # Combines the (items, next_cursor) pages several shards returned for one cursor into one page
+    items = sorted((item for page, _ in pages for item in page), key=key)
+    more = len(items) > limit or any(next_cursor for _, next_cursor in pages)
+    items = items[:limit]
+    return items, encode_cursor(*key(items[-1])) if more and items else None
 
 # Patient Operations
 def get_patient(db: Session, patient_id: int):
     return db.query(models.Patient).filter(models.Patient.id == patient_id).first()
 
-def get_patients(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Patient).offset(skip).limit(limit).all()
+PATIENT_DETAIL_COLLECTIONS = ("indicators", "assessments", "follow_ups")
+
+def record_columns(source, record) -> list:
+    # Columns of a model or table in the record's field order, so each result row unpacks straight into the record
+    table = getattr(source, "__table__", source)
+    return [table.c[f.name] for f in fields(record) if f.name in table.c]
+
+def _recent_rows(db: Session, table, record, time_name: str, patient_id: int, limit: int, since: Optional[datetime]):
+    # Newest `limit` rows (optionally since a timestamp) via the (patient_id, time) index, returned oldest first
+    time_column = table.c[time_name]
+    stmt = select(*record_columns(table, record)).where(table.c.patient_id == patient_id)
+    if since:
+        stmt = stmt.where(time_column >= _as_utc_naive(since))
+    rows = db.execute(stmt.order_by(time_column.desc(), table.c.id.desc()).limit(limit)).all()
+    return [record(*row) for row in reversed(rows)]
+
+def _merge_tiers(live: list, archived: list, time_name: str, limit: int) -> list:
+    # Newest `limit` of both windows, oldest first; a row caught mid-move is kept once, from the live tier
+    live_ids = {r.id for r in live}
+    merged = [r for r in archived if r.id not in live_ids] + live
+    merged.sort(key=lambda r: (getattr(r, time_name) is not None, getattr(r, time_name) or datetime.min, r.id))
+    return merged[-limit:]
+
+def get_patient_detail(
+    db: Session,
+    patient_id: int,
+    limit: int = 100,
+    since: Optional[datetime] = None,
+    include=PATIENT_DETAIL_COLLECTIONS
+):
+    row = db.execute(
+        select(*record_columns(models.Patient, schemas.PatientRecord)).where(models.Patient.id == patient_id)
+    ).first()
+    if row is None:
+        return None
+    detail = schemas.PatientDetailRecord(*row)
+    windows = {
+        "indicators": (models.HealthIndicator, schemas.HealthIndicatorRecord, "recorded_at"),
+        "assessments": (models.RiskAssessment, schemas.RiskAssessmentRecord, "assessment_date"),
+        "follow_ups": (models.FollowUp, schemas.FollowUpRecord, "due_date"),
+    }
+    for name, (model, record, time_name) in windows.items():
+        if name not in include:
+            continue
+        table = model.__table__
+        rows = _recent_rows(db, table, record, time_name, patient_id, limit, since)
+        # A window the live tier cannot fill is topped up from the archive when it reaches past the watermark
+        if len(rows) < limit and archive.reaches(db, table.name, since):
+            archived = _recent_rows(db, archive.tables[table.name], record, time_name, patient_id, limit, since)
+            rows = _merge_tiers(rows, archived, time_name, limit)
+        setattr(detail, name, rows)
+    return detail
+
+def get_patients(db: Session, cursor: Optional[str] = None, limit: int = 100):
+    stmt = select(*record_columns(models.Patient, schemas.PatientRecord))
+    if cursor:
+        (last_id,) = decode_cursor(cursor, *PATIENT_CURSOR)
+        stmt = stmt.where(models.Patient.id > last_id)
+    rows = db.execute(stmt.order_by(models.Patient.id).limit(limit + 1)).all()
+    return _page([schemas.PatientRecord(*row) for row in rows], limit, lambda p: (p.id,))
 
 def create_patient(db: Session, patient: schemas.PatientCreate):
     db_patient = models.Patient(**patient.model_dump())
     db.add(db_patient)
     db.commit()
+    _invalidate_dashboard(db)
     db.refresh(db_patient)
     return db_patient
 
@@ -30,14 +153,17 @@ def update_patient(db: Session, patient_id: int, patient_update: schemas.Patient
     for key, value in update_data.items():
         setattr(db_patient, key, value)
     db.commit()
+    _invalidate_dashboard(db)
     db.refresh(db_patient)
     return db_patient
 
 # Health Indicator & Risk Assessment Operations
 def create_patient_indicator(db: Session, indicator: schemas.HealthIndicatorCreate):
+    now = datetime.now(timezone.utc)
     # 1. Save health indicator
-    db_indicator = models.HealthIndicator(**indicator.model_dump())
+    db_indicator = models.HealthIndicator(**indicator.model_dump(), recorded_at=now)
     db.add(db_indicator)
+    db.flush()
     
     # 2. Trigger Risk Engine (US-04)
     risk_level = risk_engine.calculate_risk_level(
@@ -50,7 +176,10 @@ def create_patient_indicator(db: Session, indicator: schemas.HealthIndicatorCrea
     db_assessment = models.RiskAssessment(
         patient_id=indicator.patient_id,
         risk_level=risk_level,
-        notes=f"Auto-generated based on BP {indicator.blood_pressure_sys}/{indicator.blood_pressure_dia} and Glucose {indicator.glucose}"
+        assessment_date=now,
+        notes=f"Auto-generated based on BP {indicator.blood_pressure_sys}/{indicator.blood_pressure_dia} and Glucose {indicator.glucose}",
+        indicator_id=db_indicator.id,
+        rule_version=risk_engine.RULE_VERSION
     )
     db.add(db_assessment)
     
@@ -60,42 +189,543 @@ def create_patient_indicator(db: Session, indicator: schemas.HealthIndicatorCrea
         models.FollowUp.status == "Pending"
     ).update({
         "status": "Completed",
-        "completed_at": datetime.now(timezone.utc)
+        "completed_at": now
     }, synchronize_session=False)
     
-    # 5. Generate new Follow-up Task (US-07)
-    db_followup = risk_engine.generate_follow_up_task(indicator.patient_id, risk_level)
+    # 5. Generate new Follow-up Task (US-07), due from the reading's time as on the batch and outbox paths
+    due_dates, descriptions = risk_engine.generate_follow_up_tasks([risk_engine.RISK_CODES[risk_level]], now)
+    db_followup = models.FollowUp(
+        patient_id=indicator.patient_id,
+        task_description=descriptions[0],
+        status="Pending",
+        due_date=due_dates.astype(object)[0]
+    )
     db.add(db_followup)
     
+    # 6. Refresh the patient's current state, folding the reading into its running statistics
+    stats = trend.fold(
+        _trend_stats(get_patient_state(db, indicator.patient_id)), now,
+        indicator.blood_pressure_sys, indicator.blood_pressure_dia, indicator.glucose
+    )
+    _upsert_patient_states(db, [{
+        "patient_id": indicator.patient_id,
+        "risk_level": risk_level,
+        "last_sbp": indicator.blood_pressure_sys,
+        "last_dbp": indicator.blood_pressure_dia,
+        "last_glucose": indicator.glucose,
+        "last_recorded_at": now,
+        "last_assessed_at": now,
+        "next_follow_up_due": db_followup.due_date,
+        **stats
+    }])
+    
+    # 7. Fold the reading into the patient's daily rollup
+    _upsert_daily_rollups(db, [indicator], [now])
+    
     db.commit()
+    _invalidate_dashboard(db)
     db.refresh(db_indicator)
     return db_indicator
 
+def _apply_readings(db: Session, indicators: list, indicator_ids: List[int], recorded_at: List[datetime]) -> Tuple[List[str], list]:
+    """
+    Derived writes for stored readings: risk assessments, follow-up completion and
+    creation, patient states and daily rollups. `indicators` (anything with the
+    reading attributes) must be in time order, with `indicator_ids` and `recorded_at` aligned to it.
+    Returns (risk levels, follow-up due dates), aligned with the readings.
+    """
+    # 1. Score every reading up front
+    risk_codes = risk_engine.calculate_risk_levels(
+        np.fromiter((i.blood_pressure_sys for i in indicators), dtype=np.float64, count=len(indicators)),
+        np.fromiter((i.blood_pressure_dia for i in indicators), dtype=np.float64, count=len(indicators)),
+        np.fromiter((i.glucose for i in indicators), dtype=np.float64, count=len(indicators))
+    )
+    risk_levels = [risk_engine.RISK_LEVELS[c] for c in risk_codes.tolist()]
+    due_dates, descriptions = risk_engine.generate_follow_up_tasks(risk_codes, recorded_at)
+    due_dates = due_dates.astype(object)
+
+    # 2. Each patient's earlier pending follow-ups are completed by their first reading here,
+    # with one statement per distinct reading time (a single statement for a batch upload)
+    first_reading: Dict[int, datetime] = {}
+    for i, at in zip(indicators, recorded_at):
+        first_reading.setdefault(i.patient_id, at)
+    completing: Dict[datetime, List[int]] = {}
+    for patient_id, at in first_reading.items():
+        completing.setdefault(at, []).append(patient_id)
+    for at, patient_ids in completing.items():
+        db.query(models.FollowUp).filter(
+            models.FollowUp.patient_id.in_(patient_ids),
+            models.FollowUp.status == "Pending"
+        ).update({
+            "status": "Completed",
+            "completed_at": at
+        }, synchronize_session=False)
+
+    # 3. Bulk insert risk assessments
+    db.execute(insert(models.RiskAssessment), [
+        {
+            "patient_id": i.patient_id,
+            "risk_level": level,
+            "assessment_date": at,
+            "notes": f"Auto-generated based on BP {i.blood_pressure_sys}/{i.blood_pressure_dia} and Glucose {i.glucose}",
+            "indicator_id": indicator_id,
+            "rule_version": risk_engine.RULE_VERSION
+        }
+        for i, level, indicator_id, at in zip(indicators, risk_levels, indicator_ids, recorded_at)
+    ])
+
+    # 4. Bulk insert follow-ups. Replaying the readings one at a time would complete every
+    # follow-up except the last one per patient, each at the time of the patient's next reading.
+    next_reading: Dict[int, datetime] = {}
+    completed_at = [None] * len(indicators)
+    for n in range(len(indicators) - 1, -1, -1):
+        patient_id = indicators[n].patient_id
+        completed_at[n] = next_reading.get(patient_id)
+        next_reading[patient_id] = recorded_at[n]
+    db.execute(insert(models.FollowUp), [
+        {
+            "patient_id": i.patient_id,
+            "task_description": descriptions[n],
+            "status": "Pending" if completed_at[n] is None else "Completed",
+            "due_date": due_dates[n],
+            "completed_at": completed_at[n]
+        }
+        for n, i in enumerate(indicators)
+    ])
+
+    # 5. Refresh current state from each patient's last reading, folding every reading
+    # into the running statistics loaded for the patients in one query
+    last_index = {i.patient_id: n for n, i in enumerate(indicators)}
+    stats = _load_trend_stats(db, list(last_index))
+    for i, at in zip(indicators, recorded_at):
+        stats[i.patient_id] = trend.fold(stats.get(i.patient_id), at, i.blood_pressure_sys, i.blood_pressure_dia, i.glucose)
+    _upsert_patient_states(db, [
+        {
+            "patient_id": indicators[n].patient_id,
+            "risk_level": risk_levels[n],
+            "last_sbp": indicators[n].blood_pressure_sys,
+            "last_dbp": indicators[n].blood_pressure_dia,
+            "last_glucose": indicators[n].glucose,
+            "last_recorded_at": recorded_at[n],
+            "last_assessed_at": recorded_at[n],
+            "next_follow_up_due": due_dates[n],
+            **stats[indicators[n].patient_id]
+        }
+        for n in last_index.values()
+    ])
+
+    # 6. Fold the readings into the daily rollups
+    _upsert_daily_rollups(db, indicators, recorded_at)
+    return risk_levels, due_dates
+
+def create_patient_indicators_batch(db: Session, indicators: List[schemas.HealthIndicatorCreate]):
+    started = time.perf_counter()
+    now = datetime.now(timezone.utc)
+    items = []
+
+    if indicators:
+        # 1. Bulk insert health indicators, keeping ids in batch order
+        indicator_rows = [dict(i.model_dump(), recorded_at=now) for i in indicators]
+        indicator_ids = db.scalars(
+            insert(models.HealthIndicator).returning(
+                models.HealthIndicator.id, sort_by_parameter_order=True
+            ),
+            indicator_rows
+        ).all()
+
+        # 2. Assessments, follow-ups, patient states and rollups for the whole batch
+        risk_levels, due_dates = _apply_readings(db, indicators, indicator_ids, [now] * len(indicators))
+
+        db.commit()
+        _invalidate_dashboard(db)
+
+        for n, (i, level) in enumerate(zip(indicators, risk_levels)):
+            items.append({
+                "index": n,
+                "id": indicator_ids[n],
+                "patient_id": i.patient_id,
+                "blood_pressure_sys": i.blood_pressure_sys,
+                "blood_pressure_dia": i.blood_pressure_dia,
+                "glucose": i.glucose,
+                "recorded_at": now,
+                "risk_level": level,
+                "follow_up_due_date": due_dates[n]
+            })
+
+    elapsed = time.perf_counter() - started
+    return {
+        "items": items,
+        "count": len(items),
+        "elapsed_ms": round(elapsed * 1000, 3),
+        "items_per_second": round(len(items) / elapsed, 1) if elapsed > 0 else 0.0
+    }
+
+def merge_batch_results(parts: list, elapsed: float) -> dict:
+    # `parts` pairs each shard's batch result with the request positions of its readings
+    items = [dict(item, index=position) for positions, result in parts for position, item in zip(positions, result["items"])]
+    items.sort(key=lambda item: item["index"])
+    return {
+        "items": items,
+        "count": len(items),
+        "elapsed_ms": round(elapsed * 1000, 3),
+        "items_per_second": round(len(items) / elapsed, 1) if elapsed > 0 else 0.0
+    }
+
+# Indicator Outbox Operations
+def create_patient_indicator_deferred(db: Session, indicator: schemas.HealthIndicatorCreate):
+    # Store the reading and its outbox entry only; process_indicator_outbox writes the rest
+    now = datetime.now(timezone.utc)
+    db_indicator = models.HealthIndicator(**indicator.model_dump(), recorded_at=now)
+    db.add(db_indicator)
+    db.flush()
+    db.add(models.IndicatorOutbox(indicator_id=db_indicator.id, enqueued_at=now, available_at=now))
+    db.commit()
+    db.refresh(db_indicator)
+    return db_indicator
+
+def due_outbox_ids(db: Session, limit: int = 500) -> List[int]:
+    now = _as_utc_naive(datetime.now(timezone.utc))
+    return db.scalars(
+        select(models.IndicatorOutbox.id).where(
+            models.IndicatorOutbox.failed_at.is_(None),
+            models.IndicatorOutbox.available_at <= now
+        ).order_by(models.IndicatorOutbox.id).limit(limit)
+    ).all()
+
+def process_indicator_outbox(db: Session, ids: List[int]) -> List[datetime]:
+    """
+    Write the assessments, follow-ups, patient states and rollups for the given
+    outbox entries and delete them, in one transaction. Entries already processed
+    elsewhere are not claimed again, so a retried or repeated call is harmless.
+    Returns the enqueue times of the entries processed.
+    """
+    if not ids:
+        return []
+    # 1. Claim the entries; only rows still present come back
+    claimed = db.execute(
+        delete(models.IndicatorOutbox).where(
+            models.IndicatorOutbox.id.in_(ids),
+            models.IndicatorOutbox.failed_at.is_(None)
+        ).returning(models.IndicatorOutbox.indicator_id, models.IndicatorOutbox.enqueued_at)
+    ).all()
+    if not claimed:
+        db.rollback()
+        return []
+
+    # 2. Replay the readings in the order they were taken
+    readings = db.execute(
+        select(
+            models.HealthIndicator.id,
+            models.HealthIndicator.patient_id,
+            models.HealthIndicator.blood_pressure_sys,
+            models.HealthIndicator.blood_pressure_dia,
+            models.HealthIndicator.glucose,
+            models.HealthIndicator.recorded_at
+        ).where(models.HealthIndicator.id.in_([row.indicator_id for row in claimed]))
+        .order_by(models.HealthIndicator.recorded_at, models.HealthIndicator.id)
+    ).all()
+    if readings:
+        _apply_readings(db, readings, [r.id for r in readings], [r.recorded_at for r in readings])
+
+    db.commit()
+    _invalidate_dashboard(db)
+    return [row.enqueued_at for row in claimed]
+
+def record_outbox_failure(db: Session, outbox_id: int, error: str, max_attempts: int, backoff_seconds: float):
+    # Retry with exponential backoff; after max_attempts the entry is parked with failed_at set
+    entry = db.get(models.IndicatorOutbox, outbox_id)
+    if entry is None:
+        return None
+    now = _as_utc_naive(datetime.now(timezone.utc))
+    entry.attempts += 1
+    entry.last_error = error[:1000]
+    entry.available_at = now + timedelta(seconds=backoff_seconds * 2 ** (entry.attempts - 1))
+    if entry.attempts >= max_attempts:
+        entry.failed_at = now
+    db.commit()
+    return entry
+
+def get_outbox_backlog(db: Session) -> dict:
+    pending, oldest = db.query(
+        func.count(models.IndicatorOutbox.id), func.min(models.IndicatorOutbox.enqueued_at)
+    ).filter(models.IndicatorOutbox.failed_at.is_(None)).one()
+    failed = db.query(func.count(models.IndicatorOutbox.id)).filter(models.IndicatorOutbox.failed_at.is_not(None)).scalar()
+    return {"pending": pending, "failed": failed, "oldest_enqueued_at": oldest}
+
+# Patient State Operations
+def _upsert_patient_states(db: Session, states: List[dict]):
+    stmt = sqlite_insert(models.PatientState)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[models.PatientState.patient_id],
+        set_={key: stmt.excluded[key] for key in states[0] if key != "patient_id"}
+    )
+    db.execute(stmt, states)
+
+def _refresh_next_follow_up(db: Session, patient_id: int):
+    next_due = select(func.min(models.FollowUp.due_date)).where(
+        models.FollowUp.patient_id == patient_id,
+        models.FollowUp.status == "Pending"
+    ).scalar_subquery()
+    db.query(models.PatientState).filter(
+        models.PatientState.patient_id == patient_id
+    ).update({"next_follow_up_due": next_due}, synchronize_session=False)
+
+def get_patient_state(db: Session, patient_id: int):
+    return db.get(models.PatientState, patient_id)
+
+def _trend_stats(state) -> Optional[dict]:
+    if state is None or not state.reading_count:
+        return None
+    return {column: getattr(state, column) for column in trend.STAT_COLUMNS}
+
+def _load_trend_stats(db: Session, patient_ids: List[int]) -> Dict[int, dict]:
+    columns = [getattr(models.PatientState, column) for column in trend.STAT_COLUMNS]
+    rows = db.execute(
+        select(models.PatientState.patient_id, *columns).where(models.PatientState.patient_id.in_(patient_ids))
+    ).all()
+    return {row[0]: dict(zip(trend.STAT_COLUMNS, row[1:])) for row in rows}
+
+# Patients whose readings are replayed together when rebuilding trend statistics
+TREND_REBUILD_PATIENTS = 5000
+
+def _rebuild_trend_stats(db: Session):
+    # Replays each patient's readings in time order, a block of patients at a time, vectorized across patients
+    bounds = db.execute(select(func.min(models.PatientState.patient_id), func.max(models.PatientState.patient_id))).one()
+    if bounds[0] is None:
+        return
+    indicator = archive.tiered(db, "health_indicators").c
+    table = models.PatientState.__table__
+    stmt = update(table).where(table.c.patient_id == bindparam("b_patient_id")).values(
+        {column: bindparam(f"b_{column}") for column in trend.STAT_COLUMNS}
+    )
+    for first in range(bounds[0], bounds[1] + 1, TREND_REBUILD_PATIENTS):
+        rows = db.execute(
+            select(
+                indicator.patient_id,
+                type_coerce(indicator.recorded_at, String),
+                indicator.blood_pressure_sys,
+                indicator.blood_pressure_dia,
+                indicator.glucose
+            ).where(
+                indicator.patient_id >= first,
+                indicator.patient_id < first + TREND_REBUILD_PATIENTS
+            ).order_by(indicator.patient_id, indicator.recorded_at, indicator.id)
+        ).all()
+        if not rows:
+            continue
+        owners, recorded_at, sbp, dbp, glucose = zip(*rows)
+        patient_ids, counts = np.unique(np.array(owners, dtype=np.int64), return_counts=True)
+        # Parsed from the stored text, so the day numbers match trend.days() exactly
+        t = np.array(recorded_at, dtype="datetime64[us]").astype(np.int64) / trend.MICROSECONDS_PER_DAY
+        values = {metric: np.array(column, dtype=np.float64) for metric, column in zip(trend.METRICS, (sbp, dbp, glucose))}
+        stats = trend.fold_sorted(t, values, counts)
+        lists = {column: values.tolist() for column, values in stats.items()}
+        db.execute(stmt, [
+            {"b_patient_id": patient_id, **{f"b_{column}": lists[column][n] for column in trend.STAT_COLUMNS}}
+            for n, patient_id in enumerate(patient_ids.tolist())
+        ])
+
+def rebuild_patient_states(db: Session) -> int:
+    # Latest indicator and assessment per patient, ranked newest first, across live and archived rows
+    indicator = archive.tiered(db, "health_indicators").c
+    assessment = archive.tiered(db, "risk_assessments").c
+    latest_indicator = select(
+        indicator.patient_id,
+        indicator.blood_pressure_sys,
+        indicator.blood_pressure_dia,
+        indicator.glucose,
+        indicator.recorded_at,
+        func.row_number().over(
+            partition_by=indicator.patient_id,
+            order_by=(indicator.recorded_at.desc(), indicator.id.desc())
+        ).label("rn")
+    ).subquery()
+    latest_assessment = select(
+        assessment.patient_id,
+        assessment.risk_level,
+        assessment.assessment_date,
+        func.row_number().over(
+            partition_by=assessment.patient_id,
+            order_by=(assessment.assessment_date.desc(), assessment.id.desc())
+        ).label("rn")
+    ).subquery()
+    next_due = select(
+        models.FollowUp.patient_id,
+        func.min(models.FollowUp.due_date).label("due_date")
+    ).where(models.FollowUp.status == "Pending").group_by(models.FollowUp.patient_id).subquery()
+
+    source = select(
+        models.Patient.id,
+        latest_assessment.c.risk_level,
+        latest_indicator.c.blood_pressure_sys,
+        latest_indicator.c.blood_pressure_dia,
+        latest_indicator.c.glucose,
+        latest_indicator.c.recorded_at,
+        latest_assessment.c.assessment_date,
+        next_due.c.due_date
+    ).outerjoin(
+        latest_indicator,
+        and_(latest_indicator.c.patient_id == models.Patient.id, latest_indicator.c.rn == 1)
+    ).outerjoin(
+        latest_assessment,
+        and_(latest_assessment.c.patient_id == models.Patient.id, latest_assessment.c.rn == 1)
+    ).outerjoin(
+        next_due, next_due.c.patient_id == models.Patient.id
+    ).where(or_(
+        latest_indicator.c.patient_id.is_not(None),
+        latest_assessment.c.patient_id.is_not(None)
+    ))
+
+    db.execute(delete(models.PatientState))
+    db.execute(insert(models.PatientState).from_select([
+        "patient_id", "risk_level", "last_sbp", "last_dbp", "last_glucose",
+        "last_recorded_at", "last_assessed_at", "next_follow_up_due"
+    ], source))
+    _rebuild_trend_stats(db)
+    db.commit()
+    _invalidate_dashboard(db)
+    return db.query(func.count(models.PatientState.patient_id)).scalar()
+
+# Daily Rollup Operations
+ROLLUP_METRICS = {
+    "sbp": models.HealthIndicator.blood_pressure_sys,
+    "dbp": models.HealthIndicator.blood_pressure_dia,
+    "glucose": models.HealthIndicator.glucose,
+}
+
+def _upsert_daily_rollups(db: Session, indicators: list, recorded_at: List[datetime]):
+    # `recorded_at` is aligned with `indicators`; each reading lands in its own UTC day
+    rollups: Dict[tuple, dict] = {}
+    for i, at in zip(indicators, recorded_at):
+        day = _as_utc_naive(at).date()
+        values = {"sbp": i.blood_pressure_sys, "dbp": i.blood_pressure_dia, "glucose": i.glucose}
+        rollup = rollups.get((i.patient_id, day))
+        if rollup is None:
+            rollup = rollups[(i.patient_id, day)] = {"patient_id": i.patient_id, "day": day, "reading_count": 0}
+            for metric, value in values.items():
+                rollup.update({f"sum_{metric}": 0, f"min_{metric}": value, f"max_{metric}": value})
+        rollup["reading_count"] += 1
+        for metric, value in values.items():
+            rollup[f"sum_{metric}"] += value
+            rollup[f"min_{metric}"] = min(rollup[f"min_{metric}"], value)
+            rollup[f"max_{metric}"] = max(rollup[f"max_{metric}"], value)
+
+    table = models.PatientDailyRollup.__table__
+    stmt = sqlite_insert(table)
+    updates = {"reading_count": table.c.reading_count + stmt.excluded.reading_count}
+    for metric in ROLLUP_METRICS:
+        updates[f"sum_{metric}"] = table.c[f"sum_{metric}"] + stmt.excluded[f"sum_{metric}"]
+        updates[f"min_{metric}"] = func.min(table.c[f"min_{metric}"], stmt.excluded[f"min_{metric}"])
+        updates[f"max_{metric}"] = func.max(table.c[f"max_{metric}"], stmt.excluded[f"max_{metric}"])
+    stmt = stmt.on_conflict_do_update(index_elements=[table.c.patient_id, table.c.day], set_=updates)
+    db.execute(stmt, list(rollups.values()))
+
+def backfill_daily_rollups(db: Session) -> int:
+    indicator = archive.tiered(db, "health_indicators").c
+    day = func.date(indicator.recorded_at)
+    columns = [indicator.patient_id, day, func.count(indicator.id)]
+    names = ["patient_id", "day", "reading_count"]
+    for metric, column in ROLLUP_METRICS.items():
+        column = indicator[column.key]
+        columns += [func.sum(column), func.min(column), func.max(column)]
+        names += [f"sum_{metric}", f"min_{metric}", f"max_{metric}"]
+    source = select(*columns).group_by(indicator.patient_id, day)
+
+    db.execute(delete(models.PatientDailyRollup))
+    db.execute(insert(models.PatientDailyRollup).from_select(names, source))
+    db.commit()
+    return db.query(func.count()).select_from(models.PatientDailyRollup).scalar()
+
 # Follow-up Operations
-def get_follow_ups(db: Session, status: Optional[str] = None, skip: int = 0, limit: int = 100):
+def get_follow_ups(db: Session, status: Optional[str] = None, cursor: Optional[str] = None, limit: int = 100):
     query = db.query(models.FollowUp)
     if status:
         query = query.filter(models.FollowUp.status == status)
-    return query.offset(skip).limit(limit).all()
+    if cursor:
+        due_date, last_id = decode_cursor(cursor, *FOLLOW_UP_CURSOR)
+        query = query.filter(
+            tuple_(models.FollowUp.due_date, models.FollowUp.id) > tuple_(due_date, last_id)
+        )
+    rows = query.order_by(models.FollowUp.due_date, models.FollowUp.id).limit(limit + 1).all()
+    return _page(rows, limit, lambda f: (f.due_date, f.id))
 
-def get_grouped_follow_ups(db: Session, status: Optional[str] = None):
-    query = db.query(models.FollowUp)
+def _follow_up_page_query(
+    status: Optional[str],
+    cursor: Optional[str],
+    limit: int,
+    due_from: Optional[datetime],
+    due_to: Optional[datetime]
+):
+    stmt = select(
+        models.FollowUp.id,
+        models.FollowUp.patient_id,
+        models.FollowUp.task_description,
+        models.FollowUp.status,
+        models.FollowUp.due_date,
+        models.FollowUp.completed_at,
+        models.Patient.name
+    ).join(models.Patient, models.Patient.id == models.FollowUp.patient_id)
     if status:
-        query = query.filter(models.FollowUp.status == status)
-    
-    followups = query.all()
-    
-    # Group by patient
-    grouped: Dict[int, schemas.PatientFollowUpGroup] = {}
-    for f in followups:
-        if f.patient_id not in grouped:
-            grouped[f.patient_id] = schemas.PatientFollowUpGroup(
-                patient=schemas.PatientBrief.model_validate(f.patient),
-                followups=[]
-            )
-        grouped[f.patient_id].followups.append(schemas.FollowUp.model_validate(f))
-    
-    return list(grouped.values())
+        stmt = stmt.where(models.FollowUp.status == status)
+    if due_from:
+        stmt = stmt.where(models.FollowUp.due_date >= _as_utc_naive(due_from))
+    if due_to:
+        stmt = stmt.where(models.FollowUp.due_date < _as_utc_naive(due_to))
+    if cursor:
+        due_date, last_id = decode_cursor(cursor, *FOLLOW_UP_CURSOR)
+        stmt = stmt.where(
+            tuple_(models.FollowUp.due_date, models.FollowUp.id) > tuple_(due_date, last_id)
+        )
+    return stmt.order_by(models.FollowUp.due_date, models.FollowUp.id).limit(limit + 1)
+
+def group_follow_ups(rows, limit: int, per_patient_limit: Optional[int] = None):
+    # Rows arrive in (due_date, id) order, limit + 1 at most; patients are grouped as they come
+    grouped: Dict[int, dict] = {}
+    last_row, next_cursor = None, None
+    for n, row in enumerate(rows):
+        if n == limit:
+            next_cursor = encode_cursor(last_row.due_date, last_row.id)
+            break
+        last_row = row
+        group = grouped.get(row.patient_id)
+        if group is None:
+            group = grouped[row.patient_id] = {
+                "patient": {"id": row.patient_id, "name": row.name},
+                "followups": []
+            }
+        if per_patient_limit is None or len(group["followups"]) < per_patient_limit:
+            group["followups"].append(schemas.FollowUpRecord(
+                row.task_description, row.status, row.due_date, row.id, row.completed_at
+            ))
+    return list(grouped.values()), next_cursor
+
+def get_grouped_follow_ups(
+    db: Session,
+    status: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = 100,
+    due_from: Optional[datetime] = None,
+    due_to: Optional[datetime] = None,
+    per_patient_limit: Optional[int] = None
+):
+    # One joined query streams the page in (due_date, id) order
+    stmt = _follow_up_page_query(status, cursor, limit, due_from, due_to)
+    result = db.execute(stmt.execution_options(yield_per=500))
+    try:
+        return group_follow_ups(result, limit, per_patient_limit)
+    finally:
+        result.close()
+
+def get_follow_up_page_rows(
+    db: Session,
+    status: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = 100,
+    due_from: Optional[datetime] = None,
+    due_to: Optional[datetime] = None
+) -> list:
+    # The ungrouped rows of one shard's page, for merging shards before group_follow_ups
+    return db.execute(_follow_up_page_query(status, cursor, limit, due_from, due_to)).all()
 
 def update_follow_up(db: Session, follow_up_id: int, follow_up_update: schemas.FollowUpUpdate):
     db_followup = db.query(models.FollowUp).filter(models.FollowUp.id == follow_up_id).first()
@@ -104,7 +734,11 @@ def update_follow_up(db: Session, follow_up_id: int, follow_up_update: schemas.F
     update_data = follow_up_update.model_dump(exclude_unset=True)
     for key, value in update_data.items():
         setattr(db_followup, key, value)
+    if "status" in update_data:
+        db.flush()
+        _refresh_next_follow_up(db, db_followup.patient_id)
     db.commit()
+    _invalidate_dashboard(db)
     db.refresh(db_followup)
     return db_followup
 
@@ -112,8 +746,9 @@ def update_follow_up(db: Session, follow_up_id: int, follow_up_update: schemas.F
 def get_user_by_username(db: Session, username: str):
     return db.query(models.User).filter(models.User.username == username).first()
 
-def create_user(db: Session, user: schemas.UserCreate):
-    hashed_password = auth.get_password_hash(user.password)
+def create_user(db: Session, user: schemas.UserCreate, hashed_password: Optional[str] = None):
+    if hashed_password is None:
+        hashed_password = auth.get_password_hash(user.password)
     db_user = models.User(
         username=user.username,
         hashed_password=hashed_password,
@@ -124,59 +759,79 @@ def create_user(db: Session, user: schemas.UserCreate):
     db.refresh(db_user)
     return db_user
 
+def update_user_password_hash(db: Session, user_id: int, hashed_password: str):
+    db_user = db.get(models.User, user_id)
+    if db_user:
+        db_user.hashed_password = hashed_password
+        db.commit()
+    return db_user
+
 # Trend Analysis
 def get_patient_trend(db: Session, patient_id: int, days: int = 30):
-    start_date = datetime.now(timezone.utc) - timedelta(days=days)
-    indicators = db.query(models.HealthIndicator).filter(
-        models.HealthIndicator.patient_id == patient_id,
-        models.HealthIndicator.recorded_at >= start_date
-    ).all()
+    # Answered from at most `days` daily rollup rows (today plus the previous days - 1)
+    start_day = datetime.now(timezone.utc).date() - timedelta(days=days - 1)
+    rollup = models.PatientDailyRollup
+    totals = db.query(
+        func.sum(rollup.reading_count),
+        func.sum(rollup.sum_sbp),
+        func.sum(rollup.sum_dbp),
+        func.sum(rollup.sum_glucose)
+    ).filter(
+        rollup.patient_id == patient_id,
+        rollup.day >= start_day
+    ).one()
     
-    if not indicators:
+    record_count, total_sbp, total_dbp, total_glucose = totals
+    if not record_count:
         return None
     
-    avg_sbp = sum(i.blood_pressure_sys for i in indicators) / len(indicators)
-    avg_dbp = sum(i.blood_pressure_dia for i in indicators) / len(indicators)
-    avg_glucose = sum(i.glucose for i in indicators) / len(indicators)
+    avg_sbp = total_sbp / record_count
+    avg_dbp = total_dbp / record_count
+    avg_glucose = total_glucose / record_count
     
-    latest_assessment = db.query(models.RiskAssessment).filter(
-        models.RiskAssessment.patient_id == patient_id
-    ).order_by(models.RiskAssessment.assessment_date.desc()).first()
+    # Trajectory comes from the running statistics kept in the patient's state row
+    state = get_patient_state(db, patient_id)
+    stats = _trend_stats(state)
     
-    status = "Stable"
-    if latest_assessment:
-        if latest_assessment.risk_level == "High":
-            status = "Deteriorating"
-        elif latest_assessment.risk_level == "Low":
-            status = "Improving"
-            
     return {
         "patient_id": patient_id,
         "period_days": days,
         "avg_sbp": round(avg_sbp, 1),
         "avg_dbp": round(avg_dbp, 1),
         "avg_glucose": round(avg_glucose, 2),
-        "record_count": len(indicators),
-        "status": status
+        "record_count": record_count,
+        "status": trend.status(stats, state.risk_level if state else None),
+        "total_readings": stats["reading_count"] if stats else None,
+        **trend.summary(stats)
     }
 
 # Dashboard Operations
+def merge_dashboards(dashboards: list) -> dict:
+    # Every figure is a count, so the shards' dashboards add up
+    merged = {
+        "counts": {name: sum(d["counts"][name] for d in dashboards) for name in dashboards[0]["counts"]},
+        "risk_distribution": {name: sum(d["risk_distribution"][name] for d in dashboards) for name in dashboards[0]["risk_distribution"]},
+    }
+    for name, key in (("weekly_patient_registrations", "week"), ("age_distribution", "range")):
+        totals: Dict[str, int] = {}
+        for d in dashboards:
+            for bucket in d[name]:
+                totals[bucket[key]] = totals.get(bucket[key], 0) + bucket["count"]
+        merged[name] = [{key: label, "count": count} for label, count in sorted(totals.items())]
+    return merged
+
 def get_dashboard_info(db: Session):
+    return dashboard_cache.get_or_build(_dashboard_key(db), lambda: _build_dashboard_info(db))
+
+def _build_dashboard_info(db: Session):
     now = datetime.now(timezone.utc)
     # 1. Counts
     total_patients = db.query(func.count(models.Patient.id)).scalar()
     
     # High risk patients (latest assessment is High)
-    subquery = db.query(
-        models.RiskAssessment.patient_id,
-        func.max(models.RiskAssessment.assessment_date).label('max_date')
-    ).group_by(models.RiskAssessment.patient_id).subquery()
-    
-    high_risk_count = db.query(func.count(models.RiskAssessment.id)).join(
-        subquery, 
-        (models.RiskAssessment.patient_id == subquery.c.patient_id) & 
-        (models.RiskAssessment.assessment_date == subquery.c.max_date)
-    ).filter(models.RiskAssessment.risk_level == "High").scalar()
+    high_risk_count = db.query(func.count(models.PatientState.patient_id)).filter(
+        models.PatientState.risk_level == "High"
+    ).scalar()
     
     upcoming_followups = db.query(func.count(models.FollowUp.id)).filter(
         models.FollowUp.status == "Pending",
@@ -185,13 +840,9 @@ def get_dashboard_info(db: Session):
     
     # 2. Risk Distribution
     risk_dist = db.query(
-        models.RiskAssessment.risk_level,
-        func.count(models.RiskAssessment.id)
-    ).join(
-        subquery,
-        (models.RiskAssessment.patient_id == subquery.c.patient_id) &
-        (models.RiskAssessment.assessment_date == subquery.c.max_date)
-    ).group_by(models.RiskAssessment.risk_level).all()
+        models.PatientState.risk_level,
+        func.count(models.PatientState.patient_id)
+    ).group_by(models.PatientState.risk_level).all()
     
     risk_map = {"High": 0, "Med": 0, "Low": 0}
     for level, count in risk_dist:
@@ -1,6 +1,13 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from starlette.concurrency import run_in_threadpool
+from typing import List, Optional
 import os
+import asyncio
+import itertools
+import threading
 
 # Database file path
 # Using absolute path to avoid issues with different working directories
@@ -8,15 +15,150 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.join(BASE_DIR, "data")
 os.makedirs(DATA_DIR, exist_ok=True)
 
-SQLALCHEMY_DATABASE_URL = f"sqlite:///{os.path.join(DATA_DIR, 'community_health.db')}"
-
-# Create engine
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+SQLALCHEMY_DATABASE_URL = os.getenv(
+    "DATABASE_URL", f"sqlite:///{os.path.join(DATA_DIR, 'community_health.db')}"
 )
+ASYNC_SQLALCHEMY_DATABASE_URL = SQLALCHEMY_DATABASE_URL.replace("sqlite://", "sqlite+aiosqlite://", 1)
+
+# "sync" runs requests on a threadpool with Session; "async" uses AsyncSession on aiosqlite
+DB_MODE = os.getenv("DB_MODE", "sync")
+
+# SQLite tuning applied to every new connection
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", "-65536")),  # negative means KiB, so 64 MiB
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+    "temp_store": "MEMORY",
+}
+# Sharded storage (SHARD_COUNT > 1): patients, with everything recorded against them, are spread
+# over N SQLite files, each with its own writer. Shard k hands out ids above k * SHARD_ID_STRIDE,
+# so any patient, reading, assessment or follow-up id names the shard holding it. Shard 0 is
+# DATABASE_URL itself (and keeps users); shard k is "<database>_shard<k>.db" beside it.
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", "1"))
+SHARD_ID_STRIDE = int(os.getenv("SHARD_ID_STRIDE", str(10 ** 12)))
+
+# Readers share a pool; all writes go through one connection so writers queue instead of hitting "database is locked"
+READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", "8"))
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+def _set_pragmas(pragmas: dict):
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+    return on_connect
+
+def _is_file_database(url: str) -> bool:
+    database = make_url(url).database
+    return bool(database) and database != ":memory:" and not database.startswith("file::memory:")
+
+def _pool_args(size: int) -> dict:
+    return {"pool_size": size, "max_overflow": 0, "pool_timeout": POOL_TIMEOUT}
+
+def create_engines(url: str, read_pool_size: int = READ_POOL_SIZE):
+    """
+    Build the (writer, reader) engine pair for a SQLite URL.
+    The writer has a single connection; readers get a pool of query_only
+    connections. In-memory databases cannot be shared, so both are one engine.
+    """
+    connect_args = {"check_same_thread": False, "timeout": SQLITE_PRAGMAS["busy_timeout"] / 1000}
+    if not _is_file_database(url):
+        writer = create_engine(url, connect_args=connect_args)
+        event.listen(writer, "connect", _set_pragmas(SQLITE_PRAGMAS))
+        return writer, writer
+
+    writer = create_engine(url, connect_args=connect_args, **_pool_args(1))
+    event.listen(writer, "connect", _set_pragmas(SQLITE_PRAGMAS))
+    reader = create_engine(url, connect_args=connect_args, **_pool_args(read_pool_size))
+    reader_pragmas = {k: v for k, v in SQLITE_PRAGMAS.items() if k != "journal_mode"}
+    event.listen(reader, "connect", _set_pragmas(dict(reader_pragmas, query_only="ON")))
+    return writer, reader
+
+def create_async_engines(url: str, read_pool_size: int = READ_POOL_SIZE):
+    if not _is_file_database(url):
+        writer = create_async_engine(url)
+        event.listen(writer.sync_engine, "connect", _set_pragmas(SQLITE_PRAGMAS))
+        return writer, writer
+
+    writer = create_async_engine(url, **_pool_args(1))
+    event.listen(writer.sync_engine, "connect", _set_pragmas(SQLITE_PRAGMAS))
+    reader = create_async_engine(url, **_pool_args(read_pool_size))
+    reader_pragmas = {k: v for k, v in SQLITE_PRAGMAS.items() if k != "journal_mode"}
+    event.listen(reader.sync_engine, "connect", _set_pragmas(dict(reader_pragmas, query_only="ON")))
+    return writer, reader
+
+def shard_url(url: str, shard: int) -> str:
+    if shard == 0:
+        return url
+    parsed = make_url(url)
+    root, ext = os.path.splitext(parsed.database)
+    return parsed.set(database=f"{root}_shard{shard}{ext or '.db'}").render_as_string(hide_password=False)
+
+class ShardRouter:
+    """
+    Routes work to the shard owning an id and fans read-only work out to every
+    shard in parallel. Takes one (writer, reader) engine pair per shard, from
+    create_engines; each shard keeps its own single writer connection.
+    """
+
+    def __init__(self, engines: list):
+        self.engines = engines
+        self.sessions = [sessionmaker(autocommit=False, autoflush=False, bind=writer) for writer, _ in engines]
+        self.read_sessions = [sessionmaker(autocommit=False, autoflush=False, bind=reader) for _, reader in engines]
+        self._placement = itertools.count()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.engines)
+
+    def shard_of(self, entity_id: int) -> Optional[int]:
+        """The shard holding a patient (or reading, assessment, follow-up) id; None if no shard can."""
+        shard = (entity_id - 1) // SHARD_ID_STRIDE
+        return shard if 0 <= shard < len(self.engines) else None
+
+    def next_shard(self) -> int:
+        # New patients are placed round robin, which keeps the shards' write load even
+        with self._lock:
+            return next(self._placement) % len(self.engines)
+
+    def partition(self, entity_ids: list) -> dict:
+        """Positions of `entity_ids` grouped by shard (None for ids no shard holds), in order."""
+        positions = {}
+        for n, entity_id in enumerate(entity_ids):
+            positions.setdefault(self.shard_of(entity_id), []).append(n)
+        return positions
+
+    async def run(self, shard: int, fn, *args, read: bool = False, **kwargs):
+        """Run a sync database function on the threadpool with a session on one shard."""
+        factory = (self.read_sessions if read else self.sessions)[shard]
+        def call():
+            db = factory()
+            try:
+                return fn(db, *args, **kwargs)
+            finally:
+                db.close()
+        return await run_in_threadpool(call)
+
+    async def fan_out(self, fn, *args, read: bool = True, **kwargs) -> list:
+        """Run `fn` on every shard concurrently; returns the results in shard order."""
+        return await asyncio.gather(*(self.run(shard, fn, *args, read=read, **kwargs) for shard in range(len(self.engines))))
+
+# Create engines
+engine, read_engine = create_engines(SQLALCHEMY_DATABASE_URL)
+async_engine, async_read_engine = create_async_engines(ASYNC_SQLALCHEMY_DATABASE_URL)
+# The shards beyond the first get engine pairs of their own; None when unsharded
+shards = ShardRouter(
+    [(engine, read_engine)] + [create_engines(shard_url(SQLALCHEMY_DATABASE_URL, k)) for k in range(1, SHARD_COUNT)]
+) if SHARD_COUNT > 1 else None
 
 # Session configuration
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+AsyncSessionLocal = async_sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=async_engine)
+AsyncReadSessionLocal = async_sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=async_read_engine)
 
 # Base class for models - Updated for SQLAlchemy 2.0
 Base = declarative_base()
@@ -28,3 +170,79 @@ def get_db():
         yield db
     finally:
         db.close()
+
+# Dependency to get a read-only DB session from the reader pool
+def get_read_db():
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def get_async_read_db():
+    async with AsyncReadSessionLocal() as db:
+        yield db
+
+# Session dependencies used by the API, picked by DB_MODE
+get_session = get_async_db if DB_MODE == "async" else get_db
+get_read_session = get_async_read_db if DB_MODE == "async" else get_read_db
+
+async def run(db, fn, *args, **kwargs):
+    """
+    Run a sync-style database function without blocking the event loop.
+    AsyncSession runs it through run_sync on the aiosqlite driver; a plain
+    Session runs it on the threadpool, as FastAPI does for sync endpoints.
+    """
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(fn, *args, **kwargs)
+    return await run_in_threadpool(fn, db, *args, **kwargs)
+
+async def release(db):
+    """Return a session's connection to its pool early, e.g. before awaiting slow non-database work."""
+    if isinstance(db, AsyncSession):
+        await db.close()
+    else:
+        db.close()
+
+async def run_for(db, entity_id: int, fn, *args, read: bool = False, **kwargs):
+    """
+    database.run on `db`, or when sharded, on the shard holding `entity_id`
+    (a reader session with read=True). Returns None if no shard holds the id,
+    as the crud lookups do for missing rows.
+    """
+    if shards is None:
+        return await run(db, fn, *args, **kwargs)
+    shard = shards.shard_of(entity_id)
+    if shard is None:
+        return None
+    return await shards.run(shard, fn, *args, read=read, **kwargs)
+
+def writer_engines() -> List:
+    """The writer engine of every shard (just `engine` when unsharded), for maintenance jobs."""
+    return [writer for writer, _ in shards.engines] if shards is not None else [engine]
+
+def read_engines() -> List:
+    return [reader for _, reader in shards.engines] if shards is not None else [read_engine]
+
+def _pool_status(pool) -> dict:
+    stats = {"pool": type(pool).__name__}
+    for name in ("size", "checkedin", "checkedout", "overflow"):
+        if hasattr(pool, name):
+            stats[name] = getattr(pool, name)()
+    return stats
+
+def pool_stats() -> dict:
+    active_writer, active_reader = (async_engine.sync_engine, async_read_engine.sync_engine) if DB_MODE == "async" else (engine, read_engine)
+    return {
+        "mode": DB_MODE,
+        "pragmas": SQLITE_PRAGMAS,
+        "writer": _pool_status(active_writer.pool),
+        "reader": _pool_status(active_reader.pool),
+        "shards": [
+            {"writer": _pool_status(writer.pool), "reader": _pool_status(reader.pool)} for writer, reader in shards.engines
+        ] if shards is not None else None,
+    }
@@ -0,0 +1,95 @@
+import os
+import io
+import csv
+import json
+from datetime import date, datetime, timezone
+from typing import Iterator, Optional, Tuple
+from sqlalchemy import select
+try:
+    from . import models
+except ImportError:
+    import models
+
+# Rows fetched from the cursor (and written out) at a time; memory stays bounded by this
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "5000"))
+
+# Exportable tables and the timestamp column a `since` watermark applies to.
+# Follow-ups change after insert and have no creation time, so they only take since_id.
+EXPORT_TABLES = {
+    "health_indicators": (models.HealthIndicator, models.HealthIndicator.recorded_at),
+    "risk_assessments": (models.RiskAssessment, models.RiskAssessment.assessment_date),
+    "follow_ups": (models.FollowUp, None),
+}
+
+MEDIA_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+def export_columns(table: str) -> list:
+    model, _ = EXPORT_TABLES[table]
+    return [column.name for column in model.__table__.columns]
+
+def export_query(table: str, since: Optional[datetime] = None, since_id: Optional[int] = None):
+    """Rows of `table` in id order, optionally only those after a timestamp and/or id watermark."""
+    if table not in EXPORT_TABLES:
+        raise KeyError(table)
+    model, time_column = EXPORT_TABLES[table]
+    stmt = select(*model.__table__.columns).order_by(model.id)
+    if since is not None:
+        if time_column is None:
+            raise ValueError(f"{table} does not support a since watermark; use since_id")
+        if since.tzinfo is not None:
+            since = since.astimezone(timezone.utc).replace(tzinfo=None)
+        stmt = stmt.where(time_column > since)
+    if since_id is not None:
+        stmt = stmt.where(model.id > since_id)
+    return stmt
+
+def iter_row_chunks(conn, query, chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[list]:
+    """Stream a query as lists of row tuples, never holding more than one chunk."""
+    result = conn.execute(query.execution_options(yield_per=chunk_size))
+    try:
+        for chunk in result.partitions():
+            yield [tuple(row) for row in chunk]
+    finally:
+        result.close()
+
+def _text(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+def _encode(rows: list, columns: list, fmt: str) -> str:
+    if fmt == "ndjson":
+        return "".join(json.dumps(dict(zip(columns, map(_text, row)))) + "\n" for row in rows)
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator="\n").writerows([[_text(value) for value in row] for row in rows])
+    return buffer.getvalue()
+
+def iter_export(bind, table: str, fmt: str = "csv", since: Optional[datetime] = None, since_id: Optional[int] = None, header: bool = True) -> Iterator[str]:
+    """
+    Encoded export of `table`, one chunk of rows per item. Opens its own
+    connection from `bind`, so it can outlive the request's session.
+    """
+    columns = export_columns(table)
+    query = export_query(table, since, since_id)
+    if fmt == "csv" and header:
+        yield _encode([columns], columns, fmt)
+    with bind.connect() as conn:
+        for rows in iter_row_chunks(conn, query):
+            yield _encode(rows, columns, fmt)
+
+def write_export(bind, table: str, fmt: str, path: str, since: Optional[datetime] = None, since_id: Optional[int] = None, append: bool = False) -> Tuple[int, Optional[int]]:
+    """Export `table` to a file, appending when asked. Returns (rows written, last id written)."""
+    columns = export_columns(table)
+    query = export_query(table, since, since_id)
+    header = fmt == "csv" and not (append and os.path.exists(path) and os.path.getsize(path))
+    id_index = columns.index("id")
+    count, last_id = 0, None
+    with open(path, "a" if append else "w", encoding="utf-8", newline="") as f:
+        if header:
+            f.write(_encode([columns], columns, fmt))
+        with bind.connect() as conn:
+            for rows in iter_row_chunks(conn, query):
+                f.write(_encode(rows, columns, fmt))
+                count += len(rows)
+                last_id = rows[-1][id_index]
+    return count, last_id
@@ -0,0 +1,32 @@
+import os
+import hashlib
+from passlib.context import CryptContext
+
+# Kept free of app imports so hashing pool workers start cheaply
+
+# Setting PASSWORD_HASH_ROUNDS pins sha256_crypt to exactly that many rounds; hashes made
+# with any other count are upgraded on the next successful login
+PASSWORD_HASH_ROUNDS = os.getenv("PASSWORD_HASH_ROUNDS")
+
+def build_context(rounds=PASSWORD_HASH_ROUNDS) -> CryptContext:
+    settings = {}
+    if rounds:
+        rounds = int(rounds)
+        settings = {
+            "sha256_crypt__default_rounds": rounds,
+            "sha256_crypt__min_rounds": rounds,
+            "sha256_crypt__max_rounds": rounds,
+        }
+    return CryptContext(schemes=["sha256_crypt"], deprecated="auto", **settings)
+
+pwd_context = build_context()
+
+def prehash(password: str) -> str:
+    return hashlib.sha256(password.encode()).hexdigest()
+
+def hash_password(password: str) -> str:
+    return pwd_context.hash(prehash(password))
+
+def verify_and_update(password: str, hashed_password: str):
+    # (valid, new_hash); new_hash is set when the stored hash no longer matches pwd_context
+    return pwd_context.verify_and_update(prehash(password), hashed_password)
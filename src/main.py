@@ -1,22 +1,63 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
 from typing import List, Optional
-from datetime import timedelta
+from datetime import datetime, timedelta
 from fastapi.security import OAuth2PasswordRequestForm, OAuth2PasswordBearer
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, ORJSONResponse
+from contextlib import asynccontextmanager
+import asyncio
+import heapq
+import itertools
+import time
 
 
 try:
-    from . import models, schemas, crud, database, auth
+    from . import models, schemas, crud, database, auth, migrations, write_queue, outbox, profiling, export
 except ImportError:
-    import models, schemas, crud, database, auth
+    import models, schemas, crud, database, auth, migrations, write_queue, outbox, profiling, export
 
 
-models.Base.metadata.create_all(bind=database.engine)
+if database.shards is None:
+    migrations.upgrade(database.engine)
+else:
+    for shard, writer in enumerate(database.writer_engines()):
+        migrations.upgrade(writer, shard=shard)
+
+# Every endpoint is async and reaches the database through database.run, which uses
+# AsyncSession (DB_MODE=async) or the threadpool (DB_MODE=sync) without blocking the loop.
+# Read-only endpoints take sessions from the reader pool; writes share the single writer.
+# With SHARD_COUNT > 1, patient data is routed to the shard holding the id (database.run_for),
+# cross-patient listings fan out to every shard and are merged, and users stay on shard 0.
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-app = FastAPI(title="Community Health Dashboard API")
+# Largest number of readings accepted by a single batch upload
+MAX_INDICATOR_BATCH = 10000
+# Largest page size accepted by paginated listings
+MAX_PAGE_SIZE = 500
+
+# Optional group-commit pipeline for POST /indicators/ (INGEST_GROUP_COMMIT=1)
+indicator_queue = write_queue.GroupCommitQueue(database.SessionLocal) if write_queue.GROUP_COMMIT_ENABLED else None
+# Optional outbox ingestion (INGEST_MODE=outbox): POST /indicators/ stores the reading and an outbox
+# entry, and a background worker writes the assessment, follow-ups and derived state shortly after
+outbox_worker = outbox.OutboxWorker(database.SessionLocal, read_session_factory=database.ReadSessionLocal) if outbox.OUTBOX_ENABLED else None
+if database.shards is not None and (indicator_queue is not None or outbox_worker is not None):
+    raise RuntimeError("INGEST_GROUP_COMMIT and INGEST_MODE=outbox run against one database; unset them when SHARD_COUNT > 1")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if outbox_worker is not None:
+        # Picks up entries left over from a previous run
+        outbox_worker.start()
+    yield
+    if indicator_queue is not None:
+        indicator_queue.stop()
+    if outbox_worker is not None:
+        outbox_worker.stop()
+    auth.shutdown_hash_pool()
+
+app = FastAPI(title="Community Health Dashboard API", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -29,6 +70,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Optional per-request profiling: Server-Timing headers, GET /metrics and slow SQL logging (PROFILING=1)
+if profiling.PROFILING_ENABLED:
+    profiling.install(app)
+
 @app.get("/")
 def read_root():
     return {"message": "Welcome to Community Health Dashboard API"}
@@ -36,21 +81,38 @@ def read_root():
 # --- Authentication Endpoints ---
 
 @app.post("/users/", response_model=schemas.User)
-def create_user(user: schemas.UserCreate, db: Session = Depends(database.get_db)):
-    db_user = crud.get_user_by_username(db, username=user.username)
+async def create_user(user: schemas.UserCreate, db: Session = Depends(database.get_session), read_db: Session = Depends(database.get_read_session)):
+    # Looked up on a reader, so the single writer connection is not held while the password is hashed
+    db_user = await database.run(read_db, crud.get_user_by_username, username=user.username)
+    await database.release(read_db)
     if db_user:
         raise HTTPException(status_code=400, detail="Username already registered")
-    return crud.create_user(db=db, user=user)
+    try:
+        hashed_password = await auth.get_password_hash_async(user.password)
+    except auth.HashPoolBusy:
+        raise HTTPException(status_code=503, detail="Too many concurrent password operations, retry shortly", headers={"Retry-After": "1"})
+    return await database.run(db, crud.create_user, user=user, hashed_password=hashed_password)
 
 @app.post("/token", response_model=schemas.Token)
-async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(database.get_db)):
-    user = crud.get_user_by_username(db, username=form_data.username)
-    if not user or not auth.verify_password(form_data.password, user.hashed_password):
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(database.get_read_session), write_db: Session = Depends(database.get_session)):
+    user = await database.run(db, crud.get_user_by_username, username=form_data.username)
+    # Don't hold a reader connection while the password is being hashed
+    await database.release(db)
+    valid, new_hash = False, None
+    if user:
+        try:
+            valid, new_hash = await auth.verify_and_update_password_async(form_data.password, user.hashed_password)
+        except auth.HashPoolBusy:
+            raise HTTPException(status_code=503, detail="Too many concurrent logins, retry shortly", headers={"Retry-After": "1"})
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    if new_hash:
+        # Hash settings changed since this password was stored; keep the upgraded hash
+        await database.run(write_db, crud.update_user_password_hash, user_id=user.id, hashed_password=new_hash)
     access_token_expires = timedelta(minutes=auth.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = auth.create_access_token(
         data={"sub": user.username}, expires_delta=access_token_expires
@@ -64,30 +126,64 @@ async def read_users_me(current_user: models.User = Depends(auth.get_current_use
 # --- Patient Endpoints ---
 
 @app.post("/patients/", response_model=schemas.Patient)
-def create_patient(patient: schemas.PatientCreate, db: Session = Depends(database.get_db), current_user: models.User = Depends(auth.get_current_user)):
-    return crud.create_patient(db=db, patient=patient)
+async def create_patient(patient: schemas.PatientCreate, db: Session = Depends(database.get_session), current_user: models.User = Depends(auth.get_current_user)):
+    if database.shards is not None:
+        return await database.shards.run(database.shards.next_shard(), crud.create_patient, patient=patient)
+    return await database.run(db, crud.create_patient, patient=patient)
+
+def _check_cursor(cursor: Optional[str], converters: tuple):
+    # Decoded up front, so a ValueError from the query itself is not reported as a bad cursor
+    if cursor:
+        try:
+            crud.decode_cursor(cursor, *converters)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
 
-@app.get("/patients/", response_model=List[schemas.Patient])
-def read_patients(skip: int = 0, limit: int = 100, db: Session = Depends(database.get_db), current_user: models.User = Depends(auth.get_current_user)):
-    return crud.get_patients(db, skip=skip, limit=limit)
+@app.get("/patients/", response_model=schemas.PatientPage)
+async def read_patients(cursor: Optional[str] = None, limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE), db: Session = Depends(database.get_read_session), current_user: models.User = Depends(auth.get_current_user)):
+    _check_cursor(cursor, crud.PATIENT_CURSOR)
+    if database.shards is not None:
+        pages = await database.shards.fan_out(crud.get_patients, cursor=cursor, limit=limit)
+        items, next_cursor = crud.merge_pages(pages, limit, lambda p: (p.id,))
+    else:
+        items, next_cursor = await database.run(db, crud.get_patients, cursor=cursor, limit=limit)
+    # crud returns row records shaped like the response model, so skip re-validation and encode with orjson
+    return ORJSONResponse({"items": items, "next_cursor": next_cursor})
 
 @app.get("/patients/{patient_id}", response_model=schemas.PatientDetail)
-def read_patient(patient_id: int, db: Session = Depends(database.get_db), current_user: models.User = Depends(auth.get_current_user)):
-    db_patient = crud.get_patient(db, patient_id=patient_id)
+async def read_patient(
+    patient_id: int,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    since: Optional[datetime] = None,
+    include_indicators: bool = True,
+    include_assessments: bool = True,
+    include_follow_ups: bool = True,
+    db: Session = Depends(database.get_read_session),
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    # Each sub-collection is windowed to its newest `limit` rows (optionally since a timestamp)
+    include = [
+        name for name, wanted in (
+            ("indicators", include_indicators),
+            ("assessments", include_assessments),
+            ("follow_ups", include_follow_ups),
+        ) if wanted
+    ]
+    db_patient = await database.run_for(db, patient_id, crud.get_patient_detail, patient_id=patient_id, limit=limit, since=since, include=include, read=True)
     if db_patient is None:
         raise HTTPException(status_code=404, detail="Patient not found")
-    return db_patient
+    return ORJSONResponse(db_patient)
 
 @app.put("/patients/{patient_id}", response_model=schemas.Patient)
-def update_patient(patient_id: int, patient_update: schemas.PatientUpdate, db: Session = Depends(database.get_db), current_user: models.User = Depends(auth.get_current_user)):
-    db_patient = crud.update_patient(db, patient_id=patient_id, patient_update=patient_update)
+async def update_patient(patient_id: int, patient_update: schemas.PatientUpdate, db: Session = Depends(database.get_session), current_user: models.User = Depends(auth.get_current_user)):
+    db_patient = await database.run_for(db, patient_id, crud.update_patient, patient_id=patient_id, patient_update=patient_update)
     if db_patient is None:
         raise HTTPException(status_code=404, detail="Patient not found")
     return db_patient
 
 @app.get("/patients/{patient_id}/trend", response_model=schemas.HealthTrend)
-def read_patient_trend(patient_id: int, days: int = 30, db: Session = Depends(database.get_db), current_user: models.User = Depends(auth.get_current_user)):
-    trend = crud.get_patient_trend(db, patient_id=patient_id, days=days)
+async def read_patient_trend(patient_id: int, days: int = 30, db: Session = Depends(database.get_read_session), current_user: models.User = Depends(auth.get_current_user)):
+    trend = await database.run_for(db, patient_id, crud.get_patient_trend, patient_id=patient_id, days=days, read=True)
     if trend is None:
         raise HTTPException(status_code=404, detail="No health data found for this period")
     return trend
@@ -96,18 +192,66 @@ def read_patient_trend(patient_id: int, days: int = 30, db: Session = Depends(da
 # --- Health Indicator Endpoints ---
 
 @app.post("/indicators/", response_model=schemas.HealthIndicator)
-def create_indicator(indicator: schemas.HealthIndicatorCreate, db: Session = Depends(database.get_db), current_user: models.User = Depends(auth.get_current_user)):
-    return crud.create_patient_indicator(db=db, indicator=indicator)
+async def create_indicator(indicator: schemas.HealthIndicatorCreate, db: Session = Depends(database.get_session), current_user: models.User = Depends(auth.get_current_user)):
+    if outbox_worker is not None:
+        db_indicator = await database.run(db, crud.create_patient_indicator_deferred, indicator=indicator)
+        outbox_worker.notify()
+        return db_indicator
+    if indicator_queue is not None:
+        # Resolves once the group holding this reading has committed
+        return await indicator_queue.submit_async(indicator)
+    if database.shards is not None and database.shards.shard_of(indicator.patient_id) is None:
+        raise HTTPException(status_code=404, detail="Patient not found")
+    return await database.run_for(db, indicator.patient_id, crud.create_patient_indicator, indicator=indicator)
+
+@app.post("/indicators/batch", response_model=schemas.HealthIndicatorBatchResult)
+async def create_indicators_batch(indicators: List[schemas.HealthIndicatorCreate], db: Session = Depends(database.get_session), current_user: models.User = Depends(auth.get_current_user)):
+    if len(indicators) > MAX_INDICATOR_BATCH:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds {MAX_INDICATOR_BATCH} readings")
+    if database.shards is None:
+        return await database.run(db, crud.create_patient_indicators_batch, indicators=indicators)
+    # Each shard writes its part of the batch in parallel; items come back in request order
+    by_shard = database.shards.partition([i.patient_id for i in indicators])
+    if None in by_shard:
+        raise HTTPException(status_code=404, detail=f"Patient {indicators[by_shard[None][0]].patient_id} not found")
+    started = time.perf_counter()
+    results = await asyncio.gather(*(
+        database.shards.run(shard, crud.create_patient_indicators_batch, indicators=[indicators[n] for n in positions])
+        for shard, positions in by_shard.items()
+    ))
+    return crud.merge_batch_results(list(zip(by_shard.values(), results)), time.perf_counter() - started)
 
 # --- Follow-up Endpoints ---
 
-@app.get("/followups/", response_model=List[schemas.PatientFollowUpGroup])
-def read_follow_ups(status: Optional[str] = None, db: Session = Depends(database.get_db), current_user: models.User = Depends(auth.get_current_user)):
-    return crud.get_grouped_follow_ups(db, status=status)
+@app.get("/followups/", response_model=schemas.FollowUpGroupPage)
+async def read_follow_ups(
+    status: Optional[str] = None,
+    due_from: Optional[datetime] = None,
+    due_to: Optional[datetime] = None,
+    per_patient_limit: Optional[int] = Query(None, ge=1),
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    db: Session = Depends(database.get_read_session),
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    _check_cursor(cursor, crud.FOLLOW_UP_CURSOR)
+    if database.shards is not None:
+        # Each shard returns its first limit + 1 rows; the merged stream is grouped as one page
+        pages = await database.shards.fan_out(
+            crud.get_follow_up_page_rows, status=status, cursor=cursor, limit=limit, due_from=due_from, due_to=due_to
+        )
+        rows = heapq.merge(*pages, key=lambda row: (row.due_date, row.id))
+        items, next_cursor = crud.group_follow_ups(rows, limit, per_patient_limit)
+    else:
+        items, next_cursor = await database.run(
+            db, crud.get_grouped_follow_ups, status=status, cursor=cursor, limit=limit,
+            due_from=due_from, due_to=due_to, per_patient_limit=per_patient_limit
+        )
+    return ORJSONResponse({"items": items, "next_cursor": next_cursor})
 
 @app.patch("/followups/{follow_up_id}", response_model=schemas.FollowUp)
-def update_follow_up(follow_up_id: int, follow_up_update: schemas.FollowUpUpdate, db: Session = Depends(database.get_db), current_user: models.User = Depends(auth.get_current_user)):
-    db_followup = crud.update_follow_up(db, follow_up_id=follow_up_id, follow_up_update=follow_up_update)
+async def update_follow_up(follow_up_id: int, follow_up_update: schemas.FollowUpUpdate, db: Session = Depends(database.get_session), current_user: models.User = Depends(auth.get_current_user)):
+    db_followup = await database.run_for(db, follow_up_id, crud.update_follow_up, follow_up_id=follow_up_id, follow_up_update=follow_up_update)
     if db_followup is None:
         raise HTTPException(status_code=404, detail="Follow-up task not found")
     return db_followup
@@ -115,5 +259,65 @@ def update_follow_up(follow_up_id: int, follow_up_update: schemas.FollowUpUpdate
 # --- Dashboard Endpoints ---
 
 @app.get("/dashboard/", response_model=schemas.DashboardInfo)
-def read_dashboard_info(db: Session = Depends(database.get_db), current_user: models.User = Depends(auth.get_current_user)):
-    return crud.get_dashboard_info(db)
+async def read_dashboard_info(db: Session = Depends(database.get_read_session), current_user: models.User = Depends(auth.get_current_user)):
+    if database.shards is not None:
+        return crud.merge_dashboards(await database.shards.fan_out(crud.get_dashboard_info))
+    return await database.run(db, crud.get_dashboard_info)
+
+# --- Export Endpoints ---
+
+@app.get("/export/{table}")
+async def export_table(
+    table: str,
+    fmt: str = Query("csv", alias="format", pattern="^(csv|ndjson)$"),
+    since: Optional[datetime] = None,
+    since_id: Optional[int] = None,
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    # Streams the whole (or post-watermark) table in id order with bounded memory
+    if table not in export.EXPORT_TABLES:
+        raise HTTPException(status_code=404, detail="Unknown export table")
+    try:
+        export.export_query(table, since, since_id)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    if database.shards is not None and since_id is not None:
+        # Shards fill their id ranges side by side, so one id watermark cannot cover them all
+        raise HTTPException(status_code=400, detail="since_id is not supported with sharded storage")
+    # Streamed straight from the reader engines (just the main one when unsharded), whatever DB_MODE is;
+    # shard k's ids all sort after shard k - 1's, so shard order is id order
+    body = itertools.chain.from_iterable(
+        export.iter_export(reader, table, fmt, since, since_id, header=shard == 0)
+        for shard, reader in enumerate(database.read_engines())
+    )
+    return StreamingResponse(
+        body,
+        media_type=export.MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{table}.{fmt}"'}
+    )
+
+# --- System Endpoints ---
+
+@app.get("/system/dashboard-cache", response_model=schemas.CacheStats)
+def read_dashboard_cache_stats(current_user: models.User = Depends(auth.get_current_user)):
+    return crud.dashboard_cache.stats()
+
+@app.get("/system/auth-cache", response_model=schemas.AuthCacheStats)
+def read_auth_cache_stats(current_user: models.User = Depends(auth.get_current_user)):
+    return {"users": auth.user_cache.stats(), "tokens": auth.token_cache.stats()}
+
+@app.get("/system/db-pool", response_model=schemas.DatabasePoolStats)
+def read_db_pool_stats(current_user: models.User = Depends(auth.get_current_user)):
+    return database.pool_stats()
+
+@app.get("/system/write-queue", response_model=schemas.WriteQueueStats)
+def read_write_queue_stats(current_user: models.User = Depends(auth.get_current_user)):
+    if indicator_queue is None:
+        return {"enabled": False}
+    return indicator_queue.stats()
+
+@app.get("/system/outbox", response_model=schemas.OutboxStats)
+def read_outbox_stats(current_user: models.User = Depends(auth.get_current_user)):
+    if outbox_worker is None:
+        return {"enabled": False}
+    return outbox_worker.stats()
@@ -0,0 +1,89 @@
+from typing import List
+from sqlalchemy import MetaData, inspect, text
+from sqlalchemy.orm import Session
+try:
+    from . import models, database, crud, trend
+except ImportError:
+    import models, database, crud, trend
+
+# Tables whose ids name their shard: shard k numbers them from k * database.SHARD_ID_STRIDE + 1
+SHARD_ID_TABLES = ("patients", "health_indicators", "risk_assessments", "follow_ups")
+
+def _add_column(engine, table, column):
+    # SQLite can only add nullable columns without constraints, which is all the models add
+    if not column.nullable and column.server_default is None:
+        raise RuntimeError(f"Cannot add NOT NULL column {table.name}.{column.name} without a server default")
+    column_type = column.type.compile(dialect=engine.dialect)
+    with engine.begin() as conn:
+        conn.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}'))
+
+def _create_shard(engine, shard: int):
+    # AUTOINCREMENT keeps ids in sqlite_sequence, which is seeded with the start of the shard's range
+    metadata = MetaData()
+    for table in models.Base.metadata.sorted_tables:
+        copy = table.to_metadata(metadata)
+        if table.name in SHARD_ID_TABLES:
+            copy.dialect_kwargs["sqlite_autoincrement"] = True
+    with engine.begin() as conn:
+        metadata.create_all(conn)
+        conn.execute(
+            text("INSERT INTO sqlite_sequence (name, seq) VALUES (:name, :seq)"),
+            [{"name": name, "seq": shard * database.SHARD_ID_STRIDE} for name in SHARD_ID_TABLES]
+        )
+
+def _fill(engine, rebuild):
+    db = Session(bind=engine)
+    try:
+        rebuild(db)
+    finally:
+        db.close()
+
+def _rebuild_trend_stats(db):
+    crud._rebuild_trend_stats(db)
+    db.commit()
+
+def upgrade(engine, shard: int = 0) -> List[str]:
+    """
+    Bring an existing database up to the current models.
+    create_all only creates missing tables, so columns and indexes added to
+    tables that already exist are created here. A new file for shard k > 0 is
+    first created with its id range. Derived tables new to a database that
+    already holds readings are filled from its history. Returns the names of
+    the columns (as table.column) and indexes created.
+    """
+    tables = set(inspect(engine).get_table_names())
+    if shard and not inspect(engine).has_table("patients"):
+        _create_shard(engine, shard)
+    models.Base.metadata.create_all(bind=engine)
+
+    created = []
+    inspector = inspect(engine)
+    for table in models.Base.metadata.sorted_tables:
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing:
+                _add_column(engine, table, column)
+                created.append(f"{table.name}.{column.name}")
+
+    for table in models.Base.metadata.sorted_tables:
+        existing = {ix["name"] for ix in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(bind=engine)
+                created.append(index.name)
+
+    # Until filled, empty derived tables read as patients without readings
+    if "health_indicators" in tables:
+        if "patient_states" not in tables:
+            _fill(engine, crud.rebuild_patient_states)
+        elif any(f"patient_states.{column}" in created for column in trend.STAT_COLUMNS):
+            # New statistic columns start NULL, which fold() would read as no history
+            _fill(engine, _rebuild_trend_stats)
+        if "patient_daily_rollups" not in tables:
+            _fill(engine, crud.backfill_daily_rollups)
+
+    # Refresh planner statistics so new indexes are picked up
+    if created:
+        with engine.begin() as conn:
+            conn.execute(text("ANALYZE"))
+    return created
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, ForeignKey, Boolean, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime, timezone
 try:
@@ -22,18 +22,22 @@ class Patient(Base):
     __tablename__ = "patients"
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
-    age = Column(Integer)
+    age = Column(Integer, index=True)
     gender = Column(String)
     contact_info = Column(String)
-    created_at = Column(DateTime, default=get_utc_now)
+    created_at = Column(DateTime, default=get_utc_now, index=True)
 
     # Relationships
     indicators = relationship("HealthIndicator", back_populates="patient")
     assessments = relationship("RiskAssessment", back_populates="patient")
     follow_ups = relationship("FollowUp", back_populates="patient")
+    state = relationship("PatientState", back_populates="patient", uselist=False)
 
 class HealthIndicator(Base):
     __tablename__ = "health_indicators"
+    __table_args__ = (
+        Index("ix_health_indicators_patient_id_recorded_at", "patient_id", "recorded_at"),
+    )
     id = Column(Integer, primary_key=True, index=True)
     patient_id = Column(Integer, ForeignKey("patients.id"))
     blood_pressure_sys = Column(Integer)
@@ -45,16 +49,29 @@ class HealthIndicator(Base):
 
 class RiskAssessment(Base):
     __tablename__ = "risk_assessments"
+    __table_args__ = (
+        Index("ix_risk_assessments_patient_id_assessment_date", "patient_id", "assessment_date"),
+        Index("ix_risk_assessments_indicator_id_rule_version", "indicator_id", "rule_version"),
+    )
     id = Column(Integer, primary_key=True, index=True)
     patient_id = Column(Integer, ForeignKey("patients.id"))
     risk_level = Column(String)  # High, Med, Low
     assessment_date = Column(DateTime, default=get_utc_now)
     notes = Column(String)
+    # The reading scored and the risk_engine.RULE_VERSION it was scored under (NULL on older rows)
+    indicator_id = Column(Integer, ForeignKey("health_indicators.id"), nullable=True)
+    rule_version = Column(Integer, nullable=True)
 
     patient = relationship("Patient", back_populates="assessments")
 
 class FollowUp(Base):
     __tablename__ = "follow_ups"
+    __table_args__ = (
+        Index("ix_follow_ups_status_due_date", "status", "due_date"),
+        Index("ix_follow_ups_due_date", "due_date"),
+        Index("ix_follow_ups_patient_id_status", "patient_id", "status"),
+        Index("ix_follow_ups_patient_id_due_date", "patient_id", "due_date"),
+    )
     id = Column(Integer, primary_key=True, index=True)
     patient_id = Column(Integer, ForeignKey("patients.id"))
     task_description = Column(String)
@@ -63,3 +80,80 @@ class FollowUp(Base):
     completed_at = Column(DateTime, nullable=True)
 
     patient = relationship("Patient", back_populates="follow_ups")
+
+class PatientState(Base):
+    # Denormalized latest state per patient, maintained on every indicator write
+    __tablename__ = "patient_states"
+    patient_id = Column(Integer, ForeignKey("patients.id"), primary_key=True)
+    risk_level = Column(String, index=True)
+    last_sbp = Column(Integer)
+    last_dbp = Column(Integer)
+    last_glucose = Column(Float)
+    last_recorded_at = Column(DateTime)
+    last_assessed_at = Column(DateTime)
+    next_follow_up_due = Column(DateTime, nullable=True)
+    # Running trend statistics folded in per reading (see trend.py); NULL until rebuilt on older databases
+    reading_count = Column(Integer)
+    mean_sbp = Column(Float)
+    m2_sbp = Column(Float)
+    mean_dbp = Column(Float)
+    m2_dbp = Column(Float)
+    mean_glucose = Column(Float)
+    m2_glucose = Column(Float)
+    ewma_sbp = Column(Float)
+    ewma_dbp = Column(Float)
+    ewma_glucose = Column(Float)
+    ew_weight = Column(Float)
+    ew_mean_t = Column(Float)
+    ew_m2_t = Column(Float)
+    ew_cov_sbp = Column(Float)
+    ew_cov_dbp = Column(Float)
+    ew_cov_glucose = Column(Float)
+
+    patient = relationship("Patient", back_populates="state")
+
+class PatientDailyRollup(Base):
+    # Per-patient, per-day (UTC) reading aggregates, maintained incrementally on ingest
+    __tablename__ = "patient_daily_rollups"
+    patient_id = Column(Integer, ForeignKey("patients.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    reading_count = Column(Integer, nullable=False, default=0)
+    sum_sbp = Column(Integer, nullable=False, default=0)
+    min_sbp = Column(Integer)
+    max_sbp = Column(Integer)
+    sum_dbp = Column(Integer, nullable=False, default=0)
+    min_dbp = Column(Integer)
+    max_dbp = Column(Integer)
+    sum_glucose = Column(Float, nullable=False, default=0.0)
+    min_glucose = Column(Float)
+    max_glucose = Column(Float)
+
+class IndicatorOutbox(Base):
+    # Readings whose assessment, follow-ups and derived state are still to be written (INGEST_MODE=outbox)
+    __tablename__ = "indicator_outbox"
+    id = Column(Integer, primary_key=True)
+    indicator_id = Column(Integer, ForeignKey("health_indicators.id"), unique=True, nullable=False)
+    enqueued_at = Column(DateTime, nullable=False, default=get_utc_now)
+    # Retry bookkeeping: an entry is picked up again once available_at passes, until it fails for good
+    attempts = Column(Integer, nullable=False, default=0)
+    available_at = Column(DateTime, nullable=False, default=get_utc_now)
+    last_error = Column(String, nullable=True)
+    failed_at = Column(DateTime, nullable=True, index=True)
+
+class RescoreCheckpoint(Base):
+    # Progress of the historical re-scoring job, one row per rule version
+    __tablename__ = "rescore_checkpoints"
+    rule_version = Column(Integer, primary_key=True)
+    last_indicator_id = Column(Integer, nullable=False, default=0)
+    rows_scored = Column(Integer, nullable=False, default=0)
+    started_at = Column(DateTime, default=get_utc_now)
+    updated_at = Column(DateTime, default=get_utc_now)
+    completed_at = Column(DateTime, nullable=True)
+
+class ArchiveWatermark(Base):
+    # Per archived table: rows older than archived_before may live in the archive database (see archive.py)
+    __tablename__ = "archive_watermarks"
+    table_name = Column(String, primary_key=True)
+    archived_before = Column(DateTime, nullable=False)
+    rows_archived = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=get_utc_now)
@@ -0,0 +1,160 @@
+import os
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+try:
+    from . import crud
+except ImportError:
+    import crud
+
+logger = logging.getLogger(__name__)
+
+# "inline" writes the assessment and follow-ups inside POST /indicators/; "outbox" stores the
+# reading plus an outbox entry and leaves the rest to the background OutboxWorker
+INGEST_MODE = os.getenv("INGEST_MODE", "inline")
+OUTBOX_ENABLED = INGEST_MODE == "outbox"
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "500"))
+# Idle workers re-check the outbox this often; new readings wake them straight away
+OUTBOX_POLL_INTERVAL_MS = float(os.getenv("OUTBOX_POLL_INTERVAL_MS", "1000"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5"))
+OUTBOX_RETRY_BACKOFF_MS = float(os.getenv("OUTBOX_RETRY_BACKOFF_MS", "500"))
+
+class OutboxWorker:
+    """
+    Background thread that drains the indicator outbox in batches. A batch that
+    fails is retried one entry at a time, so a bad reading only delays itself;
+    entries failing OUTBOX_MAX_ATTEMPTS times are parked with failed_at set.
+    stats() counts the backlog through read_session_factory when given, so
+    metrics polls never wait for the writer.
+    """
+
+    def __init__(
+        self,
+        session_factory,
+        batch_size: int = OUTBOX_BATCH_SIZE,
+        poll_interval_ms: float = OUTBOX_POLL_INTERVAL_MS,
+        max_attempts: int = OUTBOX_MAX_ATTEMPTS,
+        retry_backoff_ms: float = OUTBOX_RETRY_BACKOFF_MS,
+        read_session_factory=None
+    ):
+        self.session_factory = session_factory
+        self.read_session_factory = read_session_factory or session_factory
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval_ms / 1000
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff_ms / 1000
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stopping = threading.Event()
+        self._wake = threading.Event()
+        self.batches = 0
+        self.processed = 0
+        self.retries = 0
+        self.process_seconds = 0.0
+        self.lag_seconds = 0.0
+        self.max_lag_seconds = 0.0
+        self.last_lag_seconds = 0.0
+        self.last_error = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping.clear()
+                self._thread = threading.Thread(target=self._run, name="indicator-outbox", daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        # Entries left in the outbox are durable and picked up on the next start
+        self._stopping.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def notify(self):
+        self.start()
+        self._wake.set()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wake.clear()
+            try:
+                processed = self.run_once()
+            except Exception:
+                logger.exception("Indicator outbox batch failed")
+                processed = 0
+            if processed < self.batch_size:
+                self._wake.wait(self.poll_interval)
+
+    def run_once(self) -> int:
+        """Process one batch of due entries and return how many were processed."""
+        db = self.session_factory()
+        try:
+            ids = crud.due_outbox_ids(db, self.batch_size)
+            db.rollback()
+            if not ids:
+                return 0
+            started = time.perf_counter()
+            try:
+                enqueued = crud.process_indicator_outbox(db, ids)
+            except Exception:
+                db.rollback()
+                enqueued = self._process_one_by_one(db, ids)
+            self._record(enqueued, time.perf_counter() - started)
+            return len(enqueued)
+        finally:
+            db.close()
+
+    def _process_one_by_one(self, db, ids) -> list:
+        enqueued = []
+        for outbox_id in ids:
+            try:
+                enqueued += crud.process_indicator_outbox(db, [outbox_id])
+            except Exception as exc:
+                db.rollback()
+                error = f"{type(exc).__name__}: {exc}"
+                with self._lock:
+                    self.retries += 1
+                    self.last_error = error
+                logger.warning("Indicator outbox entry %s failed: %s", outbox_id, error)
+                crud.record_outbox_failure(db, outbox_id, error, self.max_attempts, self.retry_backoff)
+        return enqueued
+
+    def _record(self, enqueued: list, seconds: float):
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        lags = [(now - crud._as_utc_naive(at)).total_seconds() for at in enqueued]
+        with self._lock:
+            self.batches += 1
+            self.processed += len(lags)
+            self.process_seconds += seconds
+            self.lag_seconds += sum(lags)
+            if lags:
+                self.last_lag_seconds = max(lags)
+                self.max_lag_seconds = max(self.max_lag_seconds, self.last_lag_seconds)
+
+    def stats(self) -> dict:
+        db = self.read_session_factory()
+        try:
+            backlog = crud.get_outbox_backlog(db)
+        finally:
+            db.close()
+        oldest = backlog["oldest_enqueued_at"]
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        with self._lock:
+            return {
+                "enabled": True,
+                "running": self._thread is not None and self._thread.is_alive(),
+                "batch_size": self.batch_size,
+                "pending": backlog["pending"],
+                "failed": backlog["failed"],
+                "oldest_pending_age_ms": round((now - crud._as_utc_naive(oldest)).total_seconds() * 1000, 3) if oldest else 0.0,
+                "batches": self.batches,
+                "processed": self.processed,
+                "retries": self.retries,
+                "avg_batch_ms": round(self.process_seconds / self.batches * 1000, 3) if self.batches else 0.0,
+                "avg_lag_ms": round(self.lag_seconds / self.processed * 1000, 3) if self.processed else 0.0,
+                "last_lag_ms": round(self.last_lag_seconds * 1000, 3),
+                "max_lag_ms": round(self.max_lag_seconds * 1000, 3),
+                "last_error": self.last_error,
+            }
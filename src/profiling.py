@@ -0,0 +1,210 @@
+import os
+import time
+import logging
+import threading
+from contextvars import ContextVar
+from typing import Iterable, Optional
+from sqlalchemy import event
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+try:
+    from . import database
+except ImportError:
+    import database
+
+logger = logging.getLogger(__name__)
+
+# Opt-in request profiling (PROFILING=1): SQL accounting, Server-Timing headers and /metrics
+PROFILING_ENABLED = os.getenv("PROFILING", "0") == "1"
+# Statements slower than this are logged with their query plan
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+
+# Upper bounds of the histogram buckets, Prometheus style
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+class RequestStats:
+    __slots__ = ("statements", "sql_seconds", "_lock")
+
+    def __init__(self):
+        self.statements = 0
+        self.sql_seconds = 0.0
+        # Shard fan-out runs one request's statements on several threadpool threads at once
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float):
+        with self._lock:
+            self.statements += 1
+            self.sql_seconds += seconds
+
+# Set for the duration of each profiled request. Threadpool and run_sync calls run in a
+# copy of the request's context, so they add to the same RequestStats object.
+_current: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "total", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.total += value
+        self.count += 1
+        for n, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[n] += 1
+                break
+
+    def render(self, name: str, labels: str) -> list:
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {self.count}')
+        lines.append(f"{name}_sum{{{labels}}} {round(self.total, 6)}")
+        lines.append(f"{name}_count{{{labels}}} {self.count}")
+        return lines
+
+class Metrics:
+    """Per-route request histograms, kept in process and rendered in the Prometheus text format."""
+
+    SERIES = (
+        ("http_request_duration_seconds", "Request wall time", DURATION_BUCKETS),
+        ("http_request_sql_statements", "SQL statements executed per request", STATEMENT_BUCKETS),
+        ("http_request_sql_duration_seconds", "Time spent in SQL per request", DURATION_BUCKETS),
+    )
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = {}
+        self.slow_statements = 0
+
+    def observe(self, method: str, route: str, status: int, seconds: float, stats: RequestStats):
+        key = (method, route, str(status))
+        with self._lock:
+            series = self._routes.get(key)
+            if series is None:
+                series = self._routes[key] = [Histogram(buckets) for _, _, buckets in self.SERIES]
+            for histogram, value in zip(series, (seconds, stats.statements, stats.sql_seconds)):
+                histogram.observe(value)
+
+    def count_slow(self):
+        with self._lock:
+            self.slow_statements += 1
+
+    def render(self) -> str:
+        with self._lock:
+            lines = []
+            for n, (name, description, _) in enumerate(self.SERIES):
+                lines += [f"# HELP {name} {description}", f"# TYPE {name} histogram"]
+                for (method, route, status), series in sorted(self._routes.items()):
+                    lines += series[n].render(name, f'method="{method}",route="{route}",status="{status}"')
+            lines += [
+                "# HELP db_slow_statements_total Statements slower than SLOW_QUERY_MS",
+                "# TYPE db_slow_statements_total counter",
+                f"db_slow_statements_total {self.slow_statements}",
+            ]
+            return "\n".join(lines) + "\n"
+
+    def clear(self):
+        with self._lock:
+            self._routes.clear()
+            self.slow_statements = 0
+
+metrics = Metrics()
+
+def _explain(conn, statement: str, parameters) -> str:
+    # Runs on the raw DBAPI connection, so it fires no events and cannot recurse
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        cursor.execute("EXPLAIN QUERY PLAN " + statement, parameters)
+        return "; ".join(row[3] for row in cursor.fetchall())
+    finally:
+        cursor.close()
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    stats = _current.get()
+    if stats is not None:
+        stats.add(elapsed)
+    if elapsed * 1000 < SLOW_QUERY_MS:
+        return
+
+    metrics.count_slow()
+    plan = None
+    if not executemany and statement.lstrip().upper().startswith(("SELECT", "WITH", "UPDATE", "DELETE")):
+        try:
+            plan = _explain(conn, statement, parameters)
+        except Exception as exc:
+            plan = f"unavailable ({exc})"
+    logger.warning("Slow SQL statement (%.1f ms): %s | parameters=%r | plan: %s", elapsed * 1000, statement, parameters, plan)
+
+_instrumented = set()
+
+def instrument_engine(engine):
+    """Attach the SQL timing listeners to an engine (sync, or an AsyncEngine's sync_engine)."""
+    engine = getattr(engine, "sync_engine", engine)
+    if engine in _instrumented:
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    _instrumented.add(engine)
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware recording wall time, SQL statement count and SQL time for
+    every HTTP request. Adds a Server-Timing header and feeds `metrics`.
+    """
+
+    def __init__(self, app, registry: Metrics = metrics):
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                elapsed = (time.perf_counter() - started) * 1000
+                timing = f'app;dur={elapsed:.1f}, db;dur={stats.sql_seconds * 1000:.1f};desc="{stats.statements} queries"'
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"server-timing", timing.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            # Label by route template (not raw path) to keep the number of series bounded
+            route = scope.get("route")
+            self.registry.observe(
+                scope["method"], getattr(route, "path", "unmatched"), status,
+                time.perf_counter() - started, stats
+            )
+
+def install(app: FastAPI, engines: Optional[Iterable] = None):
+    """Profile every request to `app` and serve the histograms at GET /metrics."""
+    if engines is None:
+        # Every shard's engines (just the main pair when unsharded) plus the async pair
+        engines = database.writer_engines() + database.read_engines() + [database.async_engine, database.async_read_engine]
+    for engine in engines:
+        instrument_engine(engine)
+    app.add_middleware(ProfilingMiddleware)
+
+    @app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+    def read_metrics():
+        return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,141 @@
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import Callable, Optional
+import numpy as np
+from sqlalchemy import select, func, String, type_coerce
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+try:
+    from . import models, risk_engine, crud
+except ImportError:
+    import models, risk_engine, crud
+
+# Readings fetched, scored and committed together; the checkpoint advances once per chunk
+RESCORE_CHUNK_SIZE = int(os.getenv("RESCORE_CHUNK_SIZE", "20000"))
+RESCORE_WORKERS = int(os.getenv("RESCORE_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# Written through the driver so recorded_at is copied as stored, without a datetime round trip
+INSERT_ASSESSMENTS = (
+    "INSERT INTO risk_assessments (patient_id, risk_level, assessment_date, notes, indicator_id, rule_version) "
+    "VALUES (?, ?, ?, ?, ?, ?)"
+)
+
+def score_chunk(chunk: tuple) -> list:
+    """Score one chunk of readings, given as columns, into risk_assessments rows. Runs in the pool workers."""
+    ids, patient_ids, sbp, dbp, glucose, recorded_at, rule_version = chunk
+    codes = risk_engine.calculate_risk_levels(sbp, dbp, glucose)
+    levels = np.array(risk_engine.RISK_LEVELS, dtype=object)[codes].tolist()
+    notes = [f"Re-scored (rule version {rule_version}) based on BP {s}/{d} and Glucose {g}" for s, d, g in zip(sbp, dbp, glucose)]
+    return list(zip(patient_ids, levels, recorded_at, notes, ids, [rule_version] * len(ids)))
+
+def _unscored_readings(rule_version: int, after_id: int, max_id: int, chunk_size: int):
+    # Readings that already have an assessment under this version (scored on ingest, or by an
+    # earlier run) are skipped, so an interrupted or repeated run never writes duplicates
+    # The index is named explicitly: on legacy data indicator_id is all NULL, and the ANALYZE
+    # statistics then make the planner scan risk_assessments once per reading instead
+    indicator, assessment = models.HealthIndicator, models.RiskAssessment
+    scored = select(assessment.id).where(
+        assessment.indicator_id == indicator.id, assessment.rule_version == rule_version
+    ).with_hint(assessment, "INDEXED BY ix_risk_assessments_indicator_id_rule_version", "sqlite").exists()
+    return select(
+        indicator.id,
+        indicator.patient_id,
+        indicator.blood_pressure_sys,
+        indicator.blood_pressure_dia,
+        indicator.glucose,
+        type_coerce(indicator.recorded_at, String)
+    ).where(indicator.id > after_id, indicator.id <= max_id, ~scored).order_by(indicator.id).limit(chunk_size)
+
+def _save_checkpoint(conn, rule_version: int, **values):
+    values["updated_at"] = datetime.now(timezone.utc)
+    stmt = sqlite_insert(models.RescoreCheckpoint).values(rule_version=rule_version, **values)
+    conn.execute(stmt.on_conflict_do_update(index_elements=[models.RescoreCheckpoint.rule_version], set_=values))
+
+def rescore(
+    engine,
+    rule_version: int = risk_engine.RULE_VERSION,
+    chunk_size: int = RESCORE_CHUNK_SIZE,
+    workers: int = RESCORE_WORKERS,
+    restart: bool = False,
+    progress: Optional[Callable[[dict], None]] = None
+) -> dict:
+    """
+    Re-score every stored reading under `rule_version`, writing one new tagged
+    assessment per reading. Readings are read in id order, scored across a
+    process pool (in-process with workers=0) and committed chunk by chunk
+    together with the checkpoint, so an interrupted run resumes where it
+    stopped. Patient states are rebuilt at the end. Returns a summary.
+    """
+    started = time.perf_counter()
+    checkpoint_table = models.RescoreCheckpoint
+    with engine.connect() as conn:
+        checkpoint = conn.execute(select(checkpoint_table).where(checkpoint_table.rule_version == rule_version)).first()
+        resumed_from = 0 if restart or checkpoint is None else checkpoint.last_indicator_id
+        scored_before = 0 if restart or checkpoint is None else checkpoint.rows_scored
+        # A run that stopped after scoring, before its rebuild finished, still owes the rebuild
+        completed = not restart and checkpoint is not None and checkpoint.completed_at is not None
+        max_id = conn.execute(select(func.max(models.HealthIndicator.id))).scalar() or 0
+        if checkpoint is None or restart:
+            _save_checkpoint(conn, rule_version, last_indicator_id=0, rows_scored=0, started_at=datetime.now(timezone.utc), completed_at=None)
+        conn.commit()
+
+        rows = 0
+        fetched_id = resumed_from
+        exhausted = False
+        pending = deque()
+        pool = ProcessPoolExecutor(workers) if workers > 0 else None
+        try:
+            while True:
+                # 1. Keep a bounded number of chunks in flight, so memory stays flat at any table size
+                while not exhausted and len(pending) < max(2, workers * 2):
+                    chunk = conn.execute(_unscored_readings(rule_version, fetched_id, max_id, chunk_size)).all()
+                    if not chunk:
+                        exhausted = True
+                        break
+                    fetched_id = chunk[-1][0]
+                    columns = tuple(map(list, zip(*chunk))) + (rule_version,)
+                    pending.append((fetched_id, pool.submit(score_chunk, columns) if pool else score_chunk(columns)))
+                if not pending:
+                    break
+
+                # 2. Write chunks in order; the checkpoint commits with the rows it covers
+                last_id, result = pending.popleft()
+                assessments = result.result() if pool else result
+                conn.exec_driver_sql(INSERT_ASSESSMENTS, assessments)
+                rows += len(assessments)
+                _save_checkpoint(conn, rule_version, last_indicator_id=last_id, rows_scored=scored_before + rows)
+                conn.commit()
+                if progress:
+                    elapsed = time.perf_counter() - started
+                    progress({"last_indicator_id": last_id, "max_indicator_id": max_id, "rows": rows, "rows_per_second": round(rows / elapsed, 1) if elapsed > 0 else 0.0})
+        finally:
+            if pool:
+                pool.shutdown(cancel_futures=True)
+
+        _save_checkpoint(conn, rule_version, last_indicator_id=max_id)
+        conn.commit()
+
+    # Latest assessments may have changed level, so the current state is recomputed from history;
+    # the checkpoint only counts as completed once that rebuild has gone through
+    patients = 0
+    if rows or not completed:
+        db = Session(bind=engine)
+        try:
+            patients = crud.rebuild_patient_states(db)
+        finally:
+            db.close()
+    with engine.begin() as conn:
+        _save_checkpoint(conn, rule_version, completed_at=datetime.now(timezone.utc))
+
+    elapsed = time.perf_counter() - started
+    return {
+        "rule_version": rule_version,
+        "resumed_from": resumed_from,
+        "rows": rows,
+        "patients_refreshed": patients,
+        "elapsed_seconds": round(elapsed, 2),
+        "rows_per_second": round(rows / elapsed, 1) if elapsed > 0 else 0.0,
+    }
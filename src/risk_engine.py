@@ -1,9 +1,15 @@
 from datetime import datetime, timedelta, timezone
+from typing import Sequence, Tuple, Union
+import numpy as np
 try:
     from . import models
 except ImportError:
     import models
 
+# Bump whenever the thresholds below change; assessments record the version that scored them
+# and `manage.py rescore` re-evaluates history under the current one
+RULE_VERSION = 1
+
 def calculate_risk_level(sys_bp: int, dia_bp: int, glucose: float) -> str:
     """
     Calculate risk level based on blood pressure and glucose (US-04).
@@ -19,6 +25,37 @@ def calculate_risk_level(sys_bp: int, dia_bp: int, glucose: float) -> str:
     else:
         return "Low"
 
+# Compact risk codes used by the batch API; RISK_LEVELS[code] gives the level name
+RISK_LOW, RISK_MED, RISK_HIGH = 0, 1, 2
+RISK_LEVELS = ("Low", "Med", "High")
+RISK_CODES = {level: code for code, level in enumerate(RISK_LEVELS)}
+
+# Follow-up policy per risk code, kept in step with generate_follow_up_task
+FOLLOW_UP_DAYS = np.array([30, 7, 3], dtype="timedelta64[D]")
+FOLLOW_UP_DESCRIPTIONS = np.array([
+    "Standard monthly health check.",
+    "Routine follow-up for medium risk monitoring.",
+    "Urgent follow-up required due to high risk indicators.",
+], dtype=object)
+
+def calculate_risk_levels(sys_bp, dia_bp, glucose) -> np.ndarray:
+    """
+    Vectorized calculate_risk_level for columns of readings.
+    Accepts NumPy arrays or any buffer-protocol column and returns an int8 array
+    of risk codes (see RISK_LEVELS) using exactly the same thresholds.
+    """
+    sys_bp = np.asarray(sys_bp, dtype=np.float64)
+    dia_bp = np.asarray(dia_bp, dtype=np.float64)
+    glucose = np.asarray(glucose, dtype=np.float64)
+
+    high = (sys_bp >= 160) | (dia_bp >= 100) | (glucose >= 11.1)
+    med = (sys_bp >= 140) | (dia_bp >= 90) | ((glucose >= 7.0) & (glucose < 11.1))
+
+    codes = np.full(np.broadcast_shapes(sys_bp.shape, dia_bp.shape, glucose.shape), RISK_LOW, dtype=np.int8)
+    codes[med] = RISK_MED
+    codes[high] = RISK_HIGH
+    return codes
+
 def generate_follow_up_task(patient_id: int, risk_level: str) -> models.FollowUp:
     """
     Automatically generate follow-up task based on risk level (US-07).
@@ -43,3 +80,24 @@ def generate_follow_up_task(patient_id: int, risk_level: str) -> models.FollowUp
         status="Pending",
         due_date=due_date
     )
+
+def _utc_naive(value: datetime) -> datetime:
+    # Naive values are already UTC (as stored); aware ones are converted
+    return value.astimezone(timezone.utc).replace(tzinfo=None) if value.tzinfo is not None else value
+
+def generate_follow_up_tasks(risk_codes, now: Union[datetime, Sequence[datetime], None] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Batched generate_follow_up_task for an array of risk codes.
+    `now` is one time for every code or one per code (e.g. each reading's recorded_at).
+    Returns (due_dates, descriptions): due dates as naive UTC datetime64[us]
+    and descriptions as an object array, both aligned with risk_codes.
+    """
+    if now is None:
+        now = datetime.now(timezone.utc)
+    codes = np.asarray(risk_codes, dtype=np.intp)
+    if isinstance(now, datetime):
+        base = np.datetime64(_utc_naive(now), "us")
+    else:
+        base = np.array([_utc_naive(t) for t in now], dtype="datetime64[us]")
+    due_dates = base + FOLLOW_UP_DAYS[codes]
+    return due_dates, FOLLOW_UP_DESCRIPTIONS[codes]
@@ -1,6 +1,7 @@
 from pydantic import BaseModel, ConfigDict
-from typing import List, Optional, Dict
+from typing import List, Optional, Dict, Union
 from datetime import datetime
+from dataclasses import dataclass, field
 
 # Health Indicator Schemas
 class HealthIndicatorBase(BaseModel):
@@ -16,6 +17,18 @@ class HealthIndicator(HealthIndicatorBase):
     recorded_at: datetime
     model_config = ConfigDict(from_attributes=True)
 
+class HealthIndicatorBatchItem(HealthIndicator):
+    index: int
+    patient_id: int
+    risk_level: str
+    follow_up_due_date: datetime
+
+class HealthIndicatorBatchResult(BaseModel):
+    items: List[HealthIndicatorBatchItem]
+    count: int
+    elapsed_ms: float
+    items_per_second: float
+
 # Risk Assessment Schemas
 class RiskAssessmentBase(BaseModel):
     risk_level: str
@@ -24,6 +37,7 @@ class RiskAssessmentBase(BaseModel):
 class RiskAssessment(RiskAssessmentBase):
     id: int
     assessment_date: datetime
+    rule_version: Optional[int] = None
     model_config = ConfigDict(from_attributes=True)
 
 # Follow-up Schemas
@@ -71,12 +85,63 @@ class PatientFollowUpGroup(BaseModel):
     patient: PatientBrief
     followups: List[FollowUp]
 
+# Keyset-paginated responses; pass next_cursor back as ?cursor= to fetch the next page
+class PatientPage(BaseModel):
+    items: List[Patient]
+    next_cursor: Optional[str] = None
+
+class FollowUpGroupPage(BaseModel):
+    items: List[PatientFollowUpGroup]
+    next_cursor: Optional[str] = None
+
 class PatientDetail(Patient):
     indicators: List[HealthIndicator] = []
     assessments: List[RiskAssessment] = []
     follow_ups: List[FollowUp] = []
     model_config = ConfigDict(from_attributes=True)
 
+# Row records for the fast list/detail path: built straight from selected column
+# tuples and serialized by orjson. Field order matches the schema above each
+# record, so the JSON is the same as the schema would produce.
+@dataclass(slots=True)
+class PatientRecord:  # Patient
+    name: str
+    age: int
+    gender: str
+    contact_info: Optional[str]
+    id: int
+    created_at: datetime
+
+@dataclass(slots=True)
+class HealthIndicatorRecord:  # HealthIndicator
+    blood_pressure_sys: int
+    blood_pressure_dia: int
+    glucose: float
+    id: int
+    recorded_at: datetime
+
+@dataclass(slots=True)
+class RiskAssessmentRecord:  # RiskAssessment
+    risk_level: str
+    notes: Optional[str]
+    id: int
+    assessment_date: datetime
+    rule_version: Optional[int]
+
+@dataclass(slots=True)
+class FollowUpRecord:  # FollowUp
+    task_description: str
+    status: str
+    due_date: datetime
+    id: int
+    completed_at: Optional[datetime]
+
+@dataclass(slots=True)
+class PatientDetailRecord(PatientRecord):  # PatientDetail
+    indicators: List[HealthIndicatorRecord] = field(default_factory=list)
+    assessments: List[RiskAssessmentRecord] = field(default_factory=list)
+    follow_ups: List[FollowUpRecord] = field(default_factory=list)
+
 # User & Auth Schemas
 class UserBase(BaseModel):
     username: str
@@ -105,6 +170,17 @@ class HealthTrend(BaseModel):
     avg_glucose: float
     record_count: int
     status: str  # e.g., "Improving", "Stable", "Deteriorating"
+    # Running statistics over every reading; slopes are per day, from the exponentially weighted fit
+    total_readings: Optional[int] = None
+    ewma_sbp: Optional[float] = None
+    ewma_dbp: Optional[float] = None
+    ewma_glucose: Optional[float] = None
+    std_sbp: Optional[float] = None
+    std_dbp: Optional[float] = None
+    std_glucose: Optional[float] = None
+    slope_sbp: Optional[float] = None
+    slope_dbp: Optional[float] = None
+    slope_glucose: Optional[float] = None
     model_config = ConfigDict(from_attributes=True)
 
 # Dashboard Schemas
@@ -131,3 +207,71 @@ class DashboardInfo(BaseModel):
     risk_distribution: RiskDistribution
     weekly_patient_registrations: List[WeeklyRegistration]
     age_distribution: List[AgeDistribution]
+
+# System Schemas
+class CacheStats(BaseModel):
+    size: int
+    maxsize: int
+    ttl_seconds: float
+    hits: int
+    misses: int
+    hit_rate: float
+    invalidations: int
+    rebuilds: int
+    avg_rebuild_ms: float
+    last_rebuild_ms: float
+    max_rebuild_ms: float
+
+class AuthCacheStats(BaseModel):
+    users: CacheStats
+    tokens: CacheStats
+
+class PoolStatus(BaseModel):
+    pool: str
+    size: Optional[int] = None
+    checkedin: Optional[int] = None
+    checkedout: Optional[int] = None
+    overflow: Optional[int] = None
+
+class ShardPoolStatus(BaseModel):
+    writer: PoolStatus
+    reader: PoolStatus
+
+class DatabasePoolStats(BaseModel):
+    mode: str
+    pragmas: Dict[str, Union[int, str]]
+    writer: PoolStatus
+    reader: PoolStatus
+    # One entry per shard (shard 0 first) when SHARD_COUNT > 1
+    shards: Optional[List[ShardPoolStatus]] = None
+
+class WriteQueueStats(BaseModel):
+    enabled: bool
+    max_delay_ms: float = 0.0
+    max_batch: int = 0
+    queue_depth: int = 0
+    max_queue_depth: int = 0
+    batches: int = 0
+    items: int = 0
+    avg_batch_size: float = 0.0
+    max_batch_size: int = 0
+    batch_size_histogram: Dict[str, int] = {}
+    avg_commit_ms: float = 0.0
+    avg_wait_ms: float = 0.0
+    fallbacks: int = 0
+
+class OutboxStats(BaseModel):
+    enabled: bool
+    running: bool = False
+    batch_size: int = 0
+    pending: int = 0
+    failed: int = 0
+    oldest_pending_age_ms: float = 0.0
+    batches: int = 0
+    processed: int = 0
+    retries: int = 0
+    avg_batch_ms: float = 0.0
+    avg_lag_ms: float = 0.0
+    last_lag_ms: float = 0.0
+    max_lag_ms: float = 0.0
+    last_error: Optional[str] = None
@@ -0,0 +1,303 @@
+import os
+import re
+import json
+import shutil
+from datetime import date, datetime
+from typing import Optional
+from sqlalchemy import select, Integer, Float, Boolean, Date, DateTime
+try:
+    from . import models, export
+except ImportError:
+    import models, export
+
+# pyarrow is optional; only the snapshot job needs it
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pc = pq = None
+
+SNAPSHOT_COMPRESSION = os.getenv("SNAPSHOT_COMPRESSION", "snappy")
+# A month partition holding at least this many files is merged into one
+SNAPSHOT_COMPACT_MIN_FILES = int(os.getenv("SNAPSHOT_COMPACT_MIN_FILES", "8"))
+# Rows buffered per partition before a row group is written; bigger groups compress and scan better
+SNAPSHOT_ROW_GROUP_SIZE = int(os.getenv("SNAPSHOT_ROW_GROUP_SIZE", "65536"))
+STATE_FILE = "_snapshot_state.json"
+
+# Append-only tables: each run adds the rows past the id high-water mark,
+# partitioned by the month of their timestamp column
+APPEND_DATASETS = {
+    "health_indicators": (models.HealthIndicator, "recorded_at"),
+    "risk_assessments": (models.RiskAssessment, "assessment_date"),
+}
+
+def _full_datasets() -> dict:
+    # Tables whose rows change in place, rewritten on every run: (query, partition column or None)
+    latest_risk = select(
+        models.Patient.id.label("patient_id"),
+        models.Patient.name,
+        models.Patient.age,
+        models.Patient.gender,
+        models.PatientState.risk_level,
+        models.PatientState.last_sbp,
+        models.PatientState.last_dbp,
+        models.PatientState.last_glucose,
+        models.PatientState.last_recorded_at,
+        models.PatientState.last_assessed_at,
+        models.PatientState.next_follow_up_due,
+    ).join(models.PatientState, models.PatientState.patient_id == models.Patient.id).order_by(models.Patient.id)
+    return {
+        "patients": (select(*models.Patient.__table__.columns).order_by(models.Patient.id), None),
+        "follow_ups": (select(*models.FollowUp.__table__.columns).order_by(models.FollowUp.id), "due_date"),
+        "latest_risk": (latest_risk, None),
+    }
+
+def _require_pyarrow():
+    if pa is None:
+        raise RuntimeError("Parquet snapshots need pyarrow: pip install pyarrow")
+
+def _arrow_type(sql_type):
+    if isinstance(sql_type, DateTime):
+        return pa.timestamp("us")
+    if isinstance(sql_type, Date):
+        return pa.date32()
+    if isinstance(sql_type, Boolean):
+        return pa.bool_()
+    if isinstance(sql_type, Integer):
+        return pa.int64()
+    if isinstance(sql_type, Float):
+        return pa.float64()
+    return pa.string()
+
+def arrow_schema(query):
+    _require_pyarrow()
+    return pa.schema([(column.name, _arrow_type(column.type)) for column in query.selected_columns])
+
+def _to_table(rows: list, schema):
+    columns = list(zip(*rows))
+    return pa.Table.from_arrays([pa.array(values, type=field.type) for values, field in zip(columns, schema)], schema=schema)
+
+class _PartitionWriter:
+    """
+    Writes one Parquet file per month partition (`month=YYYY-MM`) under `directory`.
+    Files are written with a .tmp suffix and only renamed into place by commit().
+    """
+
+    def __init__(self, directory: str, schema, filename: str, partition_column: Optional[str]):
+        self.directory = directory
+        self.schema = schema
+        self.filename = filename
+        self.partition_column = partition_column
+        self._writers = {}
+        self._buffers = {}
+        self.rows = 0
+
+    def _writer(self, month: Optional[str]):
+        if month not in self._writers:
+            folder = self.directory if month is None else os.path.join(self.directory, f"month={month}")
+            os.makedirs(folder, exist_ok=True)
+            path = os.path.join(folder, self.filename)
+            self._writers[month] = (path, pq.ParquetWriter(path + ".tmp", self.schema, compression=SNAPSHOT_COMPRESSION))
+        return self._writers[month][1]
+
+    def _buffer(self, month: Optional[str], table):
+        buffered = self._buffers.setdefault(month, [])
+        buffered.append(table)
+        if sum(t.num_rows for t in buffered) >= SNAPSHOT_ROW_GROUP_SIZE:
+            self._flush(month)
+
+    def _flush(self, month: Optional[str]):
+        buffered = self._buffers.pop(month, None)
+        if buffered:
+            self._writer(month).write_table(pa.concat_tables(buffered), row_group_size=SNAPSHOT_ROW_GROUP_SIZE)
+
+    def write(self, table):
+        self.rows += table.num_rows
+        if self.partition_column is None:
+            self._buffer(None, table)
+            return
+        months = pc.strftime(table[self.partition_column], format="%Y-%m")
+        for month in pc.unique(months).to_pylist():
+            mask = pc.is_null(months) if month is None else pc.equal(months, month)
+            self._buffer(month or "unknown", table.filter(mask))
+
+    def _close(self):
+        for path, writer in self._writers.values():
+            writer.close()
+
+    def commit(self) -> list:
+        for month in list(self._buffers):
+            self._flush(month)
+        self._close()
+        paths = []
+        for path, _ in self._writers.values():
+            os.replace(path + ".tmp", path)
+            paths.append(path)
+        return paths
+
+    def abort(self):
+        self._close()
+        for path, _ in self._writers.values():
+            if os.path.exists(path + ".tmp"):
+                os.remove(path + ".tmp")
+
+def _copy_query(conn, query, writer: _PartitionWriter):
+    for rows in export.iter_row_chunks(conn, query):
+        writer.write(_to_table(rows, writer.schema))
+
+PART_NAME = re.compile(r"part-(\d+)-(\d+)\.parquet$")
+
+def _written_high_water_mark(directory: str) -> int:
+    # File names carry their id range, so a run that died before saving state is not repeated
+    last_id = 0
+    if os.path.isdir(directory):
+        for _, _, filenames in os.walk(directory):
+            for match in filter(None, map(PART_NAME.match, filenames)):
+                last_id = max(last_id, int(match.group(2)))
+    return last_id
+
+def _append_dataset(conn, output_dir: str, name: str, state: dict, full: bool) -> int:
+    model, time_column = APPEND_DATASETS[name]
+    directory = os.path.join(output_dir, name)
+    last_id = 0 if full else max(state.get(name, {}).get("last_id", 0), _written_high_water_mark(directory))
+    if full and os.path.isdir(directory):
+        shutil.rmtree(directory)
+
+    max_id = conn.execute(select(model.id).order_by(model.id.desc()).limit(1)).scalar() or 0
+    if max_id <= last_id:
+        return 0
+    # Bounded above too, so rows committed while the snapshot runs wait for the next one
+    query = select(*model.__table__.columns).where(model.id > last_id, model.id <= max_id).order_by(model.id)
+    writer = _PartitionWriter(directory, arrow_schema(query), f"part-{last_id + 1:012d}-{max_id:012d}.parquet", time_column)
+    try:
+        _copy_query(conn, query, writer)
+    except BaseException:
+        writer.abort()
+        raise
+    writer.commit()
+    state[name] = {"last_id": max_id}
+    return writer.rows
+
+def _replace_dataset(conn, output_dir: str, name: str, query, partition_column: Optional[str]) -> int:
+    # Built beside the live copy, then swapped in, so readers never see a half-written dataset
+    directory = os.path.join(output_dir, name)
+    staging = directory + ".staging"
+    shutil.rmtree(staging, ignore_errors=True)
+    writer = _PartitionWriter(staging, arrow_schema(query), "part-000.parquet", partition_column)
+    try:
+        _copy_query(conn, query, writer)
+    except BaseException:
+        writer.abort()
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    writer.commit()
+    if os.path.isdir(directory):
+        shutil.rmtree(directory)
+    if os.path.isdir(staging):
+        os.replace(staging, directory)
+    return writer.rows
+
+def _rollup_dataset(conn, output_dir: str, state: dict, full: bool) -> int:
+    """
+    Daily rollups change only on days that receive readings, so months from the
+    last snapshot's newest day onwards are rebuilt and older months are kept.
+    """
+    rollup = models.PatientDailyRollup
+    directory = os.path.join(output_dir, "daily_rollups")
+    since = None if full else state.get("daily_rollups", {}).get("last_day")
+    query = select(*rollup.__table__.columns).order_by(rollup.day, rollup.patient_id)
+    start_month = None
+    if since:
+        start = date.fromisoformat(since).replace(day=1)
+        start_month = start.strftime("%Y-%m")
+        query = query.where(rollup.day >= start)
+
+    staging = directory + ".staging"
+    shutil.rmtree(staging, ignore_errors=True)
+    writer = _PartitionWriter(staging, arrow_schema(query), "part-000.parquet", "day")
+    try:
+        _copy_query(conn, query, writer)
+    except BaseException:
+        writer.abort()
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    writer.commit()
+
+    os.makedirs(directory, exist_ok=True)
+    for month_dir in os.listdir(directory):
+        if start_month is None or month_dir >= f"month={start_month}":
+            shutil.rmtree(os.path.join(directory, month_dir))
+    if os.path.isdir(staging):
+        for month_dir in os.listdir(staging):
+            os.replace(os.path.join(staging, month_dir), os.path.join(directory, month_dir))
+        os.rmdir(staging)
+
+    last_day = conn.execute(select(rollup.day).order_by(rollup.day.desc()).limit(1)).scalar()
+    state["daily_rollups"] = {"last_day": last_day.isoformat() if last_day else since}
+    return writer.rows
+
+def compact(output_dir: str, min_files: int = SNAPSHOT_COMPACT_MIN_FILES) -> int:
+    """
+    Merge the incremental files of each month partition of the append-only
+    datasets once there are at least `min_files` of them, streaming row groups
+    so a partition is never loaded whole. Returns the number of partitions compacted.
+    """
+    _require_pyarrow()
+    compacted = 0
+    for name in APPEND_DATASETS:
+        directory = os.path.join(output_dir, name)
+        if not os.path.isdir(directory):
+            continue
+        for month_dir in sorted(os.listdir(directory)):
+            folder = os.path.join(directory, month_dir)
+            parts = sorted((m.group(1), m.group(2), m.group(0)) for m in map(PART_NAME.match, os.listdir(folder)) if m)
+            if len(parts) < max(min_files, 2):
+                continue
+            target = os.path.join(folder, f"part-{parts[0][0]}-{parts[-1][1]}.parquet")
+            writer = None
+            try:
+                for _, _, filename in parts:
+                    source = pq.ParquetFile(os.path.join(folder, filename))
+                    if writer is None:
+                        writer = pq.ParquetWriter(target + ".tmp", source.schema_arrow, compression=SNAPSHOT_COMPRESSION)
+                    for batch in source.iter_batches():
+                        writer.write_batch(batch)
+            finally:
+                if writer is not None:
+                    writer.close()
+            os.replace(target + ".tmp", target)
+            for _, _, filename in parts:
+                os.remove(os.path.join(folder, filename))
+            compacted += 1
+    return compacted
+
+def snapshot(bind, output_dir: str, full: bool = False, compact_min_files: int = SNAPSHOT_COMPACT_MIN_FILES) -> dict:
+    """
+    Write Parquet snapshots of the core tables and the latest-risk and daily-rollup
+    views under `output_dir`. Append-only tables are extended past their saved
+    high-water marks (everything is rewritten with full=True). Returns rows written per dataset.
+    """
+    _require_pyarrow()
+    os.makedirs(output_dir, exist_ok=True)
+    state_path = os.path.join(output_dir, STATE_FILE)
+    state = {}
+    if os.path.exists(state_path) and not full:
+        with open(state_path) as f:
+            state = json.load(f)
+
+    written = {}
+    with bind.connect() as conn:
+        for name in APPEND_DATASETS:
+            written[name] = _append_dataset(conn, output_dir, name, state, full)
+        for name, (query, partition_column) in _full_datasets().items():
+            written[name] = _replace_dataset(conn, output_dir, name, query, partition_column)
+        written["daily_rollups"] = _rollup_dataset(conn, output_dir, state, full)
+
+    state["snapshot_at"] = datetime.now().astimezone().isoformat()
+    with open(state_path + ".tmp", "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(state_path + ".tmp", state_path)
+
+    written["compacted_partitions"] = compact(output_dir, compact_min_files) if compact_min_files else 0
+    return written
@@ -4,19 +4,21 @@ import os
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from main import app
-from database import Base, get_db
+from database import Base, get_db, get_read_db, create_engines
+import auth
+import crud
+import schemas
+import risk_engine
 import pytest
 
-# Use in-memory SQLite for testing
+# Use a separate SQLite file for testing
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+engine, read_engine = create_engines(SQLALCHEMY_DATABASE_URL)
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+TestingReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
 
 def override_get_db():
     try:
@@ -25,13 +27,24 @@ def override_get_db():
     finally:
         db.close()
 
+def override_get_read_db():
+    try:
+        db = TestingReadSessionLocal()
+        yield db
+    finally:
+        db.close()
+
 app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_read_db] = override_get_read_db
 
 client = TestClient(app)
 
 @pytest.fixture(autouse=True)
 def setup_db():
     Base.metadata.create_all(bind=engine)
+    crud.dashboard_cache.clear()
+    auth.user_cache.clear()
+    auth.token_cache.clear()
     yield
     Base.metadata.drop_all(bind=engine)
 
@@ -93,6 +106,68 @@ def test_user_auth_flow():
     assert response.status_code == 200
     assert response.json()["username"] == "doctor1"
 
+def test_auth_cache(auth_headers):
+    # 1. Repeated requests resolve the user from memory
+    client.get("/users/me", headers=auth_headers)
+    before = client.get("/system/auth-cache", headers=auth_headers).json()
+    response = client.get("/users/me", headers=auth_headers)
+    assert response.status_code == 200
+    after = client.get("/system/auth-cache", headers=auth_headers).json()
+    assert after["users"]["hits"] >= before["users"]["hits"] + 2
+    assert after["tokens"]["hits"] >= before["tokens"]["hits"] + 2
+    assert after["users"]["misses"] == before["users"]["misses"]
+    
+    # 2. Changing the user through the ORM invalidates the cached copy
+    import models
+    db = TestingSessionLocal()
+    try:
+        user = db.query(models.User).filter(models.User.username == "testuser").first()
+        user.full_name = "Renamed User"
+        # Only the commit drops the cached copy; a flushed change may still roll back
+        db.flush()
+        assert auth.user_cache.get("testuser")["full_name"] != "Renamed User"
+        db.commit()
+    finally:
+        db.close()
+    assert client.get("/users/me", headers=auth_headers).json()["full_name"] == "Renamed User"
+    
+    # 3. Deleted users are no longer accepted
+    db = TestingSessionLocal()
+    try:
+        db.delete(db.query(models.User).filter(models.User.username == "testuser").first())
+        db.commit()
+    finally:
+        db.close()
+    assert client.get("/users/me", headers=auth_headers).status_code == 401
+
+def test_login_rehashes_outdated_password(monkeypatch):
+    import models
+    import hashing
+    # 1. Hash in a thread pool so the patched context is visible to the workers
+    monkeypatch.setattr(auth, "HASH_POOL_KIND", "thread")
+    auth.shutdown_hash_pool()
+    monkeypatch.setattr(hashing, "pwd_context", hashing.build_context(rounds=1000))
+    client.post("/users/", json={"username": "rehash", "password": "secret", "full_name": "Rehash User"})
+
+    # 2. Raising the rounds upgrades the stored hash on the next successful login
+    monkeypatch.setattr(hashing, "pwd_context", hashing.build_context(rounds=2000))
+    response = client.post("/token", data={"username": "rehash", "password": "secret"})
+    assert response.status_code == 200
+    db = TestingSessionLocal()
+    try:
+        stored = db.query(models.User).filter(models.User.username == "rehash").first().hashed_password
+    finally:
+        db.close()
+    assert "rounds=2000$" in stored
+    assert client.post("/token", data={"username": "rehash", "password": "wrong"}).status_code == 401
+    assert client.post("/token", data={"username": "rehash", "password": "secret"}).status_code == 200
+
+    # 3. Logins beyond the pending limit are shed instead of queued
+    monkeypatch.setattr(auth, "HASH_MAX_PENDING", 0)
+    response = client.post("/token", data={"username": "rehash", "password": "secret"})
+    assert response.status_code == 503
+    auth.shutdown_hash_pool()
+
 # --- Patient Endpoints ---
 def test_patient_operations(auth_headers):
     # 1. Create
@@ -107,7 +182,7 @@ def test_patient_operations(auth_headers):
     # 2. Read List
     response = client.get("/patients/", headers=auth_headers)
     assert response.status_code == 200
-    assert len(response.json()) >= 1
+    assert len(response.json()["items"]) >= 1
     
     # 3. Read Detail
     response = client.get(f"/patients/{patient_id}", headers=auth_headers)
@@ -156,9 +231,277 @@ def test_indicators_and_trends(auth_headers):
     # 4. Trend for patient with no data (Edge Case)
     response = client.get("/patients/999/trend", headers=auth_headers)
     assert response.status_code == 404
+    
+    # 5. Rollups maintained on ingest match a backfill from raw readings
+    import models
+    db = TestingSessionLocal()
+    try:
+        columns = lambda r: (r.patient_id, r.day, r.reading_count, r.sum_sbp, r.min_sbp, r.max_sbp, r.max_glucose)
+        maintained = [columns(r) for r in db.query(models.PatientDailyRollup).all()]
+        assert maintained[0][2:6] == (3, 390, 120, 140)
+        crud.backfill_daily_rollups(db)
+        assert [columns(r) for r in db.query(models.PatientDailyRollup).all()] == maintained
+    finally:
+        db.close()
+
+def test_running_trend_statistics(auth_headers):
+    import numpy as np
+    import models
+    import trend
+    from datetime import datetime, timedelta
+    patient_id = client.post("/patients/", json={"name": "Running Stats", "age": 64, "gender": "Male"}, headers=auth_headers).json()["id"]
+    readings = [(128, 82, 6.0), (134, 84, 6.2), (139, 86, 6.5), (143, 87, 6.9)]
+    
+    # 1. Too few readings to fit a slope: status follows the risk level (Low -> Improving)
+    client.post("/indicators/", json={"patient_id": patient_id, "blood_pressure_sys": 128, "blood_pressure_dia": 82, "glucose": 6.0}, headers=auth_headers)
+    assert client.get(f"/patients/{patient_id}/trend", headers=auth_headers).json()["status"] == "Improving"
+    
+    # 2. Rising readings read as deteriorating, though the latest level is only Med
+    for sbp, dbp, glucose in readings[1:3]:
+        client.post("/indicators/", json={"patient_id": patient_id, "blood_pressure_sys": sbp, "blood_pressure_dia": dbp, "glucose": glucose}, headers=auth_headers)
+    client.post("/indicators/batch", json=[{"patient_id": patient_id, "blood_pressure_sys": 143, "blood_pressure_dia": 87, "glucose": 6.9}], headers=auth_headers)
+    data = client.get(f"/patients/{patient_id}/trend", headers=auth_headers).json()
+    assert data["status"] == "Deteriorating"
+    assert data["total_readings"] == 4 and data["slope_sbp"] > 0
+    assert data["std_sbp"] == round(float(np.std([r[0] for r in readings], ddof=1)), 2)
+    
+    db = TestingSessionLocal()
+    try:
+        # 3. Welford mean over every reading
+        state = crud.get_patient_state(db, patient_id)
+        assert state.mean_sbp == pytest.approx(np.mean([r[0] for r in readings]))
+        assert state.mean_glucose == pytest.approx(np.mean([r[2] for r in readings]))
+        
+        # 4. Rebuilding from history replays the same arithmetic
+        maintained = {column: getattr(state, column) for column in trend.STAT_COLUMNS}
+        crud.rebuild_patient_states(db)
+        db.expire_all()
+        state = crud.get_patient_state(db, patient_id)
+        assert {column: getattr(state, column) for column in trend.STAT_COLUMNS} == maintained
+    finally:
+        db.close()
+    
+    # 5. The batch fold matches folding one reading at a time
+    start = datetime(2026, 1, 1)
+    times = [start + timedelta(days=d, minutes=7 * d) for d in range(6)]
+    stats = None
+    falling = readings[::-1] + [(124, 80, 5.8), (120, 78, 5.6)]
+    for at, (sbp, dbp, glucose) in zip(times, falling):
+        stats = trend.fold(stats, at, sbp, dbp, glucose)
+    t = np.array([trend.days(at) for at in times])
+    columns = np.array(falling, dtype=np.float64).T
+    batch = trend.fold_sorted(t, dict(zip(trend.METRICS, columns)), np.array([6]))
+    assert {column: batch[column][0] for column in trend.STAT_COLUMNS} == stats
+    assert trend.status(stats, "Med") == "Improving"
+
+def test_indicator_batch_upload(auth_headers):
+    patient_ids = []
+    for name in ("Batch A", "Batch B"):
+        resp = client.post("/patients/", json={"name": name, "age": 60, "gender": "Male"}, headers=auth_headers)
+        patient_ids.append(resp.json()["id"])
+    
+    # 1. An existing pending follow-up should be completed by the batch
+    client.post("/indicators/", json={
+        "patient_id": patient_ids[0],
+        "blood_pressure_sys": 120,
+        "blood_pressure_dia": 80,
+        "glucose": 5.0
+    }, headers=auth_headers)
+    
+    # 2. Upload several readings for both patients at once
+    readings = [
+        {"patient_id": patient_ids[0], "blood_pressure_sys": 150, "blood_pressure_dia": 85, "glucose": 6.0},
+        {"patient_id": patient_ids[1], "blood_pressure_sys": 118, "blood_pressure_dia": 75, "glucose": 5.2},
+        {"patient_id": patient_ids[0], "blood_pressure_sys": 165, "blood_pressure_dia": 90, "glucose": 6.5},
+    ]
+    response = client.post("/indicators/batch", json=readings, headers=auth_headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["count"] == 3
+    assert [item["risk_level"] for item in data["items"]] == ["Med", "Low", "High"]
+    assert [item["index"] for item in data["items"]] == [0, 1, 2]
+    assert len({item["id"] for item in data["items"]}) == 3
+    
+    # 3. Only the last follow-up per patient stays pending
+    detail = client.get(f"/patients/{patient_ids[0]}", headers=auth_headers).json()
+    assert len(detail["indicators"]) == 3
+    assert len(detail["assessments"]) == 3
+    pending = [f for f in detail["follow_ups"] if f["status"] == "Pending"]
+    assert len(pending) == 1
+    assert pending[0]["task_description"].startswith("Urgent")
+    
+    # 4. Empty batch (Edge Case)
+    response = client.post("/indicators/batch", json=[], headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json()["count"] == 0
+
+def test_patient_state_maintained_on_write(auth_headers):
+    patient_id = client.post(
+        "/patients/",
+        json={"name": "State Test", "age": 70, "gender": "Female"},
+        headers=auth_headers
+    ).json()["id"]
+    
+    client.post("/indicators/", json={
+        "patient_id": patient_id,
+        "blood_pressure_sys": 170,
+        "blood_pressure_dia": 95,
+        "glucose": 6.0
+    }, headers=auth_headers)
+    client.post("/indicators/batch", json=[{
+        "patient_id": patient_id,
+        "blood_pressure_sys": 145,
+        "blood_pressure_dia": 85,
+        "glucose": 6.2
+    }], headers=auth_headers)
+    
+    db = TestingSessionLocal()
+    try:
+        state = crud.get_patient_state(db, patient_id)
+        assert state.risk_level == "Med"
+        assert state.last_sbp == 145
+        assert state.next_follow_up_due is not None
+        
+        # Rebuilding from history reproduces the maintained state
+        expected = (state.risk_level, state.last_sbp, state.last_dbp, state.last_glucose, state.next_follow_up_due)
+        assert crud.rebuild_patient_states(db) == 1
+        db.expire_all()
+        state = crud.get_patient_state(db, patient_id)
+        assert (state.risk_level, state.last_sbp, state.last_dbp, state.last_glucose, state.next_follow_up_due) == expected
+    finally:
+        db.close()
+    
+    # Completing the last pending follow-up clears the next due date
+    pending = [f for f in client.get(f"/patients/{patient_id}", headers=auth_headers).json()["follow_ups"] if f["status"] == "Pending"]
+    client.patch(f"/followups/{pending[0]['id']}", json={"status": "Completed"}, headers=auth_headers)
+    db = TestingSessionLocal()
+    try:
+        assert crud.get_patient_state(db, patient_id).next_follow_up_due is None
+    finally:
+        db.close()
+    
+    dashboard = client.get("/dashboard/", headers=auth_headers).json()
+    assert dashboard["risk_distribution"]["medium"] == 1
+
+def test_patient_detail_windows(auth_headers):
+    patient_id = client.post(
+        "/patients/",
+        json={"name": "Long History", "age": 77, "gender": "Male"},
+        headers=auth_headers
+    ).json()["id"]
+    client.post("/indicators/batch", json=[
+        {"patient_id": patient_id, "blood_pressure_sys": 110 + i, "blood_pressure_dia": 70, "glucose": 5.0}
+        for i in range(6)
+    ], headers=auth_headers)
+    
+    # 1. Most recent N per collection, oldest first
+    detail = client.get(f"/patients/{patient_id}", params={"limit": 2}, headers=auth_headers).json()
+    assert [i["blood_pressure_sys"] for i in detail["indicators"]] == [114, 115]
+    assert len(detail["assessments"]) == 2
+    assert len(detail["follow_ups"]) == 2
+    
+    # 2. Excluded collections come back empty
+    detail = client.get(
+        f"/patients/{patient_id}",
+        params={"include_indicators": False, "include_follow_ups": False},
+        headers=auth_headers
+    ).json()
+    assert detail["indicators"] == [] and detail["follow_ups"] == []
+    assert len(detail["assessments"]) == 6
+    
+    # 3. A window starting in the future is empty
+    detail = client.get(
+        f"/patients/{patient_id}",
+        params={"since": "2999-01-01T00:00:00Z"},
+        headers=auth_headers
+    ).json()
+    assert detail["indicators"] == [] and detail["name"] == "Long History"
+
+# --- Risk Engine ---
+def test_fast_path_matches_schemas(auth_headers):
+    from dataclasses import fields
+    # 1. Records carry the schema's fields in the schema's order
+    pairs = [
+        (schemas.PatientRecord, schemas.Patient),
+        (schemas.HealthIndicatorRecord, schemas.HealthIndicator),
+        (schemas.RiskAssessmentRecord, schemas.RiskAssessment),
+        (schemas.FollowUpRecord, schemas.FollowUp),
+        (schemas.PatientDetailRecord, schemas.PatientDetail),
+    ]
+    for record, schema in pairs:
+        assert [f.name for f in fields(record)] == list(schema.model_fields)
+    
+    # 2. Responses are byte-identical to validating and dumping through the schemas
+    patient_id = client.post("/patients/", json={"name": "Fast Path", "age": 61, "gender": "Female"}, headers=auth_headers).json()["id"]
+    client.post("/indicators/batch", json=[
+        {"patient_id": patient_id, "blood_pressure_sys": 150, "blood_pressure_dia": 95, "glucose": 7.25}
+        for _ in range(2)
+    ], headers=auth_headers)
+    for path, schema in (
+        (f"/patients/{patient_id}", schemas.PatientDetail),
+        ("/patients/?limit=5", schemas.PatientPage),
+        ("/followups/?limit=5", schemas.FollowUpGroupPage),
+    ):
+        response = client.get(path, headers=auth_headers)
+        assert response.status_code == 200
+        assert response.content == schema.model_validate_json(response.content).model_dump_json().encode()
+
+def test_vectorized_risk_levels_match_scalar():
+    import array
+    import itertools
+    import numpy as np
+    
+    sbp = [120, 139, 140, 159, 160]
+    dbp = [80, 89, 90, 99, 100]
+    glucose = [5.0, 6.99, 7.0, 11.0, 11.09, 11.1, 15.0]
+    combos = list(itertools.product(sbp, dbp, glucose))
+    
+    # Buffer-protocol columns are accepted as well as NumPy arrays
+    codes = risk_engine.calculate_risk_levels(
+        array.array("i", [c[0] for c in combos]),
+        array.array("i", [c[1] for c in combos]),
+        np.array([c[2] for c in combos])
+    )
+    assert codes.dtype == np.int8
+    expected = [risk_engine.calculate_risk_level(*c) for c in combos]
+    assert [risk_engine.RISK_LEVELS[c] for c in codes] == expected
+    
+    # Batched follow-up tasks agree with the scalar generator
+    due_dates, descriptions = risk_engine.generate_follow_up_tasks(np.array([0, 1, 2], dtype=np.int8))
+    for code, due, description in zip(range(3), due_dates.astype(object), descriptions):
+        task = risk_engine.generate_follow_up_task(1, risk_engine.RISK_LEVELS[code])
+        assert description == task.task_description
+        assert abs(due - task.due_date.replace(tzinfo=None)).total_seconds() < 5
 
 # --- Follow-up Endpoints ---
+def test_generate_data_is_deterministic(tmp_path):
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    import generate_data
+    from datetime import datetime
+    from sqlalchemy import create_engine, text
+    end = datetime(2026, 1, 1)
+    dumps = []
+    for workers in (0, 2):
+        url = f"sqlite:///{tmp_path / f'generated_{workers}.db'}"
+        summary = generate_data.generate(url, patients=25, readings_per_patient=6, days=60, seed=3, workers=workers, chunk_size=10, end=end, verbose=False)
+        assert summary["patients"] == 25
+        assert summary["indicators"] == summary["assessments"] == summary["follow_ups"]
+        gen_engine = create_engine(url)
+        with gen_engine.connect() as conn:
+            # One pending follow-up per patient, derived tables consistent with the readings
+            assert conn.execute(text("SELECT COUNT(*) FROM follow_ups WHERE status = 'Pending'")).scalar() == 25
+            assert conn.execute(text("SELECT COUNT(*) FROM patient_states")).scalar() == 25
+            assert conn.execute(text("SELECT SUM(reading_count) FROM patient_daily_rollups")).scalar() == summary["indicators"]
+            dumps.append([
+                conn.execute(text(f"SELECT * FROM {table} ORDER BY 1")).fetchall()
+                for table in ("patients", "health_indicators", "follow_ups", "patient_states")
+            ])
+        gen_engine.dispose()
+    # Same seed, same database, with or without worker processes
+    assert dumps[0] == dumps[1]
+
 def test_followup_logic(auth_headers):
+    from datetime import datetime, timedelta
     # 1. Create patient and trigger high risk follow-up
     create_resp = client.post(
         "/patients/",
@@ -167,18 +510,21 @@ def test_followup_logic(auth_headers):
     )
     patient_id = create_resp.json()["id"]
     
-    client.post("/indicators/", json={
+    reading = client.post("/indicators/", json={
         "patient_id": patient_id,
         "blood_pressure_sys": 170,
         "blood_pressure_dia": 105,
         "glucose": 12.0
-    }, headers=auth_headers)
+    }, headers=auth_headers).json()
     
-    # 2. Check grouped follow-ups
+    # 2. Check grouped follow-ups, due three days after the reading
     response = client.get("/followups/", headers=auth_headers)
     assert response.status_code == 200
-    groups = response.json()
-    assert any(g["patient"]["id"] == patient_id for g in groups)
+    groups = response.json()["items"]
+    group = next(g for g in groups if g["patient"]["id"] == patient_id)
+    recorded_at = datetime.fromisoformat(reading["recorded_at"]).replace(tzinfo=None)
+    due_date = datetime.fromisoformat(group["followups"][0]["due_date"]).replace(tzinfo=None)
+    assert due_date == recorded_at + timedelta(days=3)
     
     # 3. Add new indicator should complete previous follow-up
     client.post("/indicators/", json={
@@ -202,7 +548,499 @@ def test_followup_logic(auth_headers):
     )
     assert response.status_code == 200
 
+def test_keyset_pagination(auth_headers):
+    patient_ids = []
+    for i in range(5):
+        resp = client.post("/patients/", json={"name": f"Paged {i}", "age": 30 + i, "gender": "F"}, headers=auth_headers)
+        patient_ids.append(resp.json()["id"])
+    client.post("/indicators/batch", json=[
+        {"patient_id": pid, "blood_pressure_sys": 120 + 20 * (n % 3), "blood_pressure_dia": 80, "glucose": 5.0}
+        for n, pid in enumerate(patient_ids)
+    ], headers=auth_headers)
+    
+    # 1. Walk patients two at a time
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        page = client.get("/patients/", params=params, headers=auth_headers).json()
+        seen.extend(p["id"] for p in page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == sorted(patient_ids)
+    
+    # 2. Walk pending follow-ups in (due_date, id) order
+    due, cursor = [], None
+    while True:
+        params = {"status": "Pending", "limit": 2, **({"cursor": cursor} if cursor else {})}
+        page = client.get("/followups/", params=params, headers=auth_headers).json()
+        due.extend((f["due_date"], f["id"]) for g in page["items"] for f in g["followups"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert len(due) == 5
+    assert due == sorted(due)
+    
+    # 3. Tampered cursor (Edge Case)
+    response = client.get("/patients/", params={"cursor": "not-a-cursor"}, headers=auth_headers)
+    assert response.status_code == 400
+    # Ids too wide for SQLite are rejected before the query runs
+    response = client.get("/patients/", params={"cursor": crud.encode_cursor(10**30)}, headers=auth_headers)
+    assert response.status_code == 400
+    response = client.get("/followups/", params={"cursor": crud.encode_cursor("2024-01-01T00:00:00", -10**30)}, headers=auth_headers)
+    assert response.status_code == 400
+
+def test_grouped_follow_ups_single_query(auth_headers):
+    from sqlalchemy import event
+    
+    patient_ids = []
+    for i in range(4):
+        resp = client.post("/patients/", json={"name": f"Worklist {i}", "age": 50, "gender": "M"}, headers=auth_headers)
+        patient_ids.append(resp.json()["id"])
+    client.post("/indicators/batch", json=[
+        {"patient_id": pid, "blood_pressure_sys": 170 if n % 2 else 120, "blood_pressure_dia": 80, "glucose": 5.0}
+        for n, pid in enumerate(patient_ids * 3)
+    ], headers=auth_headers)
+    
+    # 1. The worklist is loaded with one statement regardless of patient count
+    statements = []
+    count = lambda conn, cursor, statement, params, context, executemany: statements.append(statement)
+    event.listen(engine, "before_cursor_execute", count)
+    db = TestingSessionLocal()
+    try:
+        groups, _ = crud.get_grouped_follow_ups(db)
+    finally:
+        db.close()
+        event.remove(engine, "before_cursor_execute", count)
+    assert len(statements) == 1
+    assert {g["patient"]["id"] for g in groups} == set(patient_ids)
+    
+    # 2. Per-patient cap
+    page = client.get("/followups/", params={"per_patient_limit": 1}, headers=auth_headers).json()
+    assert all(len(g["followups"]) == 1 for g in page["items"])
+    
+    # 3. Due window: high-risk follow-ups are due within 3 days, the others later
+    from datetime import datetime, timedelta, timezone
+    due_to = (datetime.now(timezone.utc) + timedelta(days=4)).isoformat()
+    page = client.get("/followups/", params={"status": "Pending", "due_to": due_to}, headers=auth_headers).json()
+    assert {g["patient"]["id"] for g in page["items"]} == {patient_ids[1], patient_ids[3]}
+
+# --- Async Mode ---
+def test_async_session_mode(auth_headers):
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+    from sqlalchemy.pool import NullPool
+    
+    # TestClient runs every request on a fresh event loop, so connections are not pooled
+    async_engine = create_async_engine("sqlite+aiosqlite:///./test.db", poolclass=NullPool)
+    AsyncTestingSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+    
+    async def override_get_async_db():
+        async with AsyncTestingSessionLocal() as db:
+            yield db
+    
+    app.dependency_overrides[get_db] = override_get_async_db
+    app.dependency_overrides[get_read_db] = override_get_async_db
+    try:
+        response = client.get("/users/me", headers=auth_headers)
+        assert response.status_code == 200
+        patient_id = client.post(
+            "/patients/",
+            json={"name": "Async Patient", "age": 55, "gender": "Female"},
+            headers=auth_headers
+        ).json()["id"]
+        response = client.post("/indicators/", json={
+            "patient_id": patient_id,
+            "blood_pressure_sys": 150,
+            "blood_pressure_dia": 85,
+            "glucose": 6.0
+        }, headers=auth_headers)
+        assert response.status_code == 200
+        detail = client.get(f"/patients/{patient_id}", headers=auth_headers).json()
+        assert len(detail["assessments"]) == 1
+        assert client.get(f"/patients/{patient_id}/trend", headers=auth_headers).json()["avg_sbp"] == 150.0
+        assert client.get("/dashboard/", headers=auth_headers).json()["risk_distribution"]["medium"] == 1
+    finally:
+        app.dependency_overrides[get_db] = override_get_db
+        app.dependency_overrides[get_read_db] = override_get_read_db
+    
+    # An AsyncSession through database.run sees the same data
+    import asyncio
+    import database
+    
+    async def read_back():
+        async with AsyncTestingSessionLocal() as db:
+            return await database.run(db, crud.get_patient_state, patient_id)
+    
+    assert asyncio.run(read_back()).risk_level == "Med"
+    asyncio.run(async_engine.dispose())
+
+# --- Group Commit ---
+def test_group_commit_queue(auth_headers):
+    from concurrent.futures import ThreadPoolExecutor
+    import main
+    import write_queue
+    
+    patient_ids = [
+        client.post("/patients/", json={"name": f"Queued {i}", "age": 60, "gender": "M"}, headers=auth_headers).json()["id"]
+        for i in range(3)
+    ]
+    group_queue = write_queue.GroupCommitQueue(TestingSessionLocal, max_delay_ms=50, max_batch=100)
+    try:
+        # 1. Concurrent submissions are coalesced into fewer transactions
+        readings = [
+            schemas.HealthIndicatorCreate(
+                patient_id=patient_ids[n % 3], blood_pressure_sys=120 + n, blood_pressure_dia=80, glucose=5.0
+            )
+            for n in range(30)
+        ]
+        with ThreadPoolExecutor(max_workers=10) as pool:
+            results = list(pool.map(lambda r: group_queue.submit(r).result(timeout=10), readings))
+        assert [r["blood_pressure_sys"] for r in results] == [120 + n for n in range(30)]
+        stats = group_queue.stats()
+        assert stats["items"] == 30
+        assert stats["batches"] < 30
+        
+        # 2. The endpoint resolves through the queue when it is enabled
+        main.indicator_queue = group_queue
+        response = client.post("/indicators/", json={
+            "patient_id": patient_ids[0],
+            "blood_pressure_sys": 165,
+            "blood_pressure_dia": 85,
+            "glucose": 6.0
+        }, headers=auth_headers)
+        assert response.status_code == 200
+        assert response.json()["blood_pressure_sys"] == 165
+        assert client.get("/system/write-queue", headers=auth_headers).json()["items"] == 31
+    finally:
+        main.indicator_queue = None
+        group_queue.stop()
+    
+    detail = client.get(f"/patients/{patient_ids[0]}", headers=auth_headers).json()
+    assert len(detail["indicators"]) == 11
+    assert len([f for f in detail["follow_ups"] if f["status"] == "Pending"]) == 1
+
+def test_indicator_outbox(auth_headers, monkeypatch):
+    import time
+    import main
+    import outbox
+    import models
+    
+    patient_id = client.post("/patients/", json={"name": "Outbox", "age": 58, "gender": "F"}, headers=auth_headers).json()["id"]
+    worker = outbox.OutboxWorker(TestingSessionLocal, poll_interval_ms=50, read_session_factory=TestingReadSessionLocal)
+    try:
+        # 1. The endpoint only stores the reading; the worker catches up with the rest
+        main.outbox_worker = worker
+        for sbp in (170, 120, 145):
+            response = client.post("/indicators/", json={
+                "patient_id": patient_id, "blood_pressure_sys": sbp, "blood_pressure_dia": 80, "glucose": 5.0
+            }, headers=auth_headers)
+            assert response.status_code == 200
+        deadline = time.monotonic() + 10
+        while client.get("/system/outbox", headers=auth_headers).json()["pending"] and time.monotonic() < deadline:
+            time.sleep(0.05)
+        stats = client.get("/system/outbox", headers=auth_headers).json()
+        assert stats["pending"] == 0 and stats["processed"] == 3
+    finally:
+        main.outbox_worker = None
+        worker.stop()
+    
+    detail = client.get(f"/patients/{patient_id}", headers=auth_headers).json()
+    assert [a["risk_level"] for a in detail["assessments"]] == ["High", "Low", "Med"]
+    assert [a["assessment_date"] for a in detail["assessments"]] == [i["recorded_at"] for i in detail["indicators"]]
+    pending = [f for f in detail["follow_ups"] if f["status"] == "Pending"]
+    assert len(detail["follow_ups"]) == 3 and len(pending) == 1
+    assert pending[0]["task_description"] == risk_engine.FOLLOW_UP_DESCRIPTIONS[risk_engine.RISK_MED]
+    db = TestingSessionLocal()
+    try:
+        assert crud.get_patient_state(db, patient_id).risk_level == "Med"
+        
+        # 2. Replaying processed entries is a no-op
+        assert crud.process_indicator_outbox(db, [1, 2, 3]) == []
+        
+        # 3. A failing entry is retried alone and parked after max_attempts; its neighbours go through
+        bad = crud.create_patient_indicator_deferred(db, schemas.HealthIndicatorCreate(
+            patient_id=patient_id, blood_pressure_sys=999, blood_pressure_dia=80, glucose=5.0
+        ))
+        crud.create_patient_indicator_deferred(db, schemas.HealthIndicatorCreate(
+            patient_id=patient_id, blood_pressure_sys=125, blood_pressure_dia=80, glucose=5.0
+        ))
+        apply_readings = crud._apply_readings
+        def failing(db, indicators, *args):
+            if any(i.blood_pressure_sys == 999 for i in indicators):
+                raise ValueError("bad reading")
+            return apply_readings(db, indicators, *args)
+        monkeypatch.setattr(crud, "_apply_readings", failing)
+        db.rollback()  # hand the single writer connection to the worker
+        assert outbox.OutboxWorker(TestingSessionLocal, max_attempts=1).run_once() == 1
+        entry = db.query(models.IndicatorOutbox).filter(models.IndicatorOutbox.indicator_id == bad.id).one()
+        assert entry.attempts == 1 and entry.failed_at is not None and "bad reading" in entry.last_error
+        assert crud.get_outbox_backlog(db)["failed"] == 1
+        assert crud.due_outbox_ids(db) == []
+    finally:
+        db.close()
+
+def test_rescore_job(auth_headers, monkeypatch):
+    import models
+    import rescore
+    from sqlalchemy import func
+    patient_id = client.post("/patients/", json={"name": "Rescore", "age": 70, "gender": "M"}, headers=auth_headers).json()["id"]
+    client.post("/indicators/batch", json=[
+        {"patient_id": patient_id, "blood_pressure_sys": 120 + 5 * n, "blood_pressure_dia": 80, "glucose": 5.0}
+        for n in range(12)
+    ], headers=auth_headers)
+    
+    def versions(db):
+        return dict(db.query(models.RiskAssessment.rule_version, func.count()).group_by(models.RiskAssessment.rule_version).all())
+    
+    db = TestingSessionLocal()
+    try:
+        # 1. Ingest tags assessments with the current rule version, so re-scoring it finds nothing to do
+        assert versions(db) == {risk_engine.RULE_VERSION: 12}
+        db.rollback()
+        assert rescore.rescore(engine, workers=0)["rows"] == 0
+        
+        # 2. An interrupted run keeps its committed chunks and resumes from the checkpoint
+        def interrupt(progress):
+            raise KeyboardInterrupt
+        with pytest.raises(KeyboardInterrupt):
+            rescore.rescore(engine, rule_version=99, chunk_size=5, workers=0, progress=interrupt)
+        assert versions(db)[99] == 5
+        db.rollback()
+        summary = rescore.rescore(engine, rule_version=99, chunk_size=5, workers=1)
+        assert summary["rows"] == 7 and summary["resumed_from"] > 0
+        assert versions(db)[99] == 12
+        checkpoint = db.get(models.RescoreCheckpoint, 99)
+        assert checkpoint.rows_scored == 12 and checkpoint.completed_at is not None
+        
+        # 3. A repeated run writes no duplicates, even from scratch
+        db.rollback()
+        assert rescore.rescore(engine, rule_version=99, workers=0, restart=True)["rows"] == 0
+        assert versions(db)[99] == 12
+        
+        # 4. A run that dies in the state rebuild is not completed, and the next run rebuilds
+        db.rollback()
+        rebuild = crud.rebuild_patient_states
+        def failing_rebuild(session):
+            raise RuntimeError("rebuild interrupted")
+        monkeypatch.setattr(crud, "rebuild_patient_states", failing_rebuild)
+        with pytest.raises(RuntimeError):
+            rescore.rescore(engine, rule_version=100, workers=0)
+        assert db.get(models.RescoreCheckpoint, 100).completed_at is None
+        db.rollback()
+        monkeypatch.setattr(crud, "rebuild_patient_states", rebuild)
+        summary = rescore.rescore(engine, rule_version=100, workers=0)
+        assert summary["rows"] == 0 and summary["patients_refreshed"] == 1
+        assert db.get(models.RescoreCheckpoint, 100).completed_at is not None
+    finally:
+        db.close()
+    
+    # 5. The re-scored assessments are the patient's latest, with the same levels as on ingest
+    detail = client.get(f"/patients/{patient_id}", headers=auth_headers).json()
+    assert detail["assessments"][-1]["rule_version"] == 100
+    assert client.get("/dashboard/", headers=auth_headers).json()["counts"]["high_risk_patients"] == 1
+
+def test_migration_adds_missing_columns(tmp_path):
+    import migrations
+    from sqlalchemy import create_engine, inspect, text
+    legacy = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with legacy.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE risk_assessments (id INTEGER PRIMARY KEY, patient_id INTEGER, "
+            "risk_level VARCHAR, assessment_date DATETIME, notes VARCHAR)"
+        ))
+    created = migrations.upgrade(legacy)
+    assert {"risk_assessments.indicator_id", "risk_assessments.rule_version"} <= set(created)
+    assert "ix_risk_assessments_indicator_id_rule_version" in created
+    assert {c["name"] for c in inspect(legacy).get_columns("risk_assessments")} >= {"indicator_id", "rule_version"}
+    assert migrations.upgrade(legacy) == []
+    legacy.dispose()
+
+def _legacy_database(tmp_path):
+    # A database from before the derived tables, holding one high-risk reading
+    import migrations, models
+    from sqlalchemy import create_engine
+    legacy = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    migrations.upgrade(legacy)
+    db = sessionmaker(bind=legacy)()
+    try:
+        patient = crud.create_patient(db, schemas.PatientCreate(name="Legacy Patient", age=70, gender="Female"))
+        crud.create_patient_indicator(db, schemas.HealthIndicatorCreate(
+            patient_id=patient.id, blood_pressure_sys=185, blood_pressure_dia=115, glucose=12.0
+        ))
+    finally:
+        db.close()
+    with legacy.begin() as conn:
+        models.PatientState.__table__.drop(conn)
+        models.PatientDailyRollup.__table__.drop(conn)
+    return legacy
+
+def test_migration_fills_new_state_table(tmp_path):
+    import migrations, models
+    legacy = _legacy_database(tmp_path)
+    migrations.upgrade(legacy)
+    db = sessionmaker(bind=legacy)()
+    try:
+        state = db.query(models.PatientState).one()
+        assert state.risk_level == "High"
+        assert crud._build_dashboard_info(db)["counts"]["high_risk_patients"] == 1
+    finally:
+        db.close()
+    legacy.dispose()
+
+def test_migration_backfills_new_rollup_table(tmp_path):
+    import migrations, models
+    legacy = _legacy_database(tmp_path)
+    migrations.upgrade(legacy)
+    db = sessionmaker(bind=legacy)()
+    try:
+        rollup = db.query(models.PatientDailyRollup).one()
+        assert rollup.reading_count == 1 and rollup.max_sbp == 185
+        assert crud.get_patient_trend(db, rollup.patient_id) is not None
+    finally:
+        db.close()
+    legacy.dispose()
+
+def test_migration_rebuilds_new_trend_statistics(tmp_path):
+    import migrations, models, trend
+    from sqlalchemy import text
+    legacy = _legacy_database(tmp_path)
+    migrations.upgrade(legacy)
+    with legacy.begin() as conn:
+        for column in trend.STAT_COLUMNS:
+            conn.execute(text(f"ALTER TABLE patient_states DROP COLUMN {column}"))
+    created = migrations.upgrade(legacy)
+    assert "patient_states.reading_count" in created
+    db = sessionmaker(bind=legacy)()
+    try:
+        state = db.query(models.PatientState).one()
+        assert state.reading_count == 1 and state.mean_sbp == 185
+    finally:
+        db.close()
+    legacy.dispose()
+
+# --- Connection Layer ---
+def test_reader_writer_split(auth_headers):
+    from sqlalchemy import text
+    from sqlalchemy.exc import OperationalError
+    
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert conn.execute(text("PRAGMA busy_timeout")).scalar() == 5000
+    
+    # Reader connections refuse writes
+    with read_engine.connect() as conn:
+        assert conn.execute(text("PRAGMA query_only")).scalar() == 1
+        with pytest.raises(OperationalError):
+            conn.execute(text("DELETE FROM patients"))
+    
+    stats = client.get("/system/db-pool", headers=auth_headers).json()
+    assert stats["writer"]["size"] == 1
+    assert stats["reader"]["size"] >= 1
+    assert stats["pragmas"]["journal_mode"] == "WAL"
+
 # --- Dashboard Endpoint ---
+def test_streaming_export(auth_headers, tmp_path, monkeypatch):
+    import csv
+    import json
+    import export
+    import database
+    # The endpoint streams from the reader engine, not a request session
+    monkeypatch.setattr(database, "read_engine", read_engine)
+    patient_id = client.post("/patients/", json={"name": "Export Test", "age": 50, "gender": "Male"}, headers=auth_headers).json()["id"]
+    items = client.post("/indicators/batch", json=[
+        {"patient_id": patient_id, "blood_pressure_sys": 120 + n, "blood_pressure_dia": 80, "glucose": 5.5}
+        for n in range(3)
+    ], headers=auth_headers).json()["items"]
+    
+    # 1. CSV with a header row, in id order
+    response = client.get("/export/health_indicators", headers=auth_headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    rows = list(csv.reader(response.text.splitlines()))
+    assert rows[0] == export.export_columns("health_indicators")
+    assert [int(r[0]) for r in rows[1:]] == [item["id"] for item in items]
+    
+    # 2. NDJSON after an id watermark
+    response = client.get(f"/export/health_indicators?format=ndjson&since_id={items[0]['id']}", headers=auth_headers)
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["blood_pressure_sys"] for line in lines] == [121, 122]
+    
+    # 3. Bad requests
+    assert client.get("/export/follow_ups?since=2024-01-01T00:00:00", headers=auth_headers).status_code == 400
+    assert client.get("/export/users", headers=auth_headers).status_code == 404
+    
+    # 4. Incremental file exports append only new rows
+    path = str(tmp_path / "follow_ups.csv")
+    count, last_id = export.write_export(engine, "follow_ups", "csv", path)
+    assert count == 3
+    client.post("/indicators/", json={"patient_id": patient_id, "blood_pressure_sys": 165, "blood_pressure_dia": 90, "glucose": 6.0}, headers=auth_headers)
+    count, _ = export.write_export(engine, "follow_ups", "csv", path, since_id=last_id, append=True)
+    assert count == 1
+    with open(path) as f:
+        assert len(list(csv.reader(f))) == 1 + 4
+
+def test_parquet_snapshots(auth_headers, tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    import snapshot
+    output_dir = str(tmp_path / "parquet")
+    patient_id = client.post("/patients/", json={"name": "Snapshot Test", "age": 61, "gender": "Female"}, headers=auth_headers).json()["id"]
+    reading = {"patient_id": patient_id, "blood_pressure_sys": 150, "blood_pressure_dia": 85, "glucose": 6.0}
+    client.post("/indicators/batch", json=[reading] * 3, headers=auth_headers)
+    
+    # 1. First run writes everything, including the derived views
+    written = snapshot.snapshot(engine, output_dir, compact_min_files=0)
+    assert written["health_indicators"] == 3
+    assert written["latest_risk"] == 1
+    assert written["daily_rollups"] == 1
+    latest = pq.read_table(os.path.join(output_dir, "latest_risk")).to_pylist()
+    assert latest[0]["risk_level"] == "Med"
+    
+    # 2. Later runs only append rows past the high-water mark
+    client.post("/indicators/", json=reading, headers=auth_headers)
+    written = snapshot.snapshot(engine, output_dir, compact_min_files=0)
+    assert written["health_indicators"] == 1
+    assert written["patients"] == 1
+    indicators = pq.read_table(os.path.join(output_dir, "health_indicators"))
+    assert indicators.num_rows == 4
+    
+    # 3. Compaction merges each month's files without losing rows
+    assert snapshot.compact(output_dir, min_files=2) == 2  # one month each of readings and assessments
+    month_dirs = os.listdir(os.path.join(output_dir, "health_indicators"))
+    assert all(len(os.listdir(os.path.join(output_dir, "health_indicators", m))) == 1 for m in month_dirs)
+    assert sorted(pq.read_table(os.path.join(output_dir, "health_indicators")).column("id").to_pylist()) == sorted(indicators.column("id").to_pylist())
+
+def test_profiling_middleware(monkeypatch, caplog):
+    import logging
+    import profiling
+    from fastapi import FastAPI, Depends
+    from sqlalchemy.orm import Session
+    profiled_app = FastAPI()
+    profiling.install(profiled_app, engines=[engine, read_engine])
+    profiling.metrics.clear()
+
+    @profiled_app.get("/probe/{patient_id}")
+    def probe(patient_id: int, db: Session = Depends(override_get_read_db)):
+        return {"found": crud.get_patient_detail(db, patient_id) is not None}
+
+    profiled_client = TestClient(profiled_app)
+    
+    # 1. SQL made from the threadpool is counted against the request
+    response = profiled_client.get("/probe/1")
+    assert response.status_code == 200
+    timing = response.headers["server-timing"]
+    assert timing.startswith("app;dur=") and 'desc="1 queries"' in timing
+    
+    # 2. Metrics are labelled by route template
+    body = profiled_client.get("/metrics").text
+    assert 'http_request_duration_seconds_count{method="GET",route="/probe/{patient_id}",status="200"} 1' in body
+    assert 'http_request_sql_statements_sum{method="GET",route="/probe/{patient_id}",status="200"} 1' in body
+    
+    # 3. Slow statements are logged with their query plan
+    monkeypatch.setattr(profiling, "SLOW_QUERY_MS", 0)
+    with caplog.at_level(logging.WARNING, logger="profiling"):
+        profiled_client.get("/probe/1")
+    assert any("Slow SQL statement" in r.getMessage() and "plan: SEARCH patients" in r.getMessage() for r in caplog.records)
+
 def test_dashboard_data(auth_headers):
     # 1. Create some diverse data
     client.post("/patients/", json={"name": "Young", "age": 20, "gender": "M"}, headers=auth_headers)
@@ -215,3 +1053,141 @@ def test_dashboard_data(auth_headers):
     assert data["counts"]["total_patients"] >= 2
     assert len(data["age_distribution"]) >= 1
     assert "risk_distribution" in data
+
+def test_dashboard_cache_invalidated_on_write(auth_headers):
+    client.post("/patients/", json={"name": "Cached", "age": 40, "gender": "F"}, headers=auth_headers)
+    
+    # 1. Second read is served from the cache
+    before = client.get("/system/dashboard-cache", headers=auth_headers).json()
+    first = client.get("/dashboard/", headers=auth_headers).json()
+    second = client.get("/dashboard/", headers=auth_headers).json()
+    assert first == second
+    stats = client.get("/system/dashboard-cache", headers=auth_headers).json()
+    assert stats["hits"] == before["hits"] + 1
+    assert stats["rebuilds"] == before["rebuilds"] + 1
+    
+    # 2. A committed write invalidates the cached result
+    client.post("/patients/", json={"name": "Cached Too", "age": 41, "gender": "M"}, headers=auth_headers)
+    third = client.get("/dashboard/", headers=auth_headers).json()
+    assert third["counts"]["total_patients"] == first["counts"]["total_patients"] + 1
+
+def test_archive_spans_tiers(auth_headers, monkeypatch, tmp_path):
+    import models
+    import archive
+    from datetime import datetime, timedelta, timezone
+    from sqlalchemy import update
+    monkeypatch.setattr(archive, "ARCHIVE_DATABASE_PATH", str(tmp_path / "archive.db"))
+    patient_id = client.post("/patients/", json={"name": "Archive", "age": 66, "gender": "F"}, headers=auth_headers).json()["id"]
+    client.post("/indicators/batch", json=[
+        {"patient_id": patient_id, "blood_pressure_sys": 150 + n, "blood_pressure_dia": 95, "glucose": 8.0}
+        for n in range(6)
+    ], headers=auth_headers)
+    
+    # 1. Age the first four readings, their assessments and the follow-ups by 400 days
+    old = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=400)
+    db = TestingSessionLocal()
+    try:
+        first_ids = [i for (i,) in db.query(models.HealthIndicator.id).order_by(models.HealthIndicator.id).limit(4)]
+        db.execute(update(models.HealthIndicator).where(models.HealthIndicator.id.in_(first_ids)).values(recorded_at=old))
+        db.execute(update(models.RiskAssessment).where(models.RiskAssessment.indicator_id.in_(first_ids)).values(assessment_date=old))
+        db.execute(update(models.FollowUp).values(due_date=old))
+        db.commit()
+        completed = db.query(models.FollowUp).filter(models.FollowUp.status == "Completed").count()
+        assert completed > 0
+        crud.backfill_daily_rollups(db)
+        crud.rebuild_patient_states(db)
+        db.rollback()
+    finally:
+        db.close()
+    before = client.get(f"/patients/{patient_id}", headers=auth_headers).json()
+    assert len(before["indicators"]) == 6
+    trend_before = client.get(f"/patients/{patient_id}/trend?days=500", headers=auth_headers).json()
+    
+    # 2. Old rows move to the archive; pending follow-ups stay live
+    summary = archive.archive(engine, older_than_days=365, chunk_size=3)
+    assert summary["tables"] == {"health_indicators": 4, "risk_assessments": 4, "follow_ups": completed}
+    db = TestingSessionLocal()
+    try:
+        assert db.query(models.HealthIndicator).count() == 2
+        assert db.query(models.FollowUp).filter(models.FollowUp.status == "Completed").count() == 0
+        assert db.get(models.ArchiveWatermark, "health_indicators").rows_archived == 4
+        db.rollback()
+        
+        # 3. Rebuilding state and rollups reads both tiers
+        crud.backfill_daily_rollups(db)
+        crud.rebuild_patient_states(db)
+        db.rollback()
+    finally:
+        db.close()
+    
+    # 4. Windows reaching past the watermark span both tiers; recent ones stay in the live tier
+    assert client.get(f"/patients/{patient_id}", headers=auth_headers).json() == before
+    assert client.get(f"/patients/{patient_id}/trend?days=500", headers=auth_headers).json() == trend_before
+    since = (datetime.now(timezone.utc) - timedelta(days=30)).isoformat()
+    recent = client.get(f"/patients/{patient_id}", params={"since": since}, headers=auth_headers).json()
+    assert [i["id"] for i in recent["indicators"]] == [i["id"] for i in before["indicators"][-2:]]
+    
+    # 5. A repeated run has nothing left to move
+    assert sum(archive.archive(engine, older_than_days=365)["tables"].values()) == 0
+
+def test_sharded_storage(auth_headers, monkeypatch, tmp_path):
+    import database
+    import migrations
+    # Shard 0 is the test database; shards 1 and 2 are new files with their own id ranges
+    extra = [create_engines(f"sqlite:///{tmp_path / f'shard{k}.db'}") for k in (1, 2)]
+    for shard, (writer, _) in enumerate(extra, 1):
+        migrations.upgrade(writer, shard=shard)
+    shards = database.ShardRouter([(engine, read_engine)] + extra)
+    monkeypatch.setattr(database, "shards", shards)
+    try:
+        # 1. New patients are placed round robin, and their ids name their shard
+        ids = [
+            client.post("/patients/", json={"name": f"Shard {n}", "age": 50 + n, "gender": "F"}, headers=auth_headers).json()["id"]
+            for n in range(6)
+        ]
+        assert [shards.shard_of(i) for i in ids] == [0, 1, 2, 0, 1, 2]
+        assert ids[2] > 2 * database.SHARD_ID_STRIDE
+        
+        # 2. A batch spanning every shard comes back in request order
+        batch = client.post("/indicators/batch", json=[
+            {"patient_id": i, "blood_pressure_sys": 185, "blood_pressure_dia": 115, "glucose": 12.0} for i in reversed(ids)
+        ], headers=auth_headers).json()
+        assert batch["count"] == 6
+        assert [item["patient_id"] for item in batch["items"]] == list(reversed(ids))
+        assert [item["index"] for item in batch["items"]] == list(range(6))
+        assert shards.shard_of(batch["items"][0]["id"]) == 2
+        
+        # 3. Single-patient endpoints go to the owning shard
+        detail = client.get(f"/patients/{ids[2]}", headers=auth_headers).json()
+        assert len(detail["indicators"]) == 1 and detail["assessments"][0]["risk_level"] == "High"
+        reading = client.post("/indicators/", json={"patient_id": ids[1], "blood_pressure_sys": 185, "blood_pressure_dia": 115, "glucose": 12.0}, headers=auth_headers).json()
+        assert shards.shard_of(reading["id"]) == 1
+        assert client.get(f"/patients/{ids[4]}/trend", headers=auth_headers).json()["record_count"] == 1
+        assert client.get(f"/patients/{10 * database.SHARD_ID_STRIDE}", headers=auth_headers).status_code == 404
+        
+        # 4. Listings merge the shards in id / (due_date, id) order, across pages
+        first = client.get("/patients/", params={"limit": 4}, headers=auth_headers).json()
+        second = client.get("/patients/", params={"limit": 4, "cursor": first["next_cursor"]}, headers=auth_headers).json()
+        assert [p["id"] for p in first["items"] + second["items"]] == sorted(ids)
+        assert second["next_cursor"] is None
+        
+        def follow_up_ids(**params):
+            page = client.get("/followups/", params=params, headers=auth_headers).json()
+            return [f["id"] for group in page["items"] for f in group["followups"]], page["next_cursor"]
+        everything, _ = follow_up_ids(status="Pending", limit=100)
+        assert len(everything) == 6 and {shards.shard_of(i) for i in everything} == {0, 1, 2}
+        paged, cursor = follow_up_ids(status="Pending", limit=4)
+        rest, cursor = follow_up_ids(status="Pending", limit=4, cursor=cursor)
+        assert paged + rest == everything and cursor is None
+        
+        # 5. Follow-up ids route updates too; the dashboard adds up every shard
+        response = client.patch(f"/followups/{everything[-1]}", json={"status": "Completed"}, headers=auth_headers)
+        assert response.status_code == 200
+        dashboard = client.get("/dashboard/", headers=auth_headers).json()
+        assert dashboard["counts"]["total_patients"] == 6
+        assert dashboard["risk_distribution"]["high"] == 6
+        assert sum(bucket["count"] for bucket in dashboard["age_distribution"]) == 6
+    finally:
+        for writer, reader in extra:
+            writer.dispose()
+            reader.dispose()
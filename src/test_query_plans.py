@@ -0,0 +1,157 @@
+import sys
+import os
+import re
+import random
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import create_engine, event, insert, text
+from sqlalchemy.orm import sessionmaker
+import models, crud, schemas, migrations, export, rescore
+import pytest
+
+# Seeded "large" database used to check every crud query against its query plan
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test_query_plans.db"
+SEED_PATIENTS = 2000
+SEED_READINGS = 20000
+
+# Queries that are allowed to scan a whole table, with the reason why
+ALLOWED_FULL_SCANS = {
+    "export_health_indicators_full": "a full export reads every row, in rowid order",
+}
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+TABLES = set(models.Base.metadata.tables)
+
+@pytest.fixture(scope="module", autouse=True)
+def seeded_db():
+    models.Base.metadata.drop_all(bind=engine)
+    migrations.upgrade(engine)
+    rng = random.Random(42)
+    now = datetime.now(timezone.utc)
+    db = TestingSessionLocal()
+    try:
+        db.execute(insert(models.Patient), [
+            {
+                "name": f"Patient_{i:05d}",
+                "age": rng.randint(1, 95),
+                "gender": rng.choice(["Male", "Female"]),
+                "created_at": now - timedelta(days=rng.randint(0, 365))
+            }
+            for i in range(SEED_PATIENTS)
+        ])
+        db.add(models.User(username="planner", hashed_password="x", full_name="Query Planner"))
+        db.commit()
+        readings = [
+            schemas.HealthIndicatorCreate(
+                patient_id=rng.randint(1, SEED_PATIENTS),
+                blood_pressure_sys=rng.randint(100, 180),
+                blood_pressure_dia=rng.randint(60, 110),
+                glucose=round(rng.uniform(4.0, 13.0), 1)
+            )
+            for _ in range(SEED_READINGS)
+        ]
+        for start in range(0, SEED_READINGS, 5000):
+            crud.create_patient_indicators_batch(db, readings[start:start + 5000])
+        db.execute(text("ANALYZE"))
+        db.commit()
+    finally:
+        db.close()
+    yield
+    models.Base.metadata.drop_all(bind=engine)
+    engine.dispose()
+    os.remove("./test_query_plans.db")
+
+@contextmanager
+def captured_statements():
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE", "WITH")):
+            statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+def full_table_scans(statement, parameters):
+    with engine.connect() as conn:
+        plan = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).fetchall()
+    details = [row[3] for row in plan]
+    # An unfiltered walk in ORDER BY order (rowid or index, no sort) stops after one page under LIMIT;
+    # with a WHERE it may read the whole table looking for rare matches, so that still counts
+    bounded = (
+        " LIMIT " in statement and not re.search(r"\bWHERE\b", statement)
+        and not any("TEMP B-TREE FOR ORDER BY" in d for d in details)
+    )
+    scans = []
+    for detail in details:
+        words = detail.split()
+        # "SCAN <table>" without an index (a covering index scan only reads the compact index)
+        if words[0] == "SCAN" and words[1] in TABLES and "COVERING INDEX" not in detail and not bounded:
+            scans.append(detail)
+    return scans
+
+CRUD_QUERIES = {
+    "get_patient": lambda db: crud.get_patient(db, 7),
+    "get_patient_detail": lambda db: crud.get_patient_detail(db, 7, limit=5),
+    "get_patient_detail_since": lambda db: crud.get_patient_detail(
+        db, 7, since=datetime.now(timezone.utc) - timedelta(days=1)
+    ),
+    "get_patients": lambda db: crud.get_patients(db, limit=100),
+    "get_patients_deep_page": lambda db: crud.get_patients(db, cursor=crud.encode_cursor(1500), limit=100),
+    "get_follow_ups_pending": lambda db: crud.get_follow_ups(db, status="Pending"),
+    "get_follow_ups_all": lambda db: crud.get_follow_ups(db, limit=100),
+    "get_follow_ups_deep_page": lambda db: crud.get_follow_ups(
+        db, cursor=crud.encode_cursor(datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(days=7), 5000), limit=100
+    ),
+    "get_grouped_follow_ups": lambda db: crud.get_grouped_follow_ups(db, status="Pending"),
+    "get_patient_trend": lambda db: crud.get_patient_trend(db, 7, days=30),
+    "get_patient_state": lambda db: crud.get_patient_state(db, 7),
+    "get_dashboard_info": crud._build_dashboard_info,
+    "get_user_by_username": lambda db: crud.get_user_by_username(db, "planner"),
+    "create_patient_indicator": lambda db: crud.create_patient_indicator(db, schemas.HealthIndicatorCreate(
+        patient_id=7, blood_pressure_sys=150, blood_pressure_dia=85, glucose=6.0
+    )),
+    "create_patient_indicators_batch": lambda db: crud.create_patient_indicators_batch(db, [
+        schemas.HealthIndicatorCreate(patient_id=pid, blood_pressure_sys=120, blood_pressure_dia=80, glucose=5.0)
+        for pid in (8, 9, 10)
+    ]),
+    "create_patient_indicator_deferred": lambda db: crud.create_patient_indicator_deferred(db, schemas.HealthIndicatorCreate(
+        patient_id=12, blood_pressure_sys=130, blood_pressure_dia=85, glucose=6.0
+    )),
+    "process_indicator_outbox": lambda db: crud.process_indicator_outbox(db, crud.due_outbox_ids(db)),
+    "get_outbox_backlog": crud.get_outbox_backlog,
+    "rescore_unscored_readings": lambda db: db.execute(rescore._unscored_readings(2, 1000, SEED_READINGS, 1000)).all(),
+    "export_health_indicators_full": lambda db: list(export.iter_export(db.get_bind(), "health_indicators")),
+    "export_health_indicators_incremental": lambda db: list(export.iter_export(db.get_bind(), "health_indicators", since_id=19000)),
+    "update_follow_up": lambda db: crud.update_follow_up(db, 11, schemas.FollowUpUpdate(status="Completed")),
+}
+
+def test_filtered_limit_scan_is_flagged():
+    # LIMIT does not bound a scan whose filter may reject nearly every row
+    assert full_table_scans("SELECT * FROM patients WHERE contact_info = ? ORDER BY id LIMIT 10", ("x",))
+    assert not full_table_scans("SELECT * FROM patients ORDER BY id LIMIT 10", ())
+
+@pytest.mark.parametrize("name", sorted(CRUD_QUERIES))
+def test_crud_query_avoids_full_table_scan(name):
+    db = TestingSessionLocal()
+    try:
+        with captured_statements() as statements:
+            CRUD_QUERIES[name](db)
+    finally:
+        db.close()
+    assert statements, f"{name} issued no queries"
+
+    offenders = []
+    for statement, parameters in statements:
+        for scan in full_table_scans(statement, parameters):
+            offenders.append(f"{scan}: {statement}")
+    if name in ALLOWED_FULL_SCANS:
+        return
+    assert not offenders, f"{name} falls back to a full table scan:\n" + "\n".join(offenders)
@@ -0,0 +1,108 @@
+import os
+import math
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+import numpy as np
+
+# Running per-patient statistics kept in patient_states and updated in O(1) per reading:
+#   - Welford mean and M2 (sum of squared deviations) of every reading so far
+#   - an exponentially weighted mean (EWMA) and a weighted regression against time, whose
+#     slope (units per day) gives the trajectory behind the trend status
+# Each reading's weight decays by (1 - TREND_EWMA_ALPHA) per newer reading.
+TREND_EWMA_ALPHA = float(os.getenv("TREND_EWMA_ALPHA", "0.3"))
+# Below this many readings the status falls back to the current risk level
+TREND_MIN_READINGS = int(os.getenv("TREND_MIN_READINGS", "3"))
+# Slopes (per day) beyond which a metric counts as rising or falling
+SLOPE_THRESHOLDS = {"sbp": 0.5, "dbp": 0.3, "glucose": 0.05}
+
+METRICS = ("sbp", "dbp", "glucose")
+STAT_COLUMNS = (
+    ["reading_count"]
+    + [f"{prefix}_{metric}" for metric in METRICS for prefix in ("mean", "m2")]
+    + [f"ewma_{metric}" for metric in METRICS]
+    + ["ew_weight", "ew_mean_t", "ew_m2_t"]
+    + [f"ew_cov_{metric}" for metric in METRICS]
+)
+
+EPOCH = datetime(1970, 1, 1)
+MICROSECONDS_PER_DAY = 86_400_000_000
+
+def days(value: datetime) -> float:
+    """Time as fractional days since the Unix epoch (naive values are UTC)."""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return (value - EPOCH) / timedelta(days=1)
+
+def empty() -> dict:
+    return dict.fromkeys(STAT_COLUMNS, 0.0) | {"reading_count": 0}
+
+def _step(s: dict, t, values: dict) -> dict:
+    # Elementwise arithmetic only, so the same update runs on floats (ingest) or arrays (rebuild)
+    decay = 1.0 - TREND_EWMA_ALPHA
+    n = s["reading_count"] + 1
+    out = {"reading_count": n}
+    for metric, y in values.items():
+        delta = y - s[f"mean_{metric}"]
+        mean = s[f"mean_{metric}"] + delta / n
+        out[f"mean_{metric}"] = mean
+        out[f"m2_{metric}"] = s[f"m2_{metric}"] + delta * (y - mean)
+    weight = decay * s["ew_weight"] + 1.0
+    dt = t - s["ew_mean_t"]
+    mean_t = s["ew_mean_t"] + dt / weight
+    out["ew_weight"] = weight
+    out["ew_mean_t"] = mean_t
+    out["ew_m2_t"] = decay * s["ew_m2_t"] + dt * (t - mean_t)
+    for metric, y in values.items():
+        ewma = s[f"ewma_{metric}"] + (y - s[f"ewma_{metric}"]) / weight
+        out[f"ewma_{metric}"] = ewma
+        out[f"ew_cov_{metric}"] = decay * s[f"ew_cov_{metric}"] + dt * (y - ewma)
+    return out
+
+def fold(stats: Optional[dict], recorded_at: datetime, sbp: float, dbp: float, glucose: float) -> dict:
+    """Statistics after one more reading; `stats` is a previous result, or None/empty for a first reading."""
+    if not stats or not stats.get("reading_count"):
+        stats = empty()
+    return _step(stats, days(recorded_at), {"sbp": sbp, "dbp": dbp, "glucose": glucose})
+
+def fold_sorted(t: np.ndarray, values: dict, counts: np.ndarray) -> dict:
+    """
+    Statistics for many patients at once. Readings are sorted by patient, then time,
+    with counts[p] readings for patient p; returns one array per statistic, aligned
+    with counts. Steps through the k-th reading of every patient together.
+    """
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1])).astype(np.int64)
+    stats = {name: np.zeros(len(counts)) for name in STAT_COLUMNS}
+    stats["reading_count"] = np.zeros(len(counts), dtype=np.int64)
+    for k in range(int(counts.max()) if len(counts) else 0):
+        active = np.flatnonzero(counts > k)
+        idx = starts[active] + k
+        step = _step({name: column[active] for name, column in stats.items()}, t[idx], {m: values[m][idx] for m in METRICS})
+        for name, column in step.items():
+            stats[name][active] = column
+    return stats
+
+def summary(stats: Optional[dict]) -> dict:
+    """EWMA, standard deviation and slope (per day) of each metric; None where not yet defined."""
+    count = (stats or {}).get("reading_count") or 0
+    result = {}
+    for metric in METRICS:
+        result[f"ewma_{metric}"] = round(stats[f"ewma_{metric}"], 2) if count else None
+        result[f"std_{metric}"] = round(math.sqrt(stats[f"m2_{metric}"] / (count - 1)), 2) if count > 1 else None
+        result[f"slope_{metric}"] = round(stats[f"ew_cov_{metric}"] / stats["ew_m2_t"], 3) if count > 1 and stats["ew_m2_t"] > 0 else None
+    return result
+
+def status(stats: Optional[dict], risk_level: Optional[str]) -> str:
+    """
+    "Deteriorating" if any metric is rising faster than its threshold, "Improving" if
+    any is falling and none rising, otherwise "Stable". With too few readings (or no
+    spread in time) to fit a slope, falls back to the current risk level.
+    """
+    count = (stats or {}).get("reading_count") or 0
+    if count < TREND_MIN_READINGS or not stats["ew_m2_t"] > 0:
+        return {"High": "Deteriorating", "Low": "Improving"}.get(risk_level, "Stable")
+    slopes = {metric: stats[f"ew_cov_{metric}"] / stats["ew_m2_t"] for metric in METRICS}
+    if any(slopes[m] > SLOPE_THRESHOLDS[m] for m in METRICS):
+        return "Deteriorating"
+    if any(slopes[m] < -SLOPE_THRESHOLDS[m] for m in METRICS):
+        return "Improving"
+    return "Stable"
@@ -0,0 +1,155 @@
+import os
+import queue
+import asyncio
+import threading
+import time
+from concurrent.futures import Future
+from typing import List
+try:
+    from . import crud, schemas
+except ImportError:
+    import crud, schemas
+
+# Group commit is opt-in; readings that arrive within MAX_DELAY_MS share one transaction
+GROUP_COMMIT_ENABLED = os.getenv("INGEST_GROUP_COMMIT", "0") == "1"
+GROUP_COMMIT_MAX_DELAY_MS = float(os.getenv("GROUP_COMMIT_MAX_DELAY_MS", "5"))
+GROUP_COMMIT_MAX_BATCH = int(os.getenv("GROUP_COMMIT_MAX_BATCH", "500"))
+
+BATCH_SIZE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+class _Pending:
+    __slots__ = ("indicator", "future", "enqueued_at")
+
+    def __init__(self, indicator: schemas.HealthIndicatorCreate):
+        self.indicator = indicator
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+
+class GroupCommitQueue:
+    """
+    Single writer thread that coalesces queued indicator writes into one
+    transaction per group. Each caller's future resolves only after the group
+    holding its reading has committed.
+    """
+
+    def __init__(self, session_factory, max_delay_ms: float = GROUP_COMMIT_MAX_DELAY_MS, max_batch: int = GROUP_COMMIT_MAX_BATCH):
+        self.session_factory = session_factory
+        self.max_delay = max_delay_ms / 1000
+        self.max_batch = max_batch
+        self._queue: "queue.Queue[_Pending]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stopping = threading.Event()
+        self.batches = 0
+        self.items = 0
+        self.max_batch_seen = 0
+        self.max_queue_depth = 0
+        self.fallbacks = 0
+        self.commit_seconds = 0.0
+        self.wait_seconds = 0.0
+        self.histogram = {bucket: 0 for bucket in BATCH_SIZE_BUCKETS}
+        self.histogram["+Inf"] = 0
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping.clear()
+                self._thread = threading.Thread(target=self._run, name="group-commit-writer", daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        # Drains whatever is already queued before the writer exits
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def submit(self, indicator: schemas.HealthIndicatorCreate) -> Future:
+        self.start()
+        pending = _Pending(indicator)
+        self._queue.put(pending)
+        depth = self._queue.qsize()
+        with self._lock:
+            self.max_queue_depth = max(self.max_queue_depth, depth)
+        return pending.future
+
+    async def submit_async(self, indicator: schemas.HealthIndicatorCreate) -> dict:
+        return await asyncio.wrap_future(self.submit(indicator))
+
+    def _run(self):
+        while True:
+            try:
+                first = self._queue.get(timeout=0.1)
+            except queue.Empty:
+                if self._stopping.is_set():
+                    return
+                continue
+            batch = [first]
+            deadline = time.perf_counter() + self.max_delay
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                try:
+                    batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._commit(batch)
+
+    def _commit(self, batch: List[_Pending]):
+        started = time.perf_counter()
+        fallback = False
+        try:
+            results = self._write([p.indicator for p in batch])
+        except Exception:
+            # One bad reading must not fail its neighbours: retry each on its own
+            fallback = True
+            results = []
+            for p in batch:
+                try:
+                    results.append(self._write([p.indicator])[0])
+                except Exception as exc:
+                    results.append(exc)
+        finished = time.perf_counter()
+
+        with self._lock:
+            self.batches += 1
+            self.fallbacks += fallback
+            self.items += len(batch)
+            self.max_batch_seen = max(self.max_batch_seen, len(batch))
+            self.commit_seconds += finished - started
+            self.wait_seconds += sum(finished - p.enqueued_at for p in batch)
+            bucket = next((b for b in BATCH_SIZE_BUCKETS if len(batch) <= b), "+Inf")
+            self.histogram[bucket] += 1
+
+        for p, result in zip(batch, results):
+            if isinstance(result, Exception):
+                p.future.set_exception(result)
+            else:
+                p.future.set_result(result)
+
+    def _write(self, indicators: List[schemas.HealthIndicatorCreate]) -> list:
+        db = self.session_factory()
+        try:
+            return crud.create_patient_indicators_batch(db, indicators)["items"]
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": True,
+                "max_delay_ms": self.max_delay * 1000,
+                "max_batch": self.max_batch,
+                "queue_depth": self._queue.qsize(),
+                "max_queue_depth": self.max_queue_depth,
+                "batches": self.batches,
+                "items": self.items,
+                "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+                "max_batch_size": self.max_batch_seen,
+                "batch_size_histogram": {str(k): v for k, v in self.histogram.items()},
+                "avg_commit_ms": round(self.commit_seconds / self.batches * 1000, 3) if self.batches else 0.0,
+                "avg_wait_ms": round(self.wait_seconds / self.items * 1000, 3) if self.items else 0.0,
+                "fallbacks": self.fallbacks,
+            }